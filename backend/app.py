@@ -3,6 +3,7 @@ Simplified Flask Application Entry Point
 """
 import os
 import sys
+import json
 import logging
 from dotenv import load_dotenv
 from sqlalchemy import event
@@ -19,6 +20,20 @@ from config import Config
 from controllers.material_controller import material_bp, material_global_bp
 from controllers.reference_file_controller import reference_file_bp
 from controllers import project_bp, page_bp, template_bp, user_template_bp, export_bp, file_bp, auth_bp
+from services.task_manager import task_manager
+from services.scheduler import job_scheduler
+from services.rate_limiter import rate_limiters
+from services.response_cache import response_cache
+from services.context_cache import context_cache
+from services.image_cache import reference_images
+from services.file_uploads import uploaded_files
+from services.async_runtime import async_runtime
+from services.client_registry import client_registry
+from services.speculative_images import speculative_variants
+from services.hedging import image_hedging
+from services.metrics import ai_metrics
+from services.export_artifacts import export_artifacts
+from services.thumbnails import thumbnails, parse_pregenerate
 
 
 # Enable SQLite WAL mode for all connections
@@ -42,8 +57,14 @@ def set_sqlite_pragma(dbapi_conn, connection_record):
         cursor.close()
 
 
-def create_app():
-    """Application factory"""
+def create_app(test_config=None):
+    """
+    Application factory
+    
+    Args:
+        test_config: Optional config overrides applied on top of the environment
+                     (e.g. a temporary database and upload folder for benchmarks)
+    """
     app = Flask(__name__)
     
     # Basic configuration
@@ -73,6 +94,52 @@ def create_app():
     app.config['GOOGLE_API_BASE'] = os.getenv('GOOGLE_API_BASE', '')
     app.config['MAX_DESCRIPTION_WORKERS'] = int(os.getenv('MAX_DESCRIPTION_WORKERS', '5'))
     app.config['MAX_IMAGE_WORKERS'] = int(os.getenv('MAX_IMAGE_WORKERS', '8'))
+    app.config['DESCRIPTION_BATCH_ENABLED'] = os.getenv('DESCRIPTION_BATCH_ENABLED', 'true').lower() == 'true'
+    app.config['DESCRIPTION_BATCH_MAX_PAGES'] = int(os.getenv('DESCRIPTION_BATCH_MAX_PAGES', '8'))
+    app.config['GLOBAL_AI_CONCURRENCY'] = int(os.getenv('GLOBAL_AI_CONCURRENCY', '8'))
+    app.config['AI_RATE_LIMITS'] = os.getenv('AI_RATE_LIMITS', '')
+    app.config['AI_MAX_RETRIES'] = int(os.getenv('AI_MAX_RETRIES', '5'))
+    app.config['RESPONSE_CACHE_ENABLED'] = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['RESPONSE_CACHE_PATH'] = os.getenv('RESPONSE_CACHE_PATH', os.path.join(instance_dir, 'response_cache.db'))
+    app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+    app.config['CONTEXT_CACHE_ENABLED'] = os.getenv('CONTEXT_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['CONTEXT_CACHE_TTL'] = int(os.getenv('CONTEXT_CACHE_TTL', '3600'))
+    app.config['CONTEXT_CACHE_MIN_TOKENS'] = int(os.getenv('CONTEXT_CACHE_MIN_TOKENS', '1024'))
+    app.config['REFERENCE_IMAGE_CACHE_MAX_BYTES'] = int(os.getenv('REFERENCE_IMAGE_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+    app.config['REFERENCE_IMAGE_MAX_DIMENSION'] = int(os.getenv('REFERENCE_IMAGE_MAX_DIMENSION', '1536'))
+    app.config['REFERENCE_IMAGE_FORMAT'] = os.getenv('REFERENCE_IMAGE_FORMAT', 'jpeg')
+    app.config['REFERENCE_IMAGE_QUALITY'] = int(os.getenv('REFERENCE_IMAGE_QUALITY', '85'))
+    app.config['REFERENCE_IMAGE_DISK_CACHE'] = os.getenv('REFERENCE_IMAGE_DISK_CACHE', 'true').lower() == 'true'
+    app.config['FILE_UPLOAD_ENABLED'] = os.getenv('FILE_UPLOAD_ENABLED', 'true').lower() == 'true'
+    app.config['FILE_UPLOAD_MIN_BYTES'] = int(os.getenv('FILE_UPLOAD_MIN_BYTES', str(256 * 1024)))
+    app.config['AI_ASYNC_ENABLED'] = os.getenv('AI_ASYNC_ENABLED', 'true').lower() == 'true'
+    app.config['AI_ASYNC_BLOCKING_WORKERS'] = int(os.getenv('AI_ASYNC_BLOCKING_WORKERS', '8'))
+    app.config['AI_HTTP_MAX_CONNECTIONS'] = int(os.getenv('AI_HTTP_MAX_CONNECTIONS', '100'))
+    app.config['AI_HTTP_MAX_KEEPALIVE_CONNECTIONS'] = int(os.getenv('AI_HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    app.config['AI_HTTP_KEEPALIVE_EXPIRY'] = float(os.getenv('AI_HTTP_KEEPALIVE_EXPIRY', '60'))
+    app.config['AI_HTTP2_ENABLED'] = os.getenv('AI_HTTP2_ENABLED', 'true').lower() == 'true'
+    app.config['IMAGE_HEDGING_ENABLED'] = os.getenv('IMAGE_HEDGING_ENABLED', 'false').lower() == 'true'
+    app.config['IMAGE_HEDGE_PERCENTILE'] = float(os.getenv('IMAGE_HEDGE_PERCENTILE', '0.9'))
+    app.config['IMAGE_HEDGE_MIN_SAMPLES'] = int(os.getenv('IMAGE_HEDGE_MIN_SAMPLES', '20'))
+    app.config['IMAGE_HEDGE_BUDGET'] = float(os.getenv('IMAGE_HEDGE_BUDGET', '0.1'))
+    app.config['IMAGE_HEDGE_MIN_DELAY'] = float(os.getenv('IMAGE_HEDGE_MIN_DELAY', '5'))
+    app.config['SPECULATIVE_VARIANTS_ENABLED'] = os.getenv('SPECULATIVE_VARIANTS_ENABLED', 'false').lower() == 'true'
+    app.config['SPECULATIVE_VARIANT_INSTRUCTIONS'] = os.getenv('SPECULATIVE_VARIANT_INSTRUCTIONS', '')
+    app.config['SPECULATIVE_VARIANT_MAX_AGE'] = int(os.getenv('SPECULATIVE_VARIANT_MAX_AGE', str(24 * 3600)))
+    app.config['SPECULATIVE_VARIANT_DISK_BUDGET'] = int(os.getenv('SPECULATIVE_VARIANT_DISK_BUDGET', str(512 * 1024 * 1024)))
+    app.config['SPECULATIVE_IDLE_FRACTION'] = float(os.getenv('SPECULATIVE_IDLE_FRACTION', '0.5'))
+    app.config['EXPORT_ARTIFACT_MAX_AGE'] = int(os.getenv('EXPORT_ARTIFACT_MAX_AGE', str(7 * 24 * 3600)))
+    app.config['EXPORT_STALE_GRACE'] = int(os.getenv('EXPORT_STALE_GRACE', '600'))
+    app.config['FILE_OFFLOAD_TYPE'] = os.getenv('FILE_OFFLOAD_TYPE', '').strip().lower()
+    app.config['FILE_OFFLOAD_MAPPING'] = os.getenv('FILE_OFFLOAD_MAPPING', '/app/uploads/=/_uploads/')
+    app.config['THUMBNAIL_CACHE_MAX_BYTES'] = int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+    app.config['THUMBNAIL_QUALITY'] = int(os.getenv('THUMBNAIL_QUALITY', '80'))
+    app.config['THUMBNAIL_PREGENERATE'] = os.getenv('THUMBNAIL_PREGENERATE', '320,640')
+    app.config['TASK_LEASE_SECONDS'] = int(os.getenv('TASK_LEASE_SECONDS', '60'))
+    app.config['TASK_HEARTBEAT_INTERVAL'] = int(os.getenv('TASK_HEARTBEAT_INTERVAL', '15'))
+    app.config['TASK_MAX_ATTEMPTS'] = int(os.getenv('TASK_MAX_ATTEMPTS', '3'))
+    app.config['TASK_RECOVERY_ENABLED'] = os.getenv('TASK_RECOVERY_ENABLED', 'true').lower() == 'true'
     app.config['DEFAULT_ASPECT_RATIO'] = "16:9"
     app.config['DEFAULT_RESOLUTION'] = "2K"
     app.config['LOG_LEVEL'] = os.getenv('LOG_LEVEL', 'INFO').upper()
@@ -90,6 +157,11 @@ def create_app():
         cors_origins = [o.strip() for o in raw_cors.split(',') if o.strip()]
     app.config['CORS_ORIGINS'] = cors_origins
     
+    if test_config:
+        app.config.update(test_config)
+        cors_origins = app.config['CORS_ORIGINS']
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    
     # Initialize logging (log to stdout so Docker can capture it)
     log_level = getattr(logging, app.config['LOG_LEVEL'], logging.INFO)
     logging.basicConfig(
@@ -124,11 +196,118 @@ def create_app():
     with app.app_context():
         db.create_all()
     
+    # Shared cap on concurrent Gemini image/caption calls across all users
+    job_scheduler.configure(max_concurrency=app.config['GLOBAL_AI_CONCURRENCY'])
+    
+    # Per-model client-side quota (RPM/TPM, AIMD concurrency, 429-aware retry)
+    rate_limiters.configure(
+        limits=json.loads(app.config['AI_RATE_LIMITS']) if app.config['AI_RATE_LIMITS'] else None,
+        max_retries=app.config['AI_MAX_RETRIES']
+    )
+    
+    # Disk-backed cache for text generation responses
+    response_cache.configure(
+        path=app.config['RESPONSE_CACHE_PATH'],
+        ttl_seconds=app.config['RESPONSE_CACHE_TTL'],
+        max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+        enabled=app.config['RESPONSE_CACHE_ENABLED']
+    )
+    
+    # Gemini cached-content handles for the shared reference-file prompt prefix
+    context_cache.configure(
+        enabled=app.config['CONTEXT_CACHE_ENABLED'],
+        ttl_seconds=app.config['CONTEXT_CACHE_TTL'],
+        min_tokens=app.config['CONTEXT_CACHE_MIN_TOKENS']
+    )
+    
+    # Decoded, downscaled and encoded reference images (template, materials) shared by all pages
+    reference_images.configure(
+        max_bytes=app.config['REFERENCE_IMAGE_CACHE_MAX_BYTES'],
+        max_dimension=app.config['REFERENCE_IMAGE_MAX_DIMENSION'],
+        output_format=app.config['REFERENCE_IMAGE_FORMAT'],
+        quality=app.config['REFERENCE_IMAGE_QUALITY'],
+        disk_cache=app.config['REFERENCE_IMAGE_DISK_CACHE']
+    )
+    
+    # Upload-once file handles for large reference images
+    uploaded_files.configure(
+        enabled=app.config['FILE_UPLOAD_ENABLED'],
+        min_bytes=app.config['FILE_UPLOAD_MIN_BYTES']
+    )
+    
+    # Event loop running bulk Gemini calls (page images, descriptions, captions) on the async client
+    async_runtime.configure(
+        enabled=app.config['AI_ASYNC_ENABLED'],
+        blocking_workers=app.config['AI_ASYNC_BLOCKING_WORKERS']
+    )
+    
+    # Shared Gemini clients with pooled keep-alive (HTTP/2 if h2 is installed) connections
+    client_registry.configure(
+        max_connections=app.config['AI_HTTP_MAX_CONNECTIONS'],
+        max_keepalive_connections=app.config['AI_HTTP_MAX_KEEPALIVE_CONNECTIONS'],
+        keepalive_expiry=app.config['AI_HTTP_KEEPALIVE_EXPIRY'],
+        http2=app.config['AI_HTTP2_ENABLED']
+    )
+    
+    # Opt-in duplicate requests for page images slower than the model's p90 latency
+    image_hedging.configure(
+        enabled=app.config['IMAGE_HEDGING_ENABLED'],
+        percentile=app.config['IMAGE_HEDGE_PERCENTILE'],
+        min_samples=app.config['IMAGE_HEDGE_MIN_SAMPLES'],
+        budget_fraction=app.config['IMAGE_HEDGE_BUDGET'],
+        min_delay=app.config['IMAGE_HEDGE_MIN_DELAY']
+    )
+    
+    # Opt-in pre-generation of common edits after a deck's images are done
+    speculative_variants.configure(
+        enabled=app.config['SPECULATIVE_VARIANTS_ENABLED'],
+        instructions=json.loads(app.config['SPECULATIVE_VARIANT_INSTRUCTIONS']) if app.config['SPECULATIVE_VARIANT_INSTRUCTIONS'] else None,
+        max_age_seconds=app.config['SPECULATIVE_VARIANT_MAX_AGE'],
+        disk_budget_bytes=app.config['SPECULATIVE_VARIANT_DISK_BUDGET'],
+        idle_fraction=app.config['SPECULATIVE_IDLE_FRACTION']
+    )
+    
+    # Exported PPTX/PDF files keyed by the deck's images, reused until the deck changes
+    export_artifacts.configure(
+        max_age_seconds=app.config['EXPORT_ARTIFACT_MAX_AGE'],
+        stale_grace_seconds=app.config['EXPORT_STALE_GRACE']
+    )
+    
+    # Resized WebP/AVIF variants of page images (?w=320&fmt=webp), bounded disk cache
+    thumbnails.configure(
+        cache_dir=os.path.join(app.config['UPLOAD_FOLDER'], '.thumbnails'),
+        max_bytes=app.config['THUMBNAIL_CACHE_MAX_BYTES'],
+        quality=app.config['THUMBNAIL_QUALITY'],
+        pregenerate=parse_pregenerate(app.config['THUMBNAIL_PREGENERATE'])
+    )
+    
+    # Re-queue tasks orphaned by a previous run and keep task leases alive.
+    # Skipped in the dev reloader's watcher process, which never serves requests.
+    is_reloader_watcher = (
+        os.getenv('FLASK_ENV', 'development') == 'development'
+        and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    )
+    if app.config['TASK_RECOVERY_ENABLED'] and not is_reloader_watcher:
+        task_manager.start(app)
+    
     # Health check endpoint
     @app.route('/health')
     def health_check():
         return {'status': 'ok', 'message': 'Banana Slides API is running'}
     
+    # Prometheus metrics: Gemini call latency / tokens / bytes / retries plus scheduler and limiter state
+    @app.route('/metrics')
+    def metrics():
+        scheduler_stats = job_scheduler.stats()
+        gauges = [
+            ('scheduler_running_jobs', 'Jobs running on the global AI scheduler', {}, scheduler_stats['running']),
+            ('scheduler_queued_jobs', 'Jobs waiting on the global AI scheduler', {}, scheduler_stats['queued']),
+        ]
+        for model, limiter in rate_limiters.snapshot().items():
+            gauges.append(('rate_limiter_in_flight', 'Gemini calls in flight per model', {'model': model}, limiter['in_flight']))
+            gauges.append(('rate_limiter_concurrency_limit', 'Current AIMD concurrency limit per model', {'model': model}, limiter['concurrency_limit']))
+        return app.response_class(ai_metrics.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+    
     # Root endpoint
     @app.route('/')
     def index():
@@ -138,6 +317,7 @@ def create_app():
             'description': 'AI-powered PPT generation service',
             'endpoints': {
                 'health': '/health',
+                'metrics': '/metrics',
                 'api_docs': '/api',
                 'projects': '/api/projects'
             }
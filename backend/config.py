@@ -54,7 +54,80 @@ class Config:
     
     # 并发配置
     MAX_DESCRIPTION_WORKERS = int(os.getenv('MAX_DESCRIPTION_WORKERS', '5'))
-    MAX_IMAGE_WORKERS = int(os.getenv('MAX_IMAGE_WORKERS', '8'))
+    MAX_IMAGE_WORKERS = int(os.getenv('MAX_IMAGE_WORKERS', '8'))  # 单个项目同时在途的图片数
+    # 批量生成描述：一次请求生成多页（参考文件和大纲只发送一次），批次大小按上下文长度自适应
+    DESCRIPTION_BATCH_ENABLED = os.getenv('DESCRIPTION_BATCH_ENABLED', 'true').lower() == 'true'
+    DESCRIPTION_BATCH_MAX_PAGES = int(os.getenv('DESCRIPTION_BATCH_MAX_PAGES', '8'))
+    # 全局调度器：所有项目/用户共享的 Gemini 图片、编辑、素材、图片描述并发上限
+    GLOBAL_AI_CONCURRENCY = int(os.getenv('GLOBAL_AI_CONCURRENCY', '8'))
+    # 按模型的客户端限流（JSON），例如 {"gemini-3-pro-image-preview": {"rpm": 20, "tpm": 100000, "concurrency": 8}}
+    AI_RATE_LIMITS = os.getenv('AI_RATE_LIMITS', '')
+    AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', '5'))  # 429/503/5xx 的最大重试次数
+    
+    # 文本生成响应缓存（按模型 + prompt + 配置的哈希缓存，磁盘持久化，TTL + LRU 容量淘汰）
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', os.path.join(BASE_DIR, 'instance', 'response_cache.db'))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+    RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+    
+    # 参考文件前缀的上下文缓存（Gemini cached content），参考文件变化时自动失效
+    CONTEXT_CACHE_ENABLED = os.getenv('CONTEXT_CACHE_ENABLED', 'true').lower() == 'true'
+    CONTEXT_CACHE_TTL = int(os.getenv('CONTEXT_CACHE_TTL', '3600'))
+    CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('CONTEXT_CACHE_MIN_TOKENS', '1024'))  # 低于该长度直接内联发送
+    
+    # 参考图片缓存（模板/素材图片按路径+修改时间缓存，预先缩放并编码为发送给 API 的字节）
+    REFERENCE_IMAGE_CACHE_MAX_BYTES = int(os.getenv('REFERENCE_IMAGE_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+    REFERENCE_IMAGE_MAX_DIMENSION = int(os.getenv('REFERENCE_IMAGE_MAX_DIMENSION', '1536'))  # 最长边像素，0 表示不缩放
+    # 参考图片规范化：去除透明通道和元数据，重新编码为 jpeg/webp；结果以隐藏文件缓存在源文件旁
+    REFERENCE_IMAGE_FORMAT = os.getenv('REFERENCE_IMAGE_FORMAT', 'jpeg')
+    REFERENCE_IMAGE_QUALITY = int(os.getenv('REFERENCE_IMAGE_QUALITY', '85'))
+    REFERENCE_IMAGE_DISK_CACHE = os.getenv('REFERENCE_IMAGE_DISK_CACHE', 'true').lower() == 'true'
+    # 大参考图上传一次（Gemini Files API），之后只传文件句柄；小于阈值的图片仍内联发送
+    FILE_UPLOAD_ENABLED = os.getenv('FILE_UPLOAD_ENABLED', 'true').lower() == 'true'
+    FILE_UPLOAD_MIN_BYTES = int(os.getenv('FILE_UPLOAD_MIN_BYTES', str(256 * 1024)))
+    # 异步执行：批量图片/描述/图片描述请求在同一个事件循环上用异步客户端并发，不再每个请求占用一个线程
+    AI_ASYNC_ENABLED = os.getenv('AI_ASYNC_ENABLED', 'true').lower() == 'true'
+    AI_ASYNC_BLOCKING_WORKERS = int(os.getenv('AI_ASYNC_BLOCKING_WORKERS', '8'))  # 文件读写、图片编码等阻塞操作的线程数
+    # Gemini 客户端全局复用（按 API key + 地址），HTTP 连接池保持长连接；安装 h2 后使用 HTTP/2
+    AI_HTTP_MAX_CONNECTIONS = int(os.getenv('AI_HTTP_MAX_CONNECTIONS', '100'))
+    AI_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('AI_HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('AI_HTTP_KEEPALIVE_EXPIRY', '60'))  # 空闲连接保留秒数
+    AI_HTTP2_ENABLED = os.getenv('AI_HTTP2_ENABLED', 'true').lower() == 'true'
+    # 图片请求对冲（可选）：批量生成中单页图片请求超过该模型近期 p90 耗时仍未返回时，再发一个相同请求，
+    # 取先返回的结果；每套幻灯片最多对冲 IMAGE_HEDGE_BUDGET 比例的页面（至少 1 页）
+    IMAGE_HEDGING_ENABLED = os.getenv('IMAGE_HEDGING_ENABLED', 'false').lower() == 'true'
+    IMAGE_HEDGE_PERCENTILE = float(os.getenv('IMAGE_HEDGE_PERCENTILE', '0.9'))
+    IMAGE_HEDGE_MIN_SAMPLES = int(os.getenv('IMAGE_HEDGE_MIN_SAMPLES', '20'))  # 样本不足时不对冲
+    IMAGE_HEDGE_BUDGET = float(os.getenv('IMAGE_HEDGE_BUDGET', '0.1'))
+    IMAGE_HEDGE_MIN_DELAY = float(os.getenv('IMAGE_HEDGE_MIN_DELAY', '5'))  # 对冲前至少等待的秒数
+    # 预生成编辑变体（可选）：图片全部生成后，在配额空闲时按常用编辑指令提前生成每页的变体，
+    # 用户发出相同的编辑指令时直接采用；超过保留时间或磁盘预算（从最旧的开始）的变体会被清理
+    SPECULATIVE_VARIANTS_ENABLED = os.getenv('SPECULATIVE_VARIANTS_ENABLED', 'false').lower() == 'true'
+    SPECULATIVE_VARIANT_INSTRUCTIONS = os.getenv('SPECULATIVE_VARIANT_INSTRUCTIONS', '')  # JSON 数组，为空使用内置指令
+    SPECULATIVE_VARIANT_MAX_AGE = int(os.getenv('SPECULATIVE_VARIANT_MAX_AGE', str(24 * 3600)))  # 秒
+    SPECULATIVE_VARIANT_DISK_BUDGET = int(os.getenv('SPECULATIVE_VARIANT_DISK_BUDGET', str(512 * 1024 * 1024)))  # 字节
+    SPECULATIVE_IDLE_FRACTION = float(os.getenv('SPECULATIVE_IDLE_FRACTION', '0.5'))  # 图片模型剩余配额高于该比例时才生成
+    # 导出文件缓存：按当前所有页面图片（路径、修改时间、大小）生成的键保存，幻灯片未变化时直接复用；
+    # 与当前幻灯片不再匹配的旧导出在 EXPORT_STALE_GRACE 秒后清理，所有导出最长保留 EXPORT_ARTIFACT_MAX_AGE 秒（未被再次下载）
+    EXPORT_ARTIFACT_MAX_AGE = int(os.getenv('EXPORT_ARTIFACT_MAX_AGE', str(7 * 24 * 3600)))
+    EXPORT_STALE_GRACE = int(os.getenv('EXPORT_STALE_GRACE', '600'))
+    # /files 由前端 nginx 直接发送文件：FILE_OFFLOAD_TYPE 为 x-accel-redirect（或 x-sendfile）时，
+    # 后端只返回响应头和 X-Accel-Redirect（路径按 FILE_OFFLOAD_MAPPING "文件系统前缀=内部 location" 转换）或 X-Sendfile，
+    # 不经过 Python 传输文件内容；只读服务端配置，不信任请求头。默认关闭（直接访问后端时需要由 Flask 发送文件）
+    FILE_OFFLOAD_TYPE = os.getenv('FILE_OFFLOAD_TYPE', '').strip().lower()
+    FILE_OFFLOAD_MAPPING = os.getenv('FILE_OFFLOAD_MAPPING', '/app/uploads/=/_uploads/')
+    # 缩略图：/files/...?w=320&fmt=webp 返回缩放后的 WebP/AVIF，缓存在 uploads/.thumbnails，
+    # 超过 THUMBNAIL_CACHE_MAX_BYTES 时删除最久未使用的；新生成的页面图片在后台预生成
+    # THUMBNAIL_PREGENERATE 中的尺寸（"宽度[:格式]" 逗号分隔，为空不预生成）
+    THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+    THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '80'))
+    THUMBNAIL_PREGENERATE = os.getenv('THUMBNAIL_PREGENERATE', '320,640')
+    
+    # 持久化任务队列配置（租约、心跳、重启后自动恢复）
+    TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '60'))
+    TASK_HEARTBEAT_INTERVAL = int(os.getenv('TASK_HEARTBEAT_INTERVAL', '15'))
+    TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', '3'))
+    TASK_RECOVERY_ENABLED = os.getenv('TASK_RECOVERY_ENABLED', 'true').lower() == 'true'
     
     # 图片生成配置
     DEFAULT_ASPECT_RATIO = "16:9"
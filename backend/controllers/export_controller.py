@@ -2,31 +2,49 @@
 Export Controller - handles file export endpoints
 """
 from flask import Blueprint, request, current_app, g
-from models import db, Project, Page
+from models import db, Project, Page, Task
 from utils import error_response, not_found, bad_request, success_response
 from utils.auth import login_required
-from services import ExportService, FileService
-import os
-import io
+from services import FileService
+from services.export_artifacts import export_artifacts, get_export_key
+from services.task_manager import task_manager, export_task, get_export_image_paths, get_export_download_url
+from werkzeug.utils import secure_filename
 
 export_bp = Blueprint('export', __name__, url_prefix='/api/projects')
 
 
-@export_bp.route('/<project_id>/export/pptx', methods=['GET'])
-@login_required
-def export_pptx(project_id):
+def _resume_export_task(task: Task, app):
+    """Re-submit an orphaned EXPORT task (registered with task_manager)"""
+    params = task.get_params()
+    task_manager.submit_task(
+        task.id,
+        export_task,
+        task.project_id,
+        params['format'],
+        FileService(app.config['UPLOAD_FOLDER']),
+        params.get('download_name'),
+        app
+    )
+
+
+task_manager.register_resumer('EXPORT', _resume_export_task)
+
+
+def _get_download_name(project_id: str, export_format: str) -> str:
+    """File name the browser saves the export as (?filename=..., default presentation_{id})"""
+    filename = secure_filename(request.args.get('filename', '')) or f'presentation_{project_id}'
+    if not filename.endswith(f'.{export_format}'):
+        filename += f'.{export_format}'
+    return filename
+
+
+def _export(project_id: str, export_format: str):
     """
-    GET /api/projects/{project_id}/export/pptx?filename=... - Export PPTX
-    
+    Return a cached export of the deck's current images, or start an export task
+
     Returns:
-        JSON with download URL, e.g.
-        {
-            "success": true,
-            "data": {
-                "download_url": "/files/{project_id}/exports/xxx.pptx",
-                "download_url_absolute": "http://host:port/files/{project_id}/exports/xxx.pptx"
-            }
-        }
+        200 with the download URL when an export of the same images exists,
+        otherwise 202 with the id of the task building it (progress.download_url once done)
     """
     try:
         # Check for subscription
@@ -34,138 +52,112 @@ def export_pptx(project_id):
             return error_response('FORBIDDEN', 'Export is available for Pro users only. Please upgrade.', 403)
 
         project = Project.query.get(project_id)
-        
+
         if not project:
             return not_found('Project')
-        
+
         if project.user_id != g.current_user.id:
             return error_response('FORBIDDEN', 'You do not have access to this project', 403)
-        
-        # Get all completed pages
-        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        
-        if not pages:
+
+        if not Page.query.filter_by(project_id=project_id).first():
             return bad_request("No pages found for project")
-        
-        # Get image paths
-        from flask import current_app
+
         file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        
-        image_paths = []
-        for page in pages:
-            if page.generated_image_path:
-                abs_path = file_service.get_absolute_path(page.generated_image_path)
-                image_paths.append(abs_path)
-        
+        image_paths = get_export_image_paths(project_id, file_service)
+
         if not image_paths:
             return bad_request("No generated images found for project")
-        
-        # Determine export directory and filename
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        exports_dir = file_service._get_exports_dir(project_id)
-        
-        # Get filename from query params or use default
-        filename = request.args.get('filename', f'presentation_{project_id}.pptx')
-        if not filename.endswith('.pptx'):
-            filename += '.pptx'
-
-        output_path = os.path.join(exports_dir, filename)
-
-        # Generate PPTX file on disk
-        ExportService.create_pptx_from_images(image_paths, output_file=output_path)
-
-        # Build download URLs
-        download_path = f"/files/{project_id}/exports/{filename}"
-        base_url = request.host_url.rstrip("/")
-        download_url_absolute = f"{base_url}{download_path}"
-
-        return success_response(
-            data={
-                "download_url": download_path,
-                "download_url_absolute": download_url_absolute,
-            },
-            message="Export PPTX task created"
+
+        download_name = _get_download_name(project_id, export_format)
+        key = get_export_key(image_paths, export_format)
+
+        artifact = export_artifacts.find(file_service._get_exports_dir(project_id), key, export_format)
+        if artifact:
+            download_path = get_export_download_url(project_id, artifact.name, download_name)
+            return success_response(
+                data={
+                    "download_url": download_path,
+                    "download_url_absolute": f"{request.host_url.rstrip('/')}{download_path}",
+                    "cached": True
+                },
+                message=f"Export {export_format.upper()} is up to date"
+            )
+
+        # The same deck is already being exported (double click, second tab)
+        for running in Task.query.filter(
+            Task.project_id == project_id,
+            Task.task_type == 'EXPORT',
+            Task.status.in_(['PENDING', 'PROCESSING'])
+        ).all():
+            if running.get_params().get('key') == key:
+                return success_response({
+                    'task_id': running.id,
+                    'status': 'EXPORTING'
+                }, status_code=202)
+
+        task = Task(
+            project_id=project_id,
+            task_type='EXPORT',
+            status='PENDING'
+        )
+        task.set_progress({'total': 1, 'completed': 0, 'failed': 0})
+        task.set_params({
+            'format': export_format,
+            'key': key,
+            'download_name': download_name
+        })
+        db.session.add(task)
+        db.session.commit()
+
+        task_manager.submit_task(
+            task.id,
+            export_task,
+            project_id,
+            export_format,
+            file_service,
+            download_name,
+            current_app._get_current_object()
         )
-    
+
+        return success_response({
+            'task_id': task.id,
+            'status': 'EXPORTING'
+        }, status_code=202)
+
     except Exception as e:
+        db.session.rollback()
         return error_response('SERVER_ERROR', str(e), 500)
 
 
-@export_bp.route('/<project_id>/export/pdf', methods=['GET'])
+@export_bp.route('/<project_id>/export/pptx', methods=['GET'])
 @login_required
-def export_pdf(project_id):
+def export_pptx(project_id):
     """
-    GET /api/projects/{project_id}/export/pdf?filename=... - Export PDF
-    
+    GET /api/projects/{project_id}/export/pptx?filename=... - Export PPTX
+
     Returns:
-        JSON with download URL, e.g.
+        The download URL right away if the deck's images did not change since the last export:
         {
             "success": true,
             "data": {
-                "download_url": "/files/{project_id}/exports/xxx.pdf",
-                "download_url_absolute": "http://host:port/files/{project_id}/exports/xxx.pdf"
+                "download_url": "/files/{project_id}/exports/{key}.pptx?download=xxx.pptx",
+                "download_url_absolute": "http://host:port/files/{project_id}/exports/{key}.pptx?download=xxx.pptx",
+                "cached": true
             }
         }
+        otherwise 202 with {"task_id": "...", "status": "EXPORTING"}; poll the task, its
+        progress.download_url is set when it completes
     """
-    try:
-        # Check for subscription
-        if not g.current_user.is_pro:
-            return error_response('FORBIDDEN', 'Export is available for Pro users only. Please upgrade.', 403)
-
-        project = Project.query.get(project_id)
-        
-        if not project:
-            return not_found('Project')
-            
-        if project.user_id != g.current_user.id:
-            return error_response('FORBIDDEN', 'You do not have access to this project', 403)
-        
-        # Get all completed pages
-        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        
-        if not pages:
-            return bad_request("No pages found for project")
-        
-        # Get image paths
-        from flask import current_app
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        
-        image_paths = []
-        for page in pages:
-            if page.generated_image_path:
-                abs_path = file_service.get_absolute_path(page.generated_image_path)
-                image_paths.append(abs_path)
-        
-        if not image_paths:
-            return bad_request("No generated images found for project")
-        
-        # Determine export directory and filename
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        exports_dir = file_service._get_exports_dir(project_id)
-
-        # Get filename from query params or use default
-        filename = request.args.get('filename', f'presentation_{project_id}.pdf')
-        if not filename.endswith('.pdf'):
-            filename += '.pdf'
-
-        output_path = os.path.join(exports_dir, filename)
+    return _export(project_id, 'pptx')
 
-        # Generate PDF file on disk
-        ExportService.create_pdf_from_images(image_paths, output_file=output_path)
 
-        # Build download URLs
-        download_path = f"/files/{project_id}/exports/{filename}"
-        base_url = request.host_url.rstrip("/")
-        download_url_absolute = f"{base_url}{download_path}"
-
-        return success_response(
-            data={
-                "download_url": download_path,
-                "download_url_absolute": download_url_absolute,
-            },
-            message="Export PDF task created"
-        )
-    
-    except Exception as e:
-        return error_response('SERVER_ERROR', str(e), 500)
+@export_bp.route('/<project_id>/export/pdf', methods=['GET'])
+@login_required
+def export_pdf(project_id):
+    """
+    GET /api/projects/{project_id}/export/pdf?filename=... - Export PDF
 
+    Returns:
+        Same as export/pptx: the cached download URL, or 202 with the id of the export task
+    """
+    return _export(project_id, 'pdf')
@@ -1,16 +1,42 @@
 """
 File Controller - handles static file serving
 """
-from flask import Blueprint, send_from_directory, current_app
-from utils import error_response, not_found
+from flask import Blueprint, current_app, request
+from utils import error_response, not_found, bad_request
 from utils.path_utils import find_file_with_prefix
+from utils.file_serving import serve_static_file, is_versioned_filename
+from services.thumbnails import thumbnails, THUMBNAIL_WIDTHS
 import os
 from pathlib import Path
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 
 file_bp = Blueprint('files', __name__, url_prefix='/files')
 
 
+def _serve(file_dir: str, filename: str, immutable: bool = False):
+    """File response, or a resized variant of the image for ?w=320&fmt=webp"""
+    if 'w' not in request.args and 'fmt' not in request.args:
+        response = serve_static_file(file_dir, filename, immutable=immutable)
+        return response if response is not None else not_found('File')
+    
+    width = THUMBNAIL_WIDTHS[-1]
+    if request.args.get('w'):
+        if not request.args['w'].isdigit() or int(request.args['w']) <= 0:
+            return bad_request("w must be a positive integer")
+        width = int(request.args['w'])
+    fmt = thumbnails.get_format(request.args.get('fmt'))
+    if fmt is None:
+        return bad_request("fmt must be webp, avif or jpeg")
+    
+    source = safe_join(os.path.abspath(file_dir), filename)
+    variant = thumbnails.get(source, width, fmt) if source else None
+    if variant is None:
+        return not_found('File')
+    response = serve_static_file(os.path.dirname(variant), os.path.basename(variant), immutable=immutable)
+    return response if response is not None else not_found('File')
+
+
 @file_bp.route('/<project_id>/<file_type>/<filename>', methods=['GET'])
 def serve_file(project_id, file_type, filename):
     """
@@ -20,29 +46,28 @@ def serve_file(project_id, file_type, filename):
         project_id: Project UUID
         file_type: 'template' or 'pages'
         filename: File name
+    
+    Query params:
+    - w, fmt: resized variant of an image (e.g. ?w=320&fmt=webp), not for exports
     """
     try:
         if file_type not in ['template', 'pages', 'materials', 'exports']:
             return not_found('File')
         
-        # Construct file path
         file_dir = os.path.join(
             current_app.config['UPLOAD_FOLDER'],
             project_id,
             file_type
         )
         
-        # Check if directory exists
-        if not os.path.exists(file_dir):
-            return not_found('File')
-        
-        # Check if file exists
-        file_path = os.path.join(file_dir, filename)
-        if not os.path.exists(file_path):
-            return not_found('File')
+        if file_type == 'exports':
+            # Exports are stored under a content key (never change), ?download= names the saved file
+            response = serve_static_file(file_dir, filename, immutable=True,
+                                         download_name=request.args.get('download'))
+            return response if response is not None else not_found('File')
         
-        # Serve file
-        return send_from_directory(file_dir, filename)
+        # Versioned page images ({page_id}_v{n}_{token}.png) never change under their name
+        return _serve(file_dir, filename, immutable=file_type == 'pages' and is_versioned_filename(filename))
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
@@ -58,24 +83,13 @@ def serve_user_template(template_id, filename):
         filename: File name
     """
     try:
-        # Construct file path
         file_dir = os.path.join(
             current_app.config['UPLOAD_FOLDER'],
             'user-templates',
             template_id
         )
         
-        # Check if directory exists
-        if not os.path.exists(file_dir):
-            return not_found('File')
-        
-        # Check if file exists
-        file_path = os.path.join(file_dir, filename)
-        if not os.path.exists(file_path):
-            return not_found('File')
-        
-        # Serve file
-        return send_from_directory(file_dir, filename)
+        return _serve(file_dir, filename)
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
@@ -91,23 +105,12 @@ def serve_global_material(filename):
     """
     try:
         safe_filename = secure_filename(filename)
-        # Construct file path
         file_dir = os.path.join(
             current_app.config['UPLOAD_FOLDER'],
             'materials'
         )
         
-        # Check if directory exists
-        if not os.path.exists(file_dir):
-            return not_found('File')
-        
-        # Check if file exists
-        file_path = os.path.join(file_dir, safe_filename)
-        if not os.path.exists(file_path):
-            return not_found('File')
-        
-        # Serve file
-        return send_from_directory(file_dir, safe_filename)
+        return _serve(file_dir, safe_filename)
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
@@ -154,7 +157,9 @@ def serve_mineru_file(extract_id, filepath):
             except Exception:
                 return error_response('INVALID_PATH', 'Invalid file path', 403)
             
-            return send_from_directory(str(matched_path.parent), matched_path.name)
+            response = serve_static_file(str(matched_path.parent), matched_path.name)
+            if response is not None:
+                return response
 
         return not_found('File')
     except Exception as e:
@@ -5,7 +5,8 @@ from flask import Blueprint, request, current_app
 from models import db, Project, Material, Task
 from utils import success_response, error_response, not_found, bad_request
 from utils.auth import login_required
-from services import AIService, FileService
+from services import FileService
+from services.client_registry import client_registry
 from services.task_manager import task_manager, generate_material_image_task
 from pathlib import Path
 from werkzeug.utils import secure_filename
@@ -188,7 +189,7 @@ def generate_material_image(project_id):
                 return not_found('Project')
 
         # Initialize services
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
@@ -230,6 +231,8 @@ def generate_material_image(project_id):
                 'completed': 0,
                 'failed': 0
             })
+            # temp_dir is kept so it can be removed if the task is lost in a restart
+            task.set_params({'temp_dir': temp_dir_str})
             db.session.add(task)
             db.session.commit()
 
@@ -4,9 +4,11 @@ Page Controller - handles page-related endpoints
 import logging
 from flask import Blueprint, request, current_app, g
 from models import db, Project, Page, PageImageVersion, Task
-from utils import success_response, error_response, not_found, bad_request
+from utils import success_response, error_response, not_found, bad_request, parse_bool
 from utils.auth import login_required
-from services import AIService, FileService, ProjectContext
+from services import FileService, ProjectContext
+from services.client_registry import client_registry
+from services.speculative_images import speculative_variants
 from services.task_manager import task_manager, generate_single_page_image_task, edit_page_image_task
 from datetime import datetime
 from pathlib import Path
@@ -39,6 +41,43 @@ def _check_page_access(project_id: str, page_id: str = None):
     return project, None, None
 
 
+def _resume_page_image_task(task: Task, app):
+    """Re-submit an orphaned GENERATE_PAGE_IMAGE task (registered with task_manager)"""
+    from controllers.project_controller import _reconstruct_outline_from_pages
+    params = task.get_params()
+    
+    project = Project.query.get(task.project_id)
+    if not project:
+        raise ValueError(f"Project {task.project_id} not found")
+    
+    pages = Page.query.filter_by(project_id=project.id).order_by(Page.order_index).all()
+    outline = _reconstruct_outline_from_pages(pages)
+    
+    ai_service = client_registry.get_ai_service(
+        app.config['GOOGLE_API_KEY'],
+        app.config['GOOGLE_API_BASE']
+    )
+    file_service = FileService(app.config['UPLOAD_FOLDER'])
+    
+    task_manager.submit_task(
+        task.id,
+        generate_single_page_image_task,
+        project.id,
+        params['page_id'],
+        ai_service,
+        file_service,
+        outline,
+        params.get('use_template', True),
+        app.config['DEFAULT_ASPECT_RATIO'],
+        app.config['DEFAULT_RESOLUTION'],
+        app,
+        project.extra_requirements
+    )
+
+
+task_manager.register_resumer('GENERATE_PAGE_IMAGE', _resume_page_image_task)
+
+
 @page_bp.route('/<project_id>/pages', methods=['POST'])
 @login_required
 def create_page(project_id):
@@ -208,6 +247,70 @@ def update_page_description(project_id, page_id):
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+def _prepare_page_description(project_id: str, page_id: str, data: dict):
+    """
+    Collect the inputs of a single page description request
+    
+    Returns:
+        (page, (project_context, outline, page_outline, page_index), error_response)
+    """
+    page = Page.query.get(page_id)
+    
+    if not page or page.project_id != project_id:
+        return None, None, not_found('Page')
+    
+    project = Project.query.get(project_id)
+    if not project:
+        return None, None, not_found('Project')
+    
+    force_regenerate = parse_bool(data.get('force_regenerate'))
+    
+    # Check if already generated
+    if page.get_description_content() and not force_regenerate:
+        return None, None, bad_request("Description already exists. Set force_regenerate=true to regenerate")
+    
+    # Get outline content
+    outline_content = page.get_outline_content()
+    if not outline_content:
+        return None, None, bad_request("Page must have outline content first")
+    
+    # Reconstruct full outline
+    all_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+    outline = []
+    for p in all_pages:
+        oc = p.get_outline_content()
+        if oc:
+            page_data = oc.copy()
+            if p.part:
+                page_data['part'] = p.part
+            outline.append(page_data)
+    
+    # Get reference files content and create project context
+    from controllers.project_controller import _get_project_reference_files_content
+    reference_files_content = _get_project_reference_files_content(project_id)
+    project_context = ProjectContext(project, reference_files_content)
+    
+    page_data = outline_content.copy()
+    if page.part:
+        page_data['part'] = page.part
+    
+    return page, (project_context, outline, page_data, page.order_index + 1), None
+
+
+def _save_page_description(page: Page, desc_text: str):
+    """Store a generated description on its page and commit"""
+    desc_content = {
+        "text": desc_text,
+        "generated_at": datetime.utcnow().isoformat()
+    }
+    
+    page.set_description_content(desc_content)
+    page.status = 'DESCRIPTION_GENERATED'
+    page.updated_at = datetime.utcnow()
+    
+    db.session.commit()
+
+
 @page_bp.route('/<project_id>/pages/<page_id>/generate/description', methods=['POST'])
 def generate_page_description(project_id, page_id):
     """
@@ -219,73 +322,25 @@ def generate_page_description(project_id, page_id):
     }
     """
     try:
-        page = Page.query.get(page_id)
-        
-        if not page or page.project_id != project_id:
-            return not_found('Page')
-        
-        project = Project.query.get(project_id)
-        if not project:
-            return not_found('Project')
-        
         data = request.get_json() or {}
-        force_regenerate = data.get('force_regenerate', False)
-        
-        # Check if already generated
-        if page.get_description_content() and not force_regenerate:
-            return bad_request("Description already exists. Set force_regenerate=true to regenerate")
-        
-        # Get outline content
-        outline_content = page.get_outline_content()
-        if not outline_content:
-            return bad_request("Page must have outline content first")
-        
-        # Reconstruct full outline
-        all_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        outline = []
-        for p in all_pages:
-            oc = p.get_outline_content()
-            if oc:
-                page_data = oc.copy()
-                if p.part:
-                    page_data['part'] = p.part
-                outline.append(page_data)
+        page, description_args, error = _prepare_page_description(project_id, page_id, data)
+        if error:
+            return error
         
         # Initialize AI service
-        from flask import current_app
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
         
-        # Get reference files content and create project context
-        from controllers.project_controller import _get_project_reference_files_content
-        reference_files_content = _get_project_reference_files_content(project_id)
-        project_context = ProjectContext(project, reference_files_content)
-        
         # Generate description
-        page_data = outline_content.copy()
-        if page.part:
-            page_data['part'] = page.part
-        
+        # An explicit regenerate must not get the cached description back
         desc_text = ai_service.generate_page_description(
-            project_context,
-            outline,
-            page_data,
-            page.order_index + 1
+            *description_args, use_cache=not parse_bool(data.get('force_regenerate'))
         )
         
         # Save description
-        desc_content = {
-            "text": desc_text,
-            "generated_at": datetime.utcnow().isoformat()
-        }
-        
-        page.set_description_content(desc_content)
-        page.status = 'DESCRIPTION_GENERATED'
-        page.updated_at = datetime.utcnow()
-        
-        db.session.commit()
+        _save_page_description(page, desc_text)
         
         return success_response(page.to_dict())
     
@@ -294,6 +349,52 @@ def generate_page_description(project_id, page_id):
         return error_response('AI_SERVICE_ERROR', str(e), 503)
 
 
+@page_bp.route('/<project_id>/pages/<page_id>/generate/description/stream', methods=['POST'])
+def generate_page_description_stream(project_id, page_id):
+    """
+    POST /api/projects/{project_id}/pages/{page_id}/generate/description/stream - Generate single page
+    description, streamed (Server-Sent Events)
+    
+    Same request body as /generate/description. Events: delta {text} as the description is
+    written, then completed {page} once it is saved, or error {message}.
+    """
+    from controllers.project_controller import _format_sse, _sse_response
+    
+    try:
+        data = request.get_json() or {}
+        page, description_args, error = _prepare_page_description(project_id, page_id, data)
+        if error:
+            return error
+        use_cache = not parse_bool(data.get('force_regenerate'))
+        
+        ai_service = client_registry.get_ai_service(
+            current_app.config['GOOGLE_API_KEY'],
+            current_app.config['GOOGLE_API_BASE']
+        )
+    
+    except Exception as e:
+        return error_response('SERVER_ERROR', str(e), 500)
+    
+    def stream():
+        try:
+            desc_text = None
+            events = ai_service.generate_page_description_stream(*description_args, use_cache=use_cache)
+            for event_type, data in events:
+                if event_type == 'description':
+                    desc_text = data['text']
+                else:
+                    yield _format_sse(event_type, data)
+            
+            _save_page_description(page, desc_text)
+            yield _format_sse('completed', {'page': page.to_dict()})
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"generate_page_description_stream failed: {str(e)}", exc_info=True)
+            yield _format_sse('error', {'message': str(e)})
+    
+    return _sse_response(stream())
+
+
 @page_bp.route('/<project_id>/pages/<page_id>/generate/image', methods=['POST'])
 def generate_page_image(project_id, page_id):
     """
@@ -317,7 +418,7 @@ def generate_page_image(project_id, page_id):
         
         data = request.get_json() or {}
         use_template = data.get('use_template', True)
-        force_regenerate = data.get('force_regenerate', False)
+        force_regenerate = parse_bool(data.get('force_regenerate'))
         
         # Check if already generated
         if page.generated_image_path and not force_regenerate:
@@ -378,7 +479,7 @@ def generate_page_image(project_id, page_id):
         
         # Initialize services
         from flask import current_app
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
@@ -431,6 +532,10 @@ def generate_page_image(project_id, page_id):
             'completed': 0,
             'failed': 0
         })
+        task.set_params({
+            'page_id': page_id,
+            'use_template': use_template
+        })
         db.session.add(task)
         db.session.commit()
         
@@ -501,7 +606,7 @@ def edit_page_image(project_id, page_id):
         
         # Initialize services
         from flask import current_app
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
@@ -596,6 +701,34 @@ def edit_page_image(project_id, page_id):
                     shutil.rmtree(temp_dir)
                 raise e
         
+        # A plain edit (no extra reference images) may already exist as a speculative variant
+        if not additional_ref_images:
+            variant = speculative_variants.find_variant(
+                page, data['edit_instruction'], original_description,
+                current_app.config['DEFAULT_ASPECT_RATIO'], current_app.config['DEFAULT_RESOLUTION'],
+                file_service
+            )
+            if variant:
+                speculative_variants.promote(page, variant)
+                task = Task(
+                    project_id=project_id,
+                    task_type='EDIT_PAGE_IMAGE',
+                    status='COMPLETED',
+                    completed_at=datetime.utcnow()
+                )
+                task.set_progress({'total': 1, 'completed': 1, 'failed': 0})
+                task.set_params({'page_id': page_id, 'version_id': variant.id})
+                db.session.add(task)
+                db.session.commit()
+                logger.info(f"Edit of page {page_id} served from speculative variant {variant.id}")
+                
+                return success_response({
+                    'task_id': task.id,
+                    'page_id': page_id,
+                    'status': 'COMPLETED',
+                    'speculative': True
+                }, status_code=202)
+        
         # Create async task for image editing
         task = Task(
             project_id=project_id,
@@ -607,6 +740,11 @@ def edit_page_image(project_id, page_id):
             'completed': 0,
             'failed': 0
         })
+        # temp_dir is kept so it can be removed if the task is lost in a restart
+        task.set_params({
+            'page_id': page_id,
+            'temp_dir': str(temp_dir) if temp_dir else None
+        })
         db.session.add(task)
         db.session.commit()
         
@@ -654,7 +792,7 @@ def get_page_image_versions(project_id, page_id):
         if not page or page.project_id != project_id:
             return not_found('Page')
         
-        versions = PageImageVersion.query.filter_by(page_id=page_id)\
+        versions = PageImageVersion.query.filter_by(page_id=page_id, is_speculative=False)\
             .order_by(PageImageVersion.version_number.desc()).all()
         
         return success_response({
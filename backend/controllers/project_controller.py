@@ -2,12 +2,17 @@
 Project Controller - handles project-related endpoints
 """
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from models import db, Project, Page, Task, ReferenceFile
-from utils import success_response, error_response, not_found, bad_request
+from utils import success_response, error_response, not_found, bad_request, parse_bool
 from utils.auth import login_required
-from services import AIService, ProjectContext
-from services.task_manager import task_manager, generate_descriptions_task, generate_images_task
+from services import ProjectContext
+from services.client_registry import client_registry
+from services.task_manager import (
+    task_manager, generate_descriptions_task, generate_images_task, generate_deck_task
+)
+from services.progress_events import progress_events, TERMINAL_EVENTS
+from services.metrics import ai_metrics
 import json
 import traceback
 from datetime import datetime
@@ -48,17 +53,21 @@ def _get_project_reference_files_content(project_id: str) -> list:
         project_id: Project ID
         
     Returns:
-        List of dicts with 'filename' and 'content' keys
+        List of dicts with 'filename' and 'content' keys, plus 'id' and 'updated_at'
+        which identify the prefix for context caching
     """
+    # Stable order keeps the reference-file prefix byte-identical between prompts
     reference_files = ReferenceFile.query.filter_by(
         project_id=project_id,
         parse_status='completed'
-    ).all()
+    ).order_by(ReferenceFile.created_at, ReferenceFile.id).all()
     
     files_content = []
     for ref_file in reference_files:
         if ref_file.markdown_content:
             files_content.append({
+                'id': ref_file.id,
+                'updated_at': ref_file.updated_at.isoformat() if ref_file.updated_at else None,
                 'filename': ref_file.filename,
                 'content': ref_file.markdown_content
             })
@@ -125,6 +134,137 @@ def _reconstruct_outline_from_pages(pages: list) -> list:
     return outline
 
 
+def _submit_descriptions_task(task: Task, project: Project, outline: list, app):
+    """
+    Submit a GENERATE_DESCRIPTIONS task, taking its arguments from task.params
+    
+    Shared by the endpoint and by the resumer that re-queues the task after a restart.
+    """
+    params = task.get_params()
+    
+    ai_service = client_registry.get_ai_service(
+        app.config['GOOGLE_API_KEY'],
+        app.config['GOOGLE_API_BASE']
+    )
+    
+    # Get reference files content and create project context
+    reference_files_content = _get_project_reference_files_content(project.id)
+    project_context = ProjectContext(project, reference_files_content)
+    
+    task_manager.submit_task(
+        task.id,
+        generate_descriptions_task,
+        project.id,
+        ai_service,
+        project_context,
+        outline,
+        params.get('max_workers', app.config.get('MAX_DESCRIPTION_WORKERS', 5)),
+        app,
+        resume=params.get('resume', False),
+        batch_mode=params.get('batch', False),
+        max_batch_size=app.config.get('DESCRIPTION_BATCH_MAX_PAGES', 8),
+        use_cache=not params.get('force_regenerate', False)
+    )
+
+
+def _submit_images_task(task: Task, project: Project, outline: list, app):
+    """
+    Submit a GENERATE_IMAGES task, taking its arguments from task.params
+    
+    Shared by the endpoint and by the resumer that re-queues the task after a restart.
+    """
+    from services import FileService
+    params = task.get_params()
+    
+    ai_service = client_registry.get_ai_service(
+        app.config['GOOGLE_API_KEY'],
+        app.config['GOOGLE_API_BASE']
+    )
+    file_service = FileService(app.config['UPLOAD_FOLDER'])
+    
+    task_manager.submit_task(
+        task.id,
+        generate_images_task,
+        project.id,
+        ai_service,
+        file_service,
+        outline,
+        params.get('use_template', True),
+        params.get('max_workers', app.config.get('MAX_IMAGE_WORKERS', 8)),
+        app.config['DEFAULT_ASPECT_RATIO'],
+        app.config['DEFAULT_RESOLUTION'],
+        app,
+        project.extra_requirements,
+        params.get('limit'),
+        resume=params.get('resume', False)
+    )
+
+
+def _submit_deck_task(task: Task, project: Project, outline: list, app):
+    """
+    Submit a GENERATE_DECK task, taking its arguments from task.params
+    
+    Shared by the endpoint and by the resumer that re-queues the task after a restart.
+    """
+    from services import FileService
+    params = task.get_params()
+    
+    ai_service = client_registry.get_ai_service(
+        app.config['GOOGLE_API_KEY'],
+        app.config['GOOGLE_API_BASE']
+    )
+    file_service = FileService(app.config['UPLOAD_FOLDER'])
+    
+    reference_files_content = _get_project_reference_files_content(project.id)
+    project_context = ProjectContext(project, reference_files_content)
+    
+    task_manager.submit_task(
+        task.id,
+        generate_deck_task,
+        project.id,
+        ai_service,
+        file_service,
+        project_context,
+        outline,
+        params.get('description_workers', app.config.get('MAX_DESCRIPTION_WORKERS', 5)),
+        params.get('image_workers', app.config.get('MAX_IMAGE_WORKERS', 8)),
+        params.get('use_template', True),
+        app.config['DEFAULT_ASPECT_RATIO'],
+        app.config['DEFAULT_RESOLUTION'],
+        app,
+        project.extra_requirements,
+        resume=params.get('resume', False),
+        batch_mode=params.get('batch', False),
+        max_batch_size=app.config.get('DESCRIPTION_BATCH_MAX_PAGES', 8),
+        use_cache=not params.get('force_regenerate', False)
+    )
+
+
+def _resume_project_task(task: Task, app):
+    """Re-submit an orphaned batch task of a project (registered with task_manager)"""
+    project = Project.query.get(task.project_id)
+    if not project:
+        raise ValueError(f"Project {task.project_id} not found")
+    
+    pages = Page.query.filter_by(project_id=project.id).order_by(Page.order_index).all()
+    if not pages:
+        raise ValueError("No pages found for project")
+    
+    outline = _reconstruct_outline_from_pages(pages)
+    
+    if task.task_type == 'GENERATE_DESCRIPTIONS':
+        _submit_descriptions_task(task, project, outline, app)
+    elif task.task_type == 'GENERATE_DECK':
+        _submit_deck_task(task, project, outline, app)
+    else:
+        _submit_images_task(task, project, outline, app)
+
+
+task_manager.register_resumer('GENERATE_DESCRIPTIONS', _resume_project_task)
+task_manager.register_resumer('GENERATE_IMAGES', _resume_project_task)
+task_manager.register_resumer('GENERATE_DECK', _resume_project_task)
+
+
 @project_bp.route('', methods=['GET'])
 @login_required
 def list_projects():
@@ -134,6 +274,9 @@ def list_projects():
     Query params:
     - limit: number of projects to return (default: 50)
     - offset: offset for pagination (default: 0)
+    
+    Pages are summaries (outline title, has_description, image URL) without the full
+    outline / description content; thumbnails are served with ?w=&fmt= on the image URL.
     """
     try:
         from flask import g
@@ -148,7 +291,7 @@ def list_projects():
         projects = Project.query.filter_by(user_id=user_id).order_by(desc(Project.updated_at)).limit(limit).offset(offset).all()
         
         return success_response({
-            'projects': [project.to_dict(include_pages=True) for project in projects],
+            'projects': [project.to_dict(include_pages=True, page_summary=True) for project in projects],
             'total': Project.query.filter_by(user_id=user_id).count()
         })
     
@@ -324,6 +467,82 @@ def delete_project(project_id):
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+def _prepare_outline_generation(project: Project, data: dict):
+    """
+    Pick how the outline of a project is produced
+    
+    For 'idea' type: Generate outline from idea_prompt (taken from the request body if given)
+    For 'outline' type: Parse outline_text into structured format
+    
+    Returns:
+        (project_context, parse_outline_text, error_response)
+    """
+    # Get reference files content and create project context
+    reference_files_content = _get_project_reference_files_content(project.id)
+    if reference_files_content:
+        logger.info(f"Found {len(reference_files_content)} reference files for project {project.id}")
+        for rf in reference_files_content:
+            logger.info(f"  - {rf['filename']}: {len(rf['content'])} characters")
+    else:
+        logger.info(f"No reference files found for project {project.id}")
+    
+    # 根据项目类型选择不同的处理方式
+    if project.creation_type == 'outline':
+        # 从大纲生成：解析用户输入的大纲文本
+        if not project.outline_text:
+            return None, True, bad_request("outline_text is required for outline type project")
+        return ProjectContext(project, reference_files_content), True, None
+    
+    if project.creation_type == 'descriptions':
+        # 从描述生成：这个类型应该使用专门的端点
+        return None, False, bad_request("Use /generate/from-description endpoint for descriptions type")
+    
+    # 一句话生成：从idea生成大纲
+    idea_prompt = data.get('idea_prompt') or project.idea_prompt
+    if not idea_prompt:
+        return None, False, bad_request("idea_prompt is required")
+    
+    project.idea_prompt = idea_prompt
+    return ProjectContext(project, reference_files_content), False, None
+
+
+def _replace_pages_from_outline(project: Project, ai_service, outline: list) -> list:
+    """Replace the project's pages with the pages of a new outline and commit"""
+    # Flatten outline to pages
+    pages_data = ai_service.flatten_outline(outline)
+    
+    # Delete existing pages (using ORM session to trigger cascades)
+    old_pages = Page.query.filter_by(project_id=project.id).all()
+    for old_page in old_pages:
+        db.session.delete(old_page)
+    
+    # Create pages from outline
+    pages_list = []
+    for i, page_data in enumerate(pages_data):
+        page = Page(
+            project_id=project.id,
+            order_index=i,
+            part=page_data.get('part'),
+            status='DRAFT'
+        )
+        page.set_outline_content({
+            'title': page_data.get('title'),
+            'points': page_data.get('points', [])
+        })
+        
+        db.session.add(page)
+        pages_list.append(page)
+    
+    # Update project status
+    project.status = 'OUTLINE_GENERATED'
+    project.updated_at = datetime.utcnow()
+    
+    db.session.commit()
+    
+    logger.info(f"大纲生成完成: 项目 {project.id}, 创建了 {len(pages_list)} 个页面")
+    return pages_list
+
+
 @project_bp.route('/<project_id>/generate/outline', methods=['POST'])
 @login_required
 def generate_outline(project_id):
@@ -336,93 +555,33 @@ def generate_outline(project_id):
     Request body (optional):
     {
         "idea_prompt": "...",  # for idea type
+        "force_regenerate": false  # regenerate instead of reusing a cached answer for the same input
     }
     """
     try:
-        from flask import g
-        
-        project = Project.query.get(project_id)
-        
-        if not project:
-            return not_found('Project')
-        
-        if project.user_id != g.current_user.id:
-            return error_response('FORBIDDEN', 'You do not have access to this project', 403)
+        project, error = _check_project_access(project_id)
+        if error:
+            return error
         
         # Initialize AI service
         from flask import current_app
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
         
-        # Get reference files content and create project context
-        reference_files_content = _get_project_reference_files_content(project_id)
-        if reference_files_content:
-            logger.info(f"Found {len(reference_files_content)} reference files for project {project_id}")
-            for rf in reference_files_content:
-                logger.info(f"  - {rf['filename']}: {len(rf['content'])} characters")
-        else:
-            logger.info(f"No reference files found for project {project_id}")
+        data = request.get_json() or {}
+        project_context, parse_outline_text, error = _prepare_outline_generation(project, data)
+        if error:
+            return error
         
-        # 根据项目类型选择不同的处理方式
-        if project.creation_type == 'outline':
-            # 从大纲生成：解析用户输入的大纲文本
-            if not project.outline_text:
-                return bad_request("outline_text is required for outline type project")
-            
-            # Create project context and parse outline text into structured format
-            project_context = ProjectContext(project, reference_files_content)
-            outline = ai_service.parse_outline_text(project_context)
-        elif project.creation_type == 'descriptions':
-            # 从描述生成：这个类型应该使用专门的端点
-            return bad_request("Use /generate/from-description endpoint for descriptions type")
+        use_cache = not parse_bool(data.get('force_regenerate'))
+        if parse_outline_text:
+            outline = ai_service.parse_outline_text(project_context, use_cache=use_cache)
         else:
-            # 一句话生成：从idea生成大纲
-            data = request.get_json() or {}
-            idea_prompt = data.get('idea_prompt') or project.idea_prompt
-            
-            if not idea_prompt:
-                return bad_request("idea_prompt is required")
-            
-            project.idea_prompt = idea_prompt
-            
-            # Create project context and generate outline from idea
-            project_context = ProjectContext(project, reference_files_content)
-            outline = ai_service.generate_outline(project_context)
-        
-        # Flatten outline to pages
-        pages_data = ai_service.flatten_outline(outline)
-        
-        # Delete existing pages (using ORM session to trigger cascades)
-        old_pages = Page.query.filter_by(project_id=project_id).all()
-        for old_page in old_pages:
-            db.session.delete(old_page)
-        
-        # Create pages from outline
-        pages_list = []
-        for i, page_data in enumerate(pages_data):
-            page = Page(
-                project_id=project_id,
-                order_index=i,
-                part=page_data.get('part'),
-                status='DRAFT'
-            )
-            page.set_outline_content({
-                'title': page_data.get('title'),
-                'points': page_data.get('points', [])
-            })
-            
-            db.session.add(page)
-            pages_list.append(page)
-        
-        # Update project status
-        project.status = 'OUTLINE_GENERATED'
-        project.updated_at = datetime.utcnow()
-        
-        db.session.commit()
+            outline = ai_service.generate_outline(project_context, use_cache=use_cache)
         
-        logger.info(f"大纲生成完成: 项目 {project_id}, 创建了 {len(pages_list)} 个页面")
+        pages_list = _replace_pages_from_outline(project, ai_service, outline)
         
         # Return pages
         return success_response({
@@ -435,6 +594,60 @@ def generate_outline(project_id):
         return error_response('AI_SERVICE_ERROR', str(e), 503)
 
 
+@project_bp.route('/<project_id>/generate/outline/stream', methods=['POST'])
+@login_required
+def generate_outline_stream(project_id):
+    """
+    POST /api/projects/{project_id}/generate/outline/stream - Generate outline, streamed (Server-Sent Events)
+    
+    Same request body as /generate/outline. Events: delta {text} for the model's output as it is
+    written, page {index, page} as soon as each page of the outline is complete, then
+    completed {pages} once the pages are saved, or error {message}.
+    """
+    try:
+        project, error = _check_project_access(project_id)
+        if error:
+            return error
+        
+        from flask import current_app
+        ai_service = client_registry.get_ai_service(
+            current_app.config['GOOGLE_API_KEY'],
+            current_app.config['GOOGLE_API_BASE']
+        )
+        
+        data = request.get_json() or {}
+        project_context, parse_outline_text, error = _prepare_outline_generation(project, data)
+        if error:
+            return error
+        use_cache = not parse_bool(data.get('force_regenerate'))
+    
+    except Exception as e:
+        return error_response('SERVER_ERROR', str(e), 500)
+    
+    def stream():
+        try:
+            if parse_outline_text:
+                events = ai_service.parse_outline_text_stream(project_context, use_cache=use_cache)
+            else:
+                events = ai_service.generate_outline_stream(project_context, use_cache=use_cache)
+            
+            outline = None
+            for event_type, data in events:
+                if event_type == 'outline':
+                    outline = data['outline']
+                else:
+                    yield _format_sse(event_type, data)
+            
+            pages_list = _replace_pages_from_outline(project, ai_service, outline)
+            yield _format_sse('completed', {'pages': [page.to_dict() for page in pages_list]})
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"generate_outline_stream failed: {str(e)}", exc_info=True)
+            yield _format_sse('error', {'message': str(e)})
+    
+    return _sse_response(stream())
+
+
 @project_bp.route('/<project_id>/generate/from-description', methods=['POST'])
 @login_required
 def generate_from_description(project_id):
@@ -471,7 +684,7 @@ def generate_from_description(project_id):
         
         # Initialize AI service
         from flask import current_app
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
@@ -561,7 +774,10 @@ def generate_descriptions(project_id):
     
     Request body:
     {
-        "max_workers": 5
+        "max_workers": 5,
+        "resume": false,  # skip pages that already have a generated description
+        "batch": true,    # describe several pages per request (default: DESCRIPTION_BATCH_ENABLED)
+        "force_regenerate": false  # regenerate instead of reusing cached answers for the same input
     }
     """
     try:
@@ -569,7 +785,14 @@ def generate_descriptions(project_id):
         if error:
             return error
         
-        if project.status not in ['OUTLINE_GENERATED', 'DRAFT', 'DESCRIPTIONS_GENERATED']:
+        data = request.get_json() or {}
+        resume = parse_bool(data.get('resume'))
+        
+        # A failed run leaves the project in GENERATING_DESCRIPTIONS, which is only valid to resume
+        allowed_statuses = ['OUTLINE_GENERATED', 'DRAFT', 'DESCRIPTIONS_GENERATED']
+        if resume:
+            allowed_statuses.append('GENERATING_DESCRIPTIONS')
+        if project.status not in allowed_statuses:
             return bad_request("Project must have outline generated first")
         
         # IMPORTANT: Expire cached objects to ensure fresh data
@@ -584,10 +807,10 @@ def generate_descriptions(project_id):
         # Reconstruct outline from pages with part structure
         outline = _reconstruct_outline_from_pages(pages)
         
-        data = request.get_json() or {}
         from flask import current_app
         # 从配置中读取默认并发数，如果请求中提供了则使用请求的值
         max_workers = data.get('max_workers', current_app.config.get('MAX_DESCRIPTION_WORKERS', 5))
+        batch = parse_bool(data.get('batch'), current_app.config.get('DESCRIPTION_BATCH_ENABLED', True))
         
         # Create task
         task = Task(
@@ -600,34 +823,18 @@ def generate_descriptions(project_id):
             'completed': 0,
             'failed': 0
         })
+        task.set_params({
+            'max_workers': max_workers,
+            'resume': resume,
+            'batch': batch,
+            'force_regenerate': parse_bool(data.get('force_regenerate'))
+        })
         
         db.session.add(task)
         db.session.commit()
         
-        # Initialize AI service
-        ai_service = AIService(
-            current_app.config['GOOGLE_API_KEY'],
-            current_app.config['GOOGLE_API_BASE']
-        )
-        
-        # Get reference files content and create project context
-        reference_files_content = _get_project_reference_files_content(project_id)
-        project_context = ProjectContext(project, reference_files_content)
-        
-        # Get app instance for background task
-        app = current_app._get_current_object()
-        
         # Submit background task
-        task_manager.submit_task(
-            task.id,
-            generate_descriptions_task,
-            project_id,
-            ai_service,
-            project_context,
-            outline,
-            max_workers,
-            app
-        )
+        _submit_descriptions_task(task, project, outline, current_app._get_current_object())
         
         # Update project status
         project.status = 'GENERATING_DESCRIPTIONS'
@@ -636,7 +843,8 @@ def generate_descriptions(project_id):
         return success_response({
             'task_id': task.id,
             'status': 'GENERATING_DESCRIPTIONS',
-            'total_pages': len(pages)
+            'total_pages': len(pages),
+            'resume': resume
         }, status_code=202)
     
     except Exception as e:
@@ -653,7 +861,8 @@ def generate_images(project_id):
     Request body:
     {
         "max_workers": 8,
-        "use_template": true
+        "use_template": true,
+        "resume": false  # skip pages that are already COMPLETED with a valid image on disk
     }
     """
     try:
@@ -682,6 +891,7 @@ def generate_images(project_id):
         max_workers = data.get('max_workers', current_app.config.get('MAX_IMAGE_WORKERS', 8))
         use_template = data.get('use_template', True)
         limit = data.get('limit')
+        resume = parse_bool(data.get('resume'))
         
         # Create task
         task = Task(
@@ -694,38 +904,18 @@ def generate_images(project_id):
             'completed': 0,
             'failed': 0
         })
+        task.set_params({
+            'max_workers': max_workers,
+            'use_template': use_template,
+            'limit': limit,
+            'resume': resume
+        })
         
         db.session.add(task)
         db.session.commit()
         
-        # Initialize services
-        ai_service = AIService(
-            current_app.config['GOOGLE_API_KEY'],
-            current_app.config['GOOGLE_API_BASE']
-        )
-        
-        from services import FileService
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        
-        # Get app instance for background task
-        app = current_app._get_current_object()
-        
         # Submit background task
-        task_manager.submit_task(
-            task.id,
-            generate_images_task,
-            project_id,
-            ai_service,
-            file_service,
-            outline,
-            use_template,
-            max_workers,
-            current_app.config['DEFAULT_ASPECT_RATIO'],
-            current_app.config['DEFAULT_RESOLUTION'],
-            app,
-            project.extra_requirements,
-            limit
-        )
+        _submit_images_task(task, project, outline, current_app._get_current_object())
         
         # Update project status
         project.status = 'GENERATING_IMAGES'
@@ -734,7 +924,97 @@ def generate_images(project_id):
         return success_response({
             'task_id': task.id,
             'status': 'GENERATING_IMAGES',
-            'total_pages': limit if limit else len(pages)
+            'total_pages': limit if limit else len(pages),
+            'resume': resume
+        }, status_code=202)
+    
+    except Exception as e:
+        db.session.rollback()
+        return error_response('SERVER_ERROR', str(e), 500)
+
+
+@project_bp.route('/<project_id>/generate/deck', methods=['POST'])
+@login_required
+def generate_deck(project_id):
+    """
+    POST /api/projects/{project_id}/generate/deck - Generate descriptions and images as one pipeline
+    
+    Each page's image is started as soon as its description is ready.
+    
+    Request body:
+    {
+        "description_workers": 5,  # parallel description requests (default: MAX_DESCRIPTION_WORKERS)
+        "image_workers": 8,        # pages in the image stage at once (default: MAX_IMAGE_WORKERS)
+        "use_template": true,
+        "resume": false,           # keep existing descriptions / valid images
+        "batch": true,             # describe several pages per request (default: DESCRIPTION_BATCH_ENABLED)
+        "force_regenerate": false  # regenerate descriptions instead of reusing cached answers
+    }
+    """
+    try:
+        project, error = _check_project_access(project_id)
+        if error:
+            return error
+        
+        data = request.get_json() or {}
+        resume = parse_bool(data.get('resume'))
+        
+        # A failed run leaves the project in GENERATING_DECK, which is only valid to resume
+        allowed_statuses = ['OUTLINE_GENERATED', 'DRAFT', 'DESCRIPTIONS_GENERATED', 'COMPLETED']
+        if resume:
+            allowed_statuses.append('GENERATING_DECK')
+        if project.status not in allowed_statuses:
+            return bad_request("Project must have outline generated first")
+        
+        # IMPORTANT: Expire cached objects to ensure fresh data
+        db.session.expire_all()
+        
+        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+        
+        if not pages:
+            return bad_request("No pages found for project")
+        
+        outline = _reconstruct_outline_from_pages(pages)
+        
+        from flask import current_app
+        # 从配置中读取默认并发数，如果请求中提供了则使用请求的值
+        description_workers = data.get('description_workers', current_app.config.get('MAX_DESCRIPTION_WORKERS', 5))
+        image_workers = data.get('image_workers', current_app.config.get('MAX_IMAGE_WORKERS', 8))
+        batch = parse_bool(data.get('batch'), current_app.config.get('DESCRIPTION_BATCH_ENABLED', True))
+        
+        task = Task(
+            project_id=project_id,
+            task_type='GENERATE_DECK',
+            status='PENDING'
+        )
+        task.set_progress({
+            'total': len(pages),
+            'completed': 0,
+            'failed': 0,
+            'described': 0
+        })
+        task.set_params({
+            'description_workers': description_workers,
+            'image_workers': image_workers,
+            'use_template': data.get('use_template', True),
+            'resume': resume,
+            'batch': batch,
+            'force_regenerate': parse_bool(data.get('force_regenerate'))
+        })
+        
+        db.session.add(task)
+        db.session.commit()
+        
+        _submit_deck_task(task, project, outline, current_app._get_current_object())
+        
+        project.status = 'GENERATING_DECK'
+        db.session.commit()
+        
+        return success_response({
+            'task_id': task.id,
+            'status': 'GENERATING_DECK',
+            'total_pages': len(pages),
+            'resume': resume
         }, status_code=202)
     
     except Exception as e:
@@ -742,6 +1022,15 @@ def generate_images(project_id):
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+def _task_to_dict(task: Task) -> dict:
+    """Task state, with live model call metrics while the task is still running"""
+    data = task.to_dict()
+    live_metrics = ai_metrics.task_breakdown(task.id)
+    if live_metrics:
+        data['metrics'] = live_metrics
+    return data
+
+
 @project_bp.route('/<project_id>/tasks/<task_id>', methods=['GET'])
 @login_required
 def get_task_status(project_id, task_id):
@@ -758,12 +1047,104 @@ def get_task_status(project_id, task_id):
         if not task or task.project_id != project_id:
             return not_found('Task')
         
-        return success_response(task.to_dict())
+        return success_response(_task_to_dict(task))
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+def _format_sse(event_type: str, data, event_id: int = None) -> str:
+    """Format one Server-Sent Event"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _sse_response(events) -> Response:
+    """Streaming text/event-stream response for a generator of formatted events"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # nginx: do not buffer the stream
+        }
+    )
+
+
+@project_bp.route('/<project_id>/tasks/<task_id>/events', methods=['GET'])
+@login_required
+def stream_task_events(project_id, task_id):
+    """
+    GET /api/projects/{project_id}/tasks/{task_id}/events - Stream task progress (Server-Sent Events)
+    
+    Events: snapshot (current task state), task_started, page_started, description_ready,
+    image_ready, page_failed, progress, task_completed, task_failed.
+    Reconnecting clients send Last-Event-ID and only receive the events they missed.
+    """
+    try:
+        project, error = _check_project_access(project_id)
+        if error:
+            return error
+        
+        task = Task.query.get(task_id)
+        if not task or task.project_id != project_id:
+            return not_found('Task')
+        
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+        except ValueError:
+            last_event_id = 0
+        
+        # Subscribe before reading the task state, so no event can fall between the two
+        subscription, backlog = progress_events.subscribe(task_id, last_event_id)
+        db.session.refresh(task)
+        snapshot = _task_to_dict(task)
+    
+    except Exception as e:
+        return error_response('SERVER_ERROR', str(e), 500)
+    
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            if not last_event_id:
+                yield _format_sse('snapshot', snapshot)
+            for event in backlog:
+                yield _format_sse(event['event'], event['data'], event['id'])
+                if event['event'] in TERMINAL_EVENTS:
+                    return
+            if snapshot['status'] in ('COMPLETED', 'FAILED'):
+                return
+            
+            idle_rounds = 0
+            while True:
+                event = subscription.get(timeout=15)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    idle_rounds += 1
+                    # Safety net for tasks that ended without publishing (e.g. killed worker)
+                    if idle_rounds % 4 == 0:
+                        db.session.expire_all()
+                        current = Task.query.get(task_id)
+                        if current is None or current.status in ('COMPLETED', 'FAILED'):
+                            if current is not None:
+                                yield _format_sse('snapshot', current.to_dict())
+                            return
+                    continue
+                
+                idle_rounds = 0
+                yield _format_sse(event['event'], event['data'], event['id'])
+                if event['event'] in TERMINAL_EVENTS:
+                    return
+        finally:
+            subscription.close()
+    
+    return _sse_response(stream())
+
+
 @project_bp.route('/<project_id>/refine/outline', methods=['POST'])
 @login_required
 def refine_outline(project_id):
@@ -803,7 +1184,7 @@ def refine_outline(project_id):
         
         # Initialize AI service
         from flask import current_app
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
@@ -919,6 +1300,110 @@ def refine_outline(project_id):
         return error_response('AI_SERVICE_ERROR', str(e), 503)
 
 
+def _prepare_descriptions_refinement(project: Project, data: dict):
+    """
+    Collect the inputs of a descriptions refinement request
+    
+    Returns:
+        (pages, refine_kwargs for ai_service.refine_descriptions, error_response)
+    """
+    if not data or not data.get('user_requirement'):
+        return None, None, bad_request("user_requirement is required")
+    
+    user_requirement = data['user_requirement']
+    
+    db.session.expire_all()
+    
+    # Get current pages
+    pages = Page.query.filter_by(project_id=project.id).order_by(Page.order_index).all()
+    
+    if not pages:
+        logger.info(f"项目 {project.id} 当前没有页面，无法修改描述")
+        return None, None, bad_request("No pages found for project. Please generate outline first.")
+    
+    # Check if pages have descriptions (允许没有描述，从空开始)
+    has_descriptions = any(page.description_content for page in pages)
+    if not has_descriptions:
+        logger.info(f"项目 {project.id} 当前没有描述，将基于大纲生成新描述")
+    
+    # Reconstruct outline from pages
+    outline = _reconstruct_outline_from_pages(pages)
+    
+    # Prepare current descriptions
+    current_descriptions = []
+    for i, page in enumerate(pages):
+        outline_content = page.get_outline_content()
+        desc_content = page.get_description_content()
+        
+        current_descriptions.append({
+            'index': i,
+            'title': outline_content.get('title', '未命名') if outline_content else '未命名',
+            'description_content': desc_content if desc_content else ''
+        })
+    
+    # Get reference files content and create project context
+    reference_files_content = _get_project_reference_files_content(project.id)
+    if reference_files_content:
+        logger.info(f"Found {len(reference_files_content)} reference files for refine_descriptions")
+        for rf in reference_files_content:
+            logger.info(f"  - {rf['filename']}: {len(rf['content'])} characters")
+    else:
+        logger.info(f"No reference files found for project {project.id}")
+    
+    project_context = ProjectContext(project.to_dict(), reference_files_content)
+    
+    # Get previous requirements from request
+    previous_requirements = data.get('previous_requirements', [])
+    
+    logger.info(f"开始修改页面描述: 项目 {project.id}, 用户要求: {user_requirement}, 历史要求数: {len(previous_requirements)}")
+    return pages, {
+        'current_descriptions': current_descriptions,
+        'user_requirement': user_requirement,
+        'project_context': project_context,
+        'outline': outline,
+        'previous_requirements': previous_requirements,
+    }, None
+
+
+def _apply_refined_descriptions(project: Project, pages: list, refined_descriptions: list):
+    """
+    Save refined descriptions to their pages and commit
+    
+    Returns:
+        Error message if the number of descriptions does not match the pages, else None
+    """
+    # 验证返回的描述数量
+    if len(refined_descriptions) != len(pages):
+        error_msg = ""
+        logger.error(f"AI 返回的描述数量不匹配: 期望 {len(pages)} 个页面，实际返回 {len(refined_descriptions)} 个描述。")
+        
+        # 如果 AI 试图增删页面，给出明确提示
+        if len(refined_descriptions) > len(pages):
+            error_msg += " 提示：如需增加页面，请在大纲页面进行操作。"
+        elif len(refined_descriptions) < len(pages):
+            error_msg += " 提示：如需删除页面，请在大纲页面进行操作。"
+        
+        return error_msg
+    
+    # Update pages with refined descriptions
+    for page, refined_desc in zip(pages, refined_descriptions):
+        desc_content = {
+            "text": refined_desc,
+            "generated_at": datetime.utcnow().isoformat()
+        }
+        page.set_description_content(desc_content)
+        page.status = 'DESCRIPTION_GENERATED'
+    
+    # Update project status
+    project.status = 'DESCRIPTIONS_GENERATED'
+    project.updated_at = datetime.utcnow()
+    
+    db.session.commit()
+    
+    logger.info(f"页面描述修改完成: 项目 {project.id}, 更新了 {len(pages)} 个页面")
+    return None
+
+
 @project_bp.route('/<project_id>/refine/descriptions', methods=['POST'])
 @login_required
 def refine_descriptions(project_id):
@@ -935,103 +1420,24 @@ def refine_descriptions(project_id):
         if error:
             return error
         
-        data = request.get_json()
-        
-        if not data or not data.get('user_requirement'):
-            return bad_request("user_requirement is required")
-        
-        user_requirement = data['user_requirement']
-        
-        db.session.expire_all()
-        
-        # Get current pages
-        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        
-        if not pages:
-            logger.info(f"项目 {project_id} 当前没有页面，无法修改描述")
-            return bad_request("No pages found for project. Please generate outline first.")
-        
-        # Check if pages have descriptions (允许没有描述，从空开始)
-        has_descriptions = any(page.description_content for page in pages)
-        if not has_descriptions:
-            logger.info(f"项目 {project_id} 当前没有描述，将基于大纲生成新描述")
-        
-        # Reconstruct outline from pages
-        outline = _reconstruct_outline_from_pages(pages)
-        
-        # Prepare current descriptions
-        current_descriptions = []
-        for i, page in enumerate(pages):
-            outline_content = page.get_outline_content()
-            desc_content = page.get_description_content()
-            
-            current_descriptions.append({
-                'index': i,
-                'title': outline_content.get('title', '未命名') if outline_content else '未命名',
-                'description_content': desc_content if desc_content else ''
-            })
+        pages, refine_kwargs, error = _prepare_descriptions_refinement(project, request.get_json())
+        if error:
+            return error
         
         # Initialize AI service
         from flask import current_app
-        ai_service = AIService(
+        ai_service = client_registry.get_ai_service(
             current_app.config['GOOGLE_API_KEY'],
             current_app.config['GOOGLE_API_BASE']
         )
         
-        # Get reference files content and create project context
-        reference_files_content = _get_project_reference_files_content(project_id)
-        if reference_files_content:
-            logger.info(f"Found {len(reference_files_content)} reference files for refine_descriptions")
-            for rf in reference_files_content:
-                logger.info(f"  - {rf['filename']}: {len(rf['content'])} characters")
-        else:
-            logger.info(f"No reference files found for project {project_id}")
-        
-        project_context = ProjectContext(project.to_dict(), reference_files_content)
-        
-        # Get previous requirements from request
-        previous_requirements = data.get('previous_requirements', [])
-        
         # Refine descriptions
-        logger.info(f"开始修改页面描述: 项目 {project_id}, 用户要求: {user_requirement}, 历史要求数: {len(previous_requirements)}")
-        refined_descriptions = ai_service.refine_descriptions(
-            current_descriptions=current_descriptions,
-            user_requirement=user_requirement,
-            project_context=project_context,
-            outline=outline,
-            previous_requirements=previous_requirements
-        )
+        refined_descriptions = ai_service.refine_descriptions(**refine_kwargs)
         
-        # 验证返回的描述数量
-        if len(refined_descriptions) != len(pages):
-            error_msg = ""
-            logger.error(f"AI 返回的描述数量不匹配: 期望 {len(pages)} 个页面，实际返回 {len(refined_descriptions)} 个描述。")
-            
-            # 如果 AI 试图增删页面，给出明确提示
-            if len(refined_descriptions) > len(pages):
-                error_msg += " 提示：如需增加页面，请在大纲页面进行操作。"
-            elif len(refined_descriptions) < len(pages):
-                error_msg += " 提示：如需删除页面，请在大纲页面进行操作。"
-            
+        error_msg = _apply_refined_descriptions(project, pages, refined_descriptions)
+        if error_msg is not None:
             return bad_request(error_msg)
         
-        # Update pages with refined descriptions
-        for page, refined_desc in zip(pages, refined_descriptions):
-            desc_content = {
-                "text": refined_desc,
-                "generated_at": datetime.utcnow().isoformat()
-            }
-            page.set_description_content(desc_content)
-            page.status = 'DESCRIPTION_GENERATED'
-        
-        # Update project status
-        project.status = 'DESCRIPTIONS_GENERATED'
-        project.updated_at = datetime.utcnow()
-        
-        db.session.commit()
-        
-        logger.info(f"页面描述修改完成: 项目 {project_id}, 更新了 {len(pages)} 个页面")
-        
         # Return pages
         return success_response({
             'pages': [page.to_dict() for page in pages],
@@ -1042,3 +1448,60 @@ def refine_descriptions(project_id):
         db.session.rollback()
         logger.error(f"refine_descriptions failed: {str(e)}", exc_info=True)
         return error_response('AI_SERVICE_ERROR', str(e), 503)
+
+
+@project_bp.route('/<project_id>/refine/descriptions/stream', methods=['POST'])
+@login_required
+def refine_descriptions_stream(project_id):
+    """
+    POST /api/projects/{project_id}/refine/descriptions/stream - Refine page descriptions, streamed (Server-Sent Events)
+    
+    Same request body as /refine/descriptions. Events: delta {text}, description {index, page_id, text}
+    as soon as each page's new description is complete, then completed {pages, message} once the
+    descriptions are saved, or error {message}.
+    """
+    try:
+        project, error = _check_project_access(project_id)
+        if error:
+            return error
+        
+        pages, refine_kwargs, error = _prepare_descriptions_refinement(project, request.get_json())
+        if error:
+            return error
+        
+        from flask import current_app
+        ai_service = client_registry.get_ai_service(
+            current_app.config['GOOGLE_API_KEY'],
+            current_app.config['GOOGLE_API_BASE']
+        )
+    
+    except Exception as e:
+        return error_response('SERVER_ERROR', str(e), 500)
+    
+    def stream():
+        try:
+            refined_descriptions = None
+            for event_type, data in ai_service.refine_descriptions_stream(**refine_kwargs):
+                if event_type == 'descriptions':
+                    refined_descriptions = data['descriptions']
+                    continue
+                if event_type == 'description':
+                    if data['index'] >= len(pages):
+                        continue
+                    data = {**data, 'page_id': pages[data['index']].id}
+                yield _format_sse(event_type, data)
+            
+            error_msg = _apply_refined_descriptions(project, pages, refined_descriptions)
+            if error_msg is not None:
+                yield _format_sse('error', {'message': error_msg})
+                return
+            yield _format_sse('completed', {
+                'pages': [page.to_dict() for page in pages],
+                'message': '页面描述修改成功'
+            })
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"refine_descriptions_stream failed: {str(e)}", exc_info=True)
+            yield _format_sse('error', {'message': str(e)})
+    
+    return _sse_response(stream())
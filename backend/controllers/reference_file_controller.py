@@ -16,6 +16,7 @@ import threading
 from models import db, ReferenceFile, Project
 from utils.response import success_response, error_response, bad_request, not_found
 from services.file_parser_service import FileParserService
+from services.task_manager import get_task_owner
 
 logger = logging.getLogger(__name__)
 
@@ -62,7 +63,8 @@ def _parse_file_async(file_id: str, file_path: str, filename: str, app):
                 mineru_api_base=current_app.config['MINERU_API_BASE'],
                 google_api_key=current_app.config['GOOGLE_API_KEY'],
                 google_api_base=current_app.config['GOOGLE_API_BASE'],
-                image_caption_model=current_app.config['IMAGE_CAPTION_MODEL']
+                image_caption_model=current_app.config['IMAGE_CAPTION_MODEL'],
+                owner=get_task_owner(reference_file.project_id)
             )
             
             # Parse file
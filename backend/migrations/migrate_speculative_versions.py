@@ -0,0 +1,57 @@
+import sys
+import os
+import sqlite3
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+# Columns marking pre-generated (speculative) edit variants of a page image
+VERSION_COLUMNS = [
+    ("is_speculative", "BOOLEAN NOT NULL DEFAULT 0"),
+    ("speculative_key", "VARCHAR(64)"),
+    ("speculative_instruction", "VARCHAR(500)"),
+]
+
+
+def migrate():
+    print("Migrating database...")
+
+    # Get database path from config
+    db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+    print(f"Database path: {db_path}")
+
+    if not os.path.exists(db_path):
+        print("Database not found!")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(page_image_versions)")
+        columns = [info[1] for info in cursor.fetchall()]
+
+        for name, column_type in VERSION_COLUMNS:
+            if name not in columns:
+                print(f"Adding {name} column to page_image_versions table...")
+                cursor.execute(f"ALTER TABLE page_image_versions ADD COLUMN {name} {column_type}")
+            else:
+                print(f"Column {name} already exists.")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_page_image_versions_is_speculative "
+                       "ON page_image_versions(is_speculative)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_page_image_versions_speculative_key "
+                       "ON page_image_versions(speculative_key)")
+        conn.commit()
+        print("Migration successful!")
+
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,58 @@
+import sys
+import os
+import sqlite3
+
+# Add backend directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+# Columns used by the durable task queue (leases, heartbeats, resume params)
+TASK_COLUMNS = [
+    ("params", "TEXT"),
+    ("lease_owner", "VARCHAR(100)"),
+    ("lease_expires_at", "DATETIME"),
+    ("heartbeat_at", "DATETIME"),
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    # Model call totals of the task (latency, tokens, payload bytes, retries)
+    ("metrics", "TEXT"),
+]
+
+
+def migrate():
+    print("Migrating database...")
+
+    # Get database path from config
+    db_path = Config.SQLALCHEMY_DATABASE_URI.replace('sqlite:///', '')
+    print(f"Database path: {db_path}")
+
+    if not os.path.exists(db_path):
+        print("Database not found!")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("PRAGMA table_info(tasks)")
+        columns = [info[1] for info in cursor.fetchall()]
+
+        for name, column_type in TASK_COLUMNS:
+            if name not in columns:
+                print(f"Adding {name} column to tasks table...")
+                cursor.execute(f"ALTER TABLE tasks ADD COLUMN {name} {column_type}")
+            else:
+                print(f"Column {name} already exists.")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_tasks_lease_expires_at ON tasks(lease_expires_at)")
+        conn.commit()
+        print("Migration successful!")
+
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -62,22 +62,34 @@ class Page(db.Model):
         else:
             self.description_content = None
     
-    def to_dict(self, include_versions=False):
-        """Convert to dictionary"""
+    def to_dict(self, include_versions=False, summary=False):
+        """
+        Convert to dictionary
+        
+        Args:
+            summary: Only the outline title and whether a description exists (has_description),
+                     for project lists
+        """
+        outline_content = self.get_outline_content()
         data = {
             'page_id': self.id,
             'order_index': self.order_index,
             'part': self.part,
-            'outline_content': self.get_outline_content(),
-            'description_content': self.get_description_content(),
+            'outline_content': outline_content,
+            'description_content': None if summary else self.get_description_content(),
             'generated_image_url': f'/files/{self.project_id}/pages/{self.generated_image_path.split("/")[-1]}' if self.generated_image_path else None,
             'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
         
+        if summary:
+            data['outline_content'] = {'title': outline_content.get('title')} if isinstance(outline_content, dict) else None
+            data['has_description'] = bool(self.description_content)
+            del data['description_content']
+        
         if include_versions:
-            data['image_versions'] = [v.to_dict() for v in self.image_versions.all()]
+            data['image_versions'] = [v.to_dict() for v in self.image_versions.filter_by(is_speculative=False).all()]
         
         return data
     
@@ -17,6 +17,10 @@ class PageImageVersion(db.Model):
     image_path = db.Column(db.String(500), nullable=False)
     version_number = db.Column(db.Integer, nullable=False)  # 版本号，从1开始递增
     is_current = db.Column(db.Boolean, nullable=False, default=False)  # 是否为当前使用的版本
+    # 预生成的编辑变体（空闲时按常用编辑指令提前生成），被采用前不计入版本历史，version_number 为 0
+    is_speculative = db.Column(db.Boolean, nullable=False, default=False, index=True)
+    speculative_key = db.Column(db.String(64), nullable=True, index=True)  # 指令 + 源图片 + 描述 + 尺寸的哈希
+    speculative_instruction = db.Column(db.String(500), nullable=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     # Relationships
@@ -33,6 +37,7 @@ class PageImageVersion(db.Model):
             'image_url': f'/files/{project_id}/pages/{self.image_path.split("/")[-1]}' if self.image_path and project_id else None,
             'version_number': self.version_number,
             'is_current': self.is_current,
+            'is_speculative': bool(self.is_speculative),
             'created_at': self.created_at.isoformat() if self.created_at else None,
         }
     
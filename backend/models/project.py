@@ -32,8 +32,8 @@ class Project(db.Model):
     materials = db.relationship('Material', back_populates='project', lazy='dynamic',
                            cascade='all, delete-orphan')
     
-    def to_dict(self, include_pages=False):
-        """Convert to dictionary"""
+    def to_dict(self, include_pages=False, page_summary=False):
+        """Convert to dictionary (page_summary: pages as Page.to_dict(summary=True))"""
         data = {
             'project_id': self.id,
             'user_id': self.user_id,
@@ -49,7 +49,7 @@ class Project(db.Model):
         }
         
         if include_pages:
-            data['pages'] = [page.to_dict() for page in self.pages.order_by('order_index')]
+            data['pages'] = [page.to_dict(summary=page_summary) for page in self.pages.order_by('order_index')]
         
         return data
     
@@ -15,10 +15,16 @@ class Task(db.Model):
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     project_id = db.Column(db.String(36), db.ForeignKey('projects.id'), nullable=False)
-    task_type = db.Column(db.String(50), nullable=False)  # GENERATE_DESCRIPTIONS|GENERATE_IMAGES
+    task_type = db.Column(db.String(50), nullable=False)  # GENERATE_DESCRIPTIONS|GENERATE_IMAGES|GENERATE_DECK|EXPORT|...
     status = db.Column(db.String(50), nullable=False, default='PENDING')
     progress = db.Column(db.Text, nullable=True)  # JSON string: {"total": 10, "completed": 5, "failed": 0}
     error_message = db.Column(db.Text, nullable=True)
+    params = db.Column(db.Text, nullable=True)  # JSON string: arguments needed to resume the task after a restart
+    lease_owner = db.Column(db.String(100), nullable=True)  # Worker currently holding the task
+    lease_expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    metrics = db.Column(db.Text, nullable=True)  # JSON string: model call totals (calls, tokens, bytes, retries, latency)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     
@@ -41,6 +47,43 @@ class Task(db.Model):
         else:
             self.progress = None
     
+    def get_params(self):
+        """Parse params from JSON string"""
+        if self.params:
+            try:
+                return json.loads(self.params)
+            except json.JSONDecodeError:
+                return {}
+        return {}
+    
+    def set_params(self, data):
+        """Set params as JSON string"""
+        if data:
+            self.params = json.dumps(data, ensure_ascii=False)
+        else:
+            self.params = None
+    
+    def get_metrics(self):
+        """Parse metrics from JSON string"""
+        if self.metrics:
+            try:
+                return json.loads(self.metrics)
+            except json.JSONDecodeError:
+                return None
+        return None
+    
+    def get_completed_pages(self):
+        """Get ids of pages already finished by this task (checkpoint for resume)"""
+        return self.get_progress().get('completed_pages', [])
+    
+    def add_completed_page(self, page_id):
+        """Record a finished page in the progress checkpoint"""
+        prog = self.get_progress()
+        completed_pages = prog.setdefault('completed_pages', [])
+        if page_id not in completed_pages:
+            completed_pages.append(page_id)
+        self.set_progress(prog)
+    
     def update_progress(self, completed=None, failed=None):
         """Update progress incrementally"""
         prog = self.get_progress()
@@ -58,6 +101,8 @@ class Task(db.Model):
             'status': self.status,
             'progress': self.get_progress(),
             'error_message': self.error_message,
+            'attempts': self.attempts,
+            'metrics': self.get_metrics(),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
         }
@@ -5,24 +5,37 @@ TODO: use structured output API
 """
 import os
 import json
+import itertools
 import re
+import hashlib
 import logging
+import mimetypes
 import requests
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 from textwrap import dedent
-from google import genai
-from google.genai import types
+from google.genai import types, errors
 from PIL import Image
+from .rate_limiter import call_with_rate_limit, acall_with_rate_limit, estimate_tokens
+from .metrics import estimate_request_bytes
+from .response_cache import response_cache
+from .image_cache import reference_images
+from .file_uploads import GeminiFileUploader, uploaded_files, get_file_uris
+from .async_runtime import async_runtime
+from .client_registry import client_registry
+from .json_stream import JSONArrayStreamParser, OutlineStreamParser
+from .context_cache import context_cache, PromptPrefix
 from .prompts import (
     get_outline_generation_prompt,
     get_outline_parsing_prompt,
     get_page_description_prompt,
+    get_batch_page_descriptions_prompt,
     get_image_generation_prompt,
     get_image_edit_prompt,
     get_description_to_outline_prompt,
     get_description_split_prompt,
     get_outline_refinement_prompt,
-    get_descriptions_refinement_prompt
+    get_descriptions_refinement_prompt,
+    get_reference_files_prefix
 )
 
 logger = logging.getLogger(__name__)
@@ -53,6 +66,21 @@ class ProjectContext:
         
         self.reference_files_content = reference_files_content or []
     
+    @property
+    def reference_files_scope(self) -> str:
+        """Identity of the set of reference files (stable while files are only updated)"""
+        ids = sorted(f.get('id') or f.get('filename', '') for f in self.reference_files_content)
+        return hashlib.sha256(json.dumps(ids).encode('utf-8')).hexdigest()
+    
+    @property
+    def reference_files_key(self) -> str:
+        """Identity of the exact reference-file prefix: file ids + updated_at, or the content itself"""
+        if all(f.get('id') and f.get('updated_at') for f in self.reference_files_content):
+            parts = [[f['id'], f['updated_at']] for f in self.reference_files_content]
+        else:
+            parts = [[f.get('filename', ''), f.get('content', '')] for f in self.reference_files_content]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+    
     def to_dict(self) -> Dict:
         """转换为字典，方便传递"""
         return {
@@ -69,15 +97,211 @@ class AIService:
     
     def __init__(self, api_key: str, api_base: str = None):
         """Initialize AI service with API credentials"""
-        # Always create HttpOptions, matching gemini_genai.py behavior
-        self.client = genai.Client(
-            http_options=types.HttpOptions(
-                base_url=api_base
-            ),
-            api_key=api_key
-        )
+        # Shared per (api_key, api_base): reuses pooled keep-alive connections across requests
+        self.client = client_registry.get_client(api_key, api_base)
         self.text_model = "gemini-2.5-flash"
         self.image_model = "gemini-3-pro-image-preview"
+        # Large reference images are uploaded once and sent as file handles
+        self.file_uploader = GeminiFileUploader(
+            self.client,
+            scope=hashlib.sha256(f"{api_base}|{api_key}".encode('utf-8')).hexdigest()[:16]
+        )
+    
+    def _generate_content(self, model: str, contents, config: types.GenerateContentConfig = None):
+        """
+        Call Gemini generate_content under the shared per-model rate limiter
+        (RPM/TPM buckets, AIMD concurrency, retry on 429/503/5xx)
+        """
+        return call_with_rate_limit(
+            model,
+            lambda: self.client.models.generate_content(model=model, contents=contents, config=config),
+            estimated_tokens=estimate_tokens(contents),
+            request_bytes=estimate_request_bytes(contents)
+        )
+    
+    async def _agenerate_content(self, model: str, contents, config: types.GenerateContentConfig = None):
+        """_generate_content() on the async client, for coroutines running on the async runtime"""
+        return await acall_with_rate_limit(
+            model,
+            lambda: self.client.aio.models.generate_content(model=model, contents=contents, config=config),
+            estimated_tokens=estimate_tokens(contents),
+            request_bytes=estimate_request_bytes(contents)
+        )
+    
+    def _generate_text(self, prompt: str, thinking_budget: int = 1000, expect_json: bool = False,
+                       response_schema: Optional[types.Schema] = None,
+                       prefix: Optional[PromptPrefix] = None, use_cache: bool = True) -> str:
+        """
+        Generate text with the text model, served from the response cache when the
+        same (model, prompt, config) was answered before
+        
+        Args:
+            prompt: Text prompt
+            thinking_budget: Thinking token budget
+            expect_json: Only cache the response if it parses as JSON, so a malformed
+                answer is regenerated on the next call instead of being replayed
+            response_schema: Optional structured output schema (implies a JSON response)
+            prefix: Shared reference-file prefix; prompt then only holds the delta
+            use_cache: False for an explicit regenerate: skip the cached answer and
+                replace it with the new one
+        """
+        config, full_prompt, cache_key, expect_json = self._prepare_text_request(
+            prompt, thinking_budget, expect_json, response_schema, prefix
+        )
+        cached = response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            logger.debug(f"Response cache hit for {self.text_model} ({cache_key[:12]})")
+            return cached
+        
+        response = None
+        if prefix is not None and prefix.is_cached:
+            try:
+                response = self._generate_content(
+                    model=self.text_model, contents=prompt,
+                    config=config.model_copy(update={'cached_content': prefix.cache_name})
+                )
+            except errors.APIError as e:
+                if e.code not in (400, 403, 404):
+                    raise
+                # Handle expired or deleted on the server: drop it and send the prefix inline
+                logger.warning(f"Context cache {prefix.cache_name} rejected ({e.code}), retrying inline")
+                context_cache.invalidate(self.text_model, prefix.key)
+        if response is None:
+            response = self._generate_content(model=self.text_model, contents=full_prompt, config=config)
+        return self._finish_text_response(response, cache_key, expect_json)
+    
+    async def _agenerate_text(self, prompt: str, thinking_budget: int = 1000, expect_json: bool = False,
+                              response_schema: Optional[types.Schema] = None,
+                              prefix: Optional[PromptPrefix] = None, use_cache: bool = True) -> str:
+        """_generate_text() on the async client (same caching and context-cache fallback)"""
+        config, full_prompt, cache_key, expect_json = self._prepare_text_request(
+            prompt, thinking_budget, expect_json, response_schema, prefix
+        )
+        # The response cache may hit the disk store
+        cached = await async_runtime.run_blocking(response_cache.get, cache_key) if use_cache else None
+        if cached is not None:
+            logger.debug(f"Response cache hit for {self.text_model} ({cache_key[:12]})")
+            return cached
+        
+        response = None
+        if prefix is not None and prefix.is_cached:
+            try:
+                response = await self._agenerate_content(
+                    model=self.text_model, contents=prompt,
+                    config=config.model_copy(update={'cached_content': prefix.cache_name})
+                )
+            except errors.APIError as e:
+                if e.code not in (400, 403, 404):
+                    raise
+                logger.warning(f"Context cache {prefix.cache_name} rejected ({e.code}), retrying inline")
+                context_cache.invalidate(self.text_model, prefix.key)
+        if response is None:
+            response = await self._agenerate_content(model=self.text_model, contents=full_prompt, config=config)
+        return await async_runtime.run_blocking(self._finish_text_response, response, cache_key, expect_json)
+    
+    def _prepare_text_request(self, prompt: str, thinking_budget: int, expect_json: bool,
+                              response_schema: Optional[types.Schema], prefix: Optional[PromptPrefix]):
+        """Config, full prompt and response cache key of a text request"""
+        config = types.GenerateContentConfig(
+            thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
+        )
+        if response_schema is not None:
+            config.response_mime_type = 'application/json'
+            config.response_schema = response_schema
+            expect_json = True
+        # Keyed on the full logical prompt, so hits do not depend on the cache handle in use
+        full_prompt = prefix.text + prompt if prefix else prompt
+        cache_key = response_cache.make_key(self.text_model, full_prompt, config)
+        return config, full_prompt, cache_key, expect_json
+    
+    def _finish_text_response(self, response, cache_key: str, expect_json: bool) -> str:
+        """Text of a response, stored in the response cache if it is usable"""
+        text = response.text
+        if text and (not expect_json or self._is_json(text)):
+            response_cache.set(cache_key, self.text_model, text)
+        return text
+    
+    def _generate_text_stream(self, prompt: str, thinking_budget: int = 1000, expect_json: bool = False,
+                              prefix: Optional[PromptPrefix] = None, use_cache: bool = True) -> Iterator[str]:
+        """
+        Streaming _generate_text(): yields text chunks as the model writes them
+        
+        A response cache hit is replayed as a single chunk; the complete answer is cached the
+        same way as a blocking call (use_cache as in _generate_text()).
+        """
+        config, full_prompt, cache_key, expect_json = self._prepare_text_request(
+            prompt, thinking_budget, expect_json, None, prefix
+        )
+        cached = response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            logger.debug(f"Response cache hit for {self.text_model} ({cache_key[:12]})")
+            yield cached
+            return
+        
+        stream = None
+        if prefix is not None and prefix.is_cached:
+            try:
+                first, stream = self._open_text_stream(
+                    prompt, config.model_copy(update={'cached_content': prefix.cache_name})
+                )
+            except errors.APIError as e:
+                if e.code not in (400, 403, 404):
+                    raise
+                logger.warning(f"Context cache {prefix.cache_name} rejected ({e.code}), retrying inline")
+                context_cache.invalidate(self.text_model, prefix.key)
+        if stream is None:
+            first, stream = self._open_text_stream(full_prompt, config)
+        
+        chunks = []
+        for chunk in itertools.chain([first] if first is not None else [], stream):
+            text = chunk.text
+            if text:
+                chunks.append(text)
+                yield text
+        
+        text = ''.join(chunks)
+        if text and (not expect_json or self._is_json(text)):
+            response_cache.set(cache_key, self.text_model, text)
+    
+    def _open_text_stream(self, contents, config: types.GenerateContentConfig):
+        """
+        Start a streaming request under the rate limiter and wait for its first chunk, so
+        throttling and transient errors (which arrive before any text) are retried
+        
+        Returns:
+            (first chunk or None, iterator over the remaining chunks)
+        """
+        def open_stream():
+            stream = self.client.models.generate_content_stream(
+                model=self.text_model, contents=contents, config=config
+            )
+            return next(stream, None), stream
+        
+        # Recorded latency is the time to the first chunk
+        return call_with_rate_limit(
+            self.text_model, open_stream, estimated_tokens=estimate_tokens(contents),
+            request_bytes=estimate_request_bytes(contents), operation='generate_content_stream'
+        )
+    
+    def _get_reference_prefix(self, project_context: ProjectContext) -> Optional[PromptPrefix]:
+        """Context-cached reference-file prefix of a project, None if it has no reference files"""
+        if not project_context.reference_files_content:
+            return None
+        return context_cache.get_prefix(
+            self.client, self.text_model,
+            scope=project_context.reference_files_scope,
+            key=project_context.reference_files_key,
+            text=get_reference_files_prefix(project_context)
+        )
+    
+    @staticmethod
+    def _is_json(text: str) -> bool:
+        """Whether a (possibly ```json fenced) response parses as JSON"""
+        try:
+            json.loads(text.strip().strip("```json").strip("```").strip())
+            return True
+        except ValueError:
+            return False
     
     @staticmethod
     def extract_image_urls_from_markdown(text: str) -> List[str]:
@@ -177,56 +401,76 @@ class AIService:
             logger.error(f"Failed to download image from {url}: {str(e)}")
             return None
     
-    def generate_outline(self, project_context: ProjectContext) -> List[Dict]:
+    def generate_outline(self, project_context: ProjectContext, use_cache: bool = True) -> List[Dict]:
         """
         Generate PPT outline from idea prompt
         Based on demo.py gen_outline()
         
         Args:
             project_context: 项目上下文对象，包含所有原始信息
+            use_cache: False to regenerate instead of replaying a cached answer
             
         Returns:
             List of outline items (may contain parts with pages or direct pages)
         """
         outline_prompt = get_outline_generation_prompt(project_context)
         
-        response = self.client.models.generate_content(
-            model=self.text_model,
-            contents=outline_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=1000),
-            ),
-        )
+        response_text = self._generate_text(outline_prompt, expect_json=True, use_cache=use_cache)
         
-        outline_text = response.text.strip().strip("```json").strip("```").strip()
+        outline_text = response_text.strip().strip("```json").strip("```").strip()
         outline = json.loads(outline_text)
         return outline
     
-    def parse_outline_text(self, project_context: ProjectContext) -> List[Dict]:
+    def parse_outline_text(self, project_context: ProjectContext, use_cache: bool = True) -> List[Dict]:
         """
         Parse user-provided outline text into structured outline format
         This method analyzes the text and splits it into pages without modifying the original text
         
         Args:
             project_context: 项目上下文对象，包含所有原始信息
+            use_cache: False to regenerate instead of replaying a cached answer
         
         Returns:
             List of outline items (may contain parts with pages or direct pages)
         """
         parse_prompt = get_outline_parsing_prompt(project_context)
         
-        response = self.client.models.generate_content(
-            model=self.text_model,
-            contents=parse_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=1000),
-            ),
-        )
+        response_text = self._generate_text(parse_prompt, expect_json=True, use_cache=use_cache)
         
-        outline_json = response.text.strip().strip("```json").strip("```").strip()
+        outline_json = response_text.strip().strip("```json").strip("```").strip()
         outline = json.loads(outline_json)
         return outline
     
+    def generate_outline_stream(self, project_context: ProjectContext,
+                                use_cache: bool = True) -> Iterator[Tuple[str, Dict]]:
+        """
+        Streaming generate_outline()
+        
+        Yields:
+            ('delta', {'text'}) for every text chunk, ('page', {'index', 'page'}) as soon as a
+            page object of the outline is complete, and finally ('outline', {'outline'})
+        """
+        return self._stream_outline(get_outline_generation_prompt(project_context), use_cache)
+    
+    def parse_outline_text_stream(self, project_context: ProjectContext,
+                                  use_cache: bool = True) -> Iterator[Tuple[str, Dict]]:
+        """Streaming parse_outline_text(), same events as generate_outline_stream()"""
+        return self._stream_outline(get_outline_parsing_prompt(project_context), use_cache)
+    
+    def _stream_outline(self, prompt: str, use_cache: bool = True) -> Iterator[Tuple[str, Dict]]:
+        parser = OutlineStreamParser()
+        chunks = []
+        page_index = 0
+        for text in self._generate_text_stream(prompt, expect_json=True, use_cache=use_cache):
+            chunks.append(text)
+            yield 'delta', {'text': text}
+            for page in parser.feed(text):
+                yield 'page', {'index': page_index, 'page': page}
+                page_index += 1
+        
+        outline_text = ''.join(chunks).strip().strip("```json").strip("```").strip()
+        yield 'outline', {'outline': json.loads(outline_text)}
+    
     def flatten_outline(self, outline: List[Dict]) -> List[Dict]:
         """
         Flatten outline structure to page list
@@ -246,7 +490,7 @@ class AIService:
         return pages
     
     def generate_page_description(self, project_context: ProjectContext, outline: List[Dict], 
-                                 page_outline: Dict, page_index: int) -> str:
+                                 page_outline: Dict, page_index: int, use_cache: bool = True) -> str:
         """
         Generate description for a single page
         Based on demo.py gen_desc() logic
@@ -256,30 +500,152 @@ class AIService:
             outline: Complete outline
             page_outline: Outline for this specific page
             page_index: Page number (1-indexed)
+            use_cache: False to regenerate instead of replaying a cached answer
         
         Returns:
             Text description for the page
         """
+        desc_prompt, prefix = self._page_description_request(project_context, outline, page_outline, page_index)
+        
+        response_text = self._generate_text(desc_prompt, prefix=prefix, use_cache=use_cache)
+        
+        page_desc = response_text
+        return dedent(page_desc)
+    
+    async def agenerate_page_description(self, project_context: ProjectContext, outline: List[Dict],
+                                         page_outline: Dict, page_index: int, use_cache: bool = True) -> str:
+        """generate_page_description() on the async client"""
+        # Creating the context-cached prefix is a blocking API call (once per reference-file set)
+        desc_prompt, prefix = await async_runtime.run_blocking(
+            self._page_description_request, project_context, outline, page_outline, page_index
+        )
+        response_text = await self._agenerate_text(desc_prompt, prefix=prefix, use_cache=use_cache)
+        return dedent(response_text)
+    
+    def generate_page_description_stream(self, project_context: ProjectContext, outline: List[Dict],
+                                         page_outline: Dict, page_index: int,
+                                         use_cache: bool = True) -> Iterator[Tuple[str, Dict]]:
+        """
+        Streaming generate_page_description()
+        
+        Yields:
+            ('delta', {'text'}) for every text chunk, then ('description', {'text'}) with the
+            complete description
+        """
+        desc_prompt, prefix = self._page_description_request(project_context, outline, page_outline, page_index)
+        chunks = []
+        for text in self._generate_text_stream(desc_prompt, prefix=prefix, use_cache=use_cache):
+            chunks.append(text)
+            yield 'delta', {'text': text}
+        yield 'description', {'text': dedent(''.join(chunks))}
+    
+    def _page_description_request(self, project_context: ProjectContext, outline: List[Dict],
+                                  page_outline: Dict, page_index: int):
+        """Prompt and reference-file prefix of a page description request"""
         part_info = f"\nThis page belongs to: {page_outline['part']}" if 'part' in page_outline else ""
         
+        prefix = self._get_reference_prefix(project_context)
         desc_prompt = get_page_description_prompt(
             project_context=project_context,
             outline=outline,
             page_outline=page_outline,
             page_index=page_index,
-            part_info=part_info
+            part_info=part_info,
+            include_files=prefix is None
         )
+        return desc_prompt, prefix
+    
+    def generate_page_descriptions_batch(self, project_context: ProjectContext, outline: List[Dict],
+                                         pages: List[Dict], use_cache: bool = True) -> Dict[int, str]:
+        """
+        Generate descriptions for several pages in one structured call, so the
+        reference files and outline are sent once per batch instead of once per page
+        
+        Args:
+            project_context: 项目上下文对象，包含所有原始信息
+            outline: Complete outline
+            pages: List of {"page_index": int (1-indexed), "page_outline": dict}
+            use_cache: False to regenerate instead of replaying a cached answer
+        
+        Returns:
+            Dict of page_index -> description text (pages missing from the answer are omitted)
+        """
+        batch_prompt, schema, prefix = self._batch_descriptions_request(project_context, outline, pages)
+        
+        response_text = self._generate_text(batch_prompt, response_schema=schema, prefix=prefix,
+                                            use_cache=use_cache)
         
-        response = self.client.models.generate_content(
-            model=self.text_model,
-            contents=desc_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=1000),
+        return self._parse_batch_descriptions(response_text, pages)
+    
+    async def agenerate_page_descriptions_batch(self, project_context: ProjectContext, outline: List[Dict],
+                                                pages: List[Dict], use_cache: bool = True) -> Dict[int, str]:
+        """generate_page_descriptions_batch() on the async client"""
+        batch_prompt, schema, prefix = await async_runtime.run_blocking(
+            self._batch_descriptions_request, project_context, outline, pages
+        )
+        response_text = await self._agenerate_text(batch_prompt, response_schema=schema, prefix=prefix,
+                                                   use_cache=use_cache)
+        return self._parse_batch_descriptions(response_text, pages)
+    
+    def _batch_descriptions_request(self, project_context: ProjectContext, outline: List[Dict],
+                                    pages: List[Dict]):
+        """Prompt, response schema and reference-file prefix of a batch description request"""
+        prefix = self._get_reference_prefix(project_context)
+        batch_prompt = get_batch_page_descriptions_prompt(
+            project_context=project_context,
+            outline=outline,
+            pages=pages,
+            include_files=prefix is None
+        )
+        schema = types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    'page_index': types.Schema(type=types.Type.INTEGER),
+                    'description': types.Schema(type=types.Type.STRING),
+                },
+                required=['page_index', 'description'],
             ),
         )
+        return batch_prompt, schema, prefix
+    
+    @staticmethod
+    def _parse_batch_descriptions(response_text: str, pages: List[Dict]) -> Dict[int, str]:
+        """page_index -> description from a batch answer (pages missing from the answer are omitted)"""
+        items = json.loads(response_text.strip().strip("```json").strip("```").strip())
+        if not isinstance(items, list):
+            raise ValueError("Expected a list of page descriptions, but got: " + str(type(items)))
         
-        page_desc = response.text
-        return dedent(page_desc)
+        requested = {page['page_index'] for page in pages}
+        descriptions = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                page_index = int(item.get('page_index'))
+            except (TypeError, ValueError):
+                continue
+            if page_index in requested and item.get('description'):
+                descriptions[page_index] = dedent(str(item['description']))
+        return descriptions
+    
+    def get_description_batch_size(self, project_context: ProjectContext, outline: List[Dict],
+                                   page_count: int, max_batch_size: int = 8,
+                                   tokens_per_extra_page: int = 1500) -> int:
+        """
+        Pick how many pages to describe per request from the size of the shared context
+        
+        Every page added to a batch saves one copy of the reference files and outline,
+        so big contexts get big batches; small contexts keep small batches to stay parallel
+        and keep each answer short. Output length caps the batch at max_batch_size.
+        """
+        shared_text = [json.dumps(outline, ensure_ascii=False)] + [
+            file_info.get('content', '') for file_info in project_context.reference_files_content
+        ]
+        shared_tokens = estimate_tokens(shared_text, output_tokens=0)
+        batch_size = 2 + shared_tokens // max(1, tokens_per_extra_page)
+        return max(1, min(batch_size, max_batch_size, page_count))
     
     def generate_outline_text(self, outline: List[Dict]) -> str:
         """
@@ -338,7 +704,8 @@ class AIService:
     
     def generate_image(self, prompt: str, ref_image_path: Optional[str] = None, 
                       aspect_ratio: str = "16:9", resolution: str = "2K",
-                      additional_ref_images: Optional[List[Union[str, Image.Image]]] = None) -> Optional[Image.Image]:
+                      additional_ref_images: Optional[List[Union[str, Image.Image]]] = None,
+                      ref_image_original: bool = False) -> Optional[Image.Image]:
         """
         Generate image using Gemini image model
         Based on gemini_genai.py gen_image()
@@ -349,6 +716,8 @@ class AIService:
             aspect_ratio: Image aspect ratio (currently not used, kept for compatibility)
             resolution: Image resolution (currently not used, kept for compatibility)
             additional_ref_images: 额外的参考图片列表，可以是本地路径、URL 或 PIL Image 对象
+            ref_image_original: Send ref_image_path as its original bytes instead of the
+                normalized (downscaled, lossy) reference version, for the image being edited
         
         Returns:
             PIL Image object or None if failed
@@ -357,105 +726,156 @@ class AIService:
             Exception with detailed error message if generation fails
         """
         try:
-            logger.debug(f"Reference image: {ref_image_path}")
-            if additional_ref_images:
-                logger.debug(f"Additional reference images: {len(additional_ref_images)}")
-            logger.debug(f"Config - aspect_ratio: {aspect_ratio}, resolution: {resolution}")
-
-            # 构建 contents 列表，包含 prompt 和所有参考图片
-            # 约定：如果有主参考图，则放在第一个索引，其后是文本 prompt，再后是其他参考图
-            contents = []
-            
-            # 添加主参考图片（如果提供了路径，放在第一个位置）
-            if ref_image_path:
-                if not os.path.exists(ref_image_path):
-                    raise FileNotFoundError(f"Reference image not found: {ref_image_path}")
-                main_ref_image = Image.open(ref_image_path)
-                contents.append(main_ref_image)
-            
-            # 文本 prompt 紧跟在主参考图之后（或成为第一个元素）
-            contents.append(prompt)
-            
-            # 添加额外的参考图片
-            if additional_ref_images:
-                for ref_img in additional_ref_images:
-                    if isinstance(ref_img, Image.Image):
-                        # 已经是 PIL Image 对象
-                        contents.append(ref_img)
-                    elif isinstance(ref_img, str):
-                        # 可能是本地路径或 URL
-                        if os.path.exists(ref_img):
-                            # 本地路径
-                            contents.append(Image.open(ref_img))
-                        elif ref_img.startswith('http://') or ref_img.startswith('https://'):
-                            # URL，需要下载
-                            downloaded_img = self.download_image_from_url(ref_img)
-                            if downloaded_img:
-                                contents.append(downloaded_img)
-                            else:
-                                logger.warning(f"Failed to download image from URL: {ref_img}, skipping...")
-                        elif ref_img.startswith('/files/mineru/'):
-                            # MinerU 本地文件路径，需要转换为文件系统路径（支持前缀匹配）
-                            local_path = self._convert_mineru_path_to_local(ref_img)
-                            if local_path and os.path.exists(local_path):
-                                contents.append(Image.open(local_path))
-                                logger.debug(f"Loaded MinerU image from local path: {local_path}")
-                            else:
-                                logger.warning(f"MinerU image file not found (with prefix matching): {ref_img}, skipping...")
-                        else:
-                            logger.warning(f"Invalid image reference: {ref_img}, skipping...")
-            
-            logger.debug(f"Calling Gemini API for image generation with {len(contents) - 1} reference images...")
-            response = self.client.models.generate_content(
-                model=self.image_model,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE'],
-                    image_config=types.ImageConfig(
-                        aspect_ratio=aspect_ratio,
-                        image_size=resolution
-                    ),
-                )
+            contents, request_contents, config = self._build_image_request(
+                prompt, ref_image_path, aspect_ratio, resolution, additional_ref_images, ref_image_original
             )
+            file_uris = get_file_uris(request_contents)
+            try:
+                response = self._generate_content(
+                    model=self.image_model, contents=request_contents, config=config
+                )
+            except errors.APIError as e:
+                if not file_uris or e.code not in (400, 403, 404):
+                    raise
+                # Handle deleted or expired on the server: drop it and send the images inline
+                logger.warning(f"Uploaded reference images rejected ({e.code}), retrying inline")
+                uploaded_files.invalidate(self.file_uploader, file_uris)
+                response = self._generate_content(model=self.image_model, contents=contents, config=config)
             logger.debug("Gemini API call completed")
-            
-            logger.debug("API response received, checking parts...")
-            for i, part in enumerate(response.parts):
-                if part.text is not None:   
-                    logger.debug(f"Part {i}: TEXT - {part.text[:100]}")
-                else:
-                    # Try to get image from part
-                    try:
-                        logger.debug(f"Part {i}: Attempting to extract image...")
-                        image = part.as_image()
-                        if image:
-                            # Don't check image.size - it might not be a standard PIL Image yet
-                            logger.debug(f"Successfully extracted image from part {i}")
-                            return image
-                    except Exception as e:
-                        logger.debug(f"Part {i}: Failed to extract image - {str(e)}")
-            
-            # If we get here, no image was found in the response
-            error_msg = "No image found in API response. "
-            if response.parts:
-                error_msg += f"Response had {len(response.parts)} parts but none contained valid images."
-            else:
-                error_msg += "Response had no parts."
-            
-            raise ValueError(error_msg)
+            return self._extract_image(response)
             
         except Exception as e:
             error_detail = f"Error generating image: {type(e).__name__}: {str(e)}"
             logger.error(error_detail, exc_info=True)
             raise Exception(error_detail) from e
     
+    async def agenerate_image(self, prompt: str, ref_image_path: Optional[str] = None,
+                              aspect_ratio: str = "16:9", resolution: str = "2K",
+                              additional_ref_images: Optional[List[Union[str, Image.Image]]] = None,
+                              ref_image_original: bool = False) -> Optional[Image.Image]:
+        """generate_image() for the async runtime, using the async client (same arguments and errors)"""
+        try:
+            # Reference image preparation reads files / downloads, keep it off the event loop
+            contents, request_contents, config = await async_runtime.run_blocking(
+                self._build_image_request,
+                prompt, ref_image_path, aspect_ratio, resolution, additional_ref_images, ref_image_original
+            )
+            file_uris = get_file_uris(request_contents)
+            try:
+                response = await self._agenerate_content(
+                    model=self.image_model, contents=request_contents, config=config
+                )
+            except errors.APIError as e:
+                if not file_uris or e.code not in (400, 403, 404):
+                    raise
+                logger.warning(f"Uploaded reference images rejected ({e.code}), retrying inline")
+                uploaded_files.invalidate(self.file_uploader, file_uris)
+                response = await self._agenerate_content(model=self.image_model, contents=contents, config=config)
+            logger.debug("Gemini API call completed")
+            return self._extract_image(response)
+        
+        except Exception as e:
+            error_detail = f"Error generating image: {type(e).__name__}: {str(e)}"
+            logger.error(error_detail, exc_info=True)
+            raise Exception(error_detail) from e
+    
+    def _build_image_request(self, prompt: str, ref_image_path: Optional[str], aspect_ratio: str,
+                             resolution: str, additional_ref_images: Optional[List[Union[str, Image.Image]]],
+                             ref_image_original: bool = False):
+        """
+        Build the contents of an image request
+        
+        Returns:
+            (contents with inline images, contents with uploaded file handles, config)
+        """
+        logger.debug(f"Reference image: {ref_image_path}")
+        if additional_ref_images:
+            logger.debug(f"Additional reference images: {len(additional_ref_images)}")
+        logger.debug(f"Config - aspect_ratio: {aspect_ratio}, resolution: {resolution}")
+
+        # 构建 contents 列表，包含 prompt 和所有参考图片
+        # 约定：如果有主参考图，则放在第一个索引，其后是文本 prompt，再后是其他参考图
+        contents = []
+        
+        # 添加主参考图片（如果提供了路径，放在第一个位置）
+        # 参考图片通过进程级缓存准备（缩放 + 编码一次），整套 PPT 共用同一份模板字节
+        if ref_image_path:
+            if not os.path.exists(ref_image_path):
+                raise FileNotFoundError(f"Reference image not found: {ref_image_path}")
+            if ref_image_original:
+                # 被编辑的页面图片按原始字节发送（不缩放、不转有损格式），避免编辑结果丢失细节
+                with open(ref_image_path, 'rb') as f:
+                    data = f.read()
+                mime_type = mimetypes.guess_type(ref_image_path)[0] or 'image/png'
+                contents.append(types.Part.from_bytes(data=data, mime_type=mime_type))
+            else:
+                contents.append(reference_images.get_part(ref_image_path))
+        
+        # 文本 prompt 紧跟在主参考图之后（或成为第一个元素）
+        contents.append(prompt)
+        
+        # 添加额外的参考图片
+        if additional_ref_images:
+            for ref_img in additional_ref_images:
+                if isinstance(ref_img, Image.Image):
+                    # 已经是 PIL Image 对象
+                    contents.append(ref_img)
+                elif isinstance(ref_img, str):
+                    # 本地路径、URL 或 MinerU 文件路径（/files/mineru/，支持前缀匹配）
+                    part = reference_images.get_part(ref_img)
+                    if part:
+                        contents.append(part)
+                    else:
+                        logger.warning(f"Reference image not found or failed to download: {ref_img}, skipping...")
+        
+        logger.debug(f"Calling Gemini API for image generation with {len(contents) - 1} reference images...")
+        config = types.GenerateContentConfig(
+            response_modalities=['TEXT', 'IMAGE'],
+            image_config=types.ImageConfig(
+                aspect_ratio=aspect_ratio,
+                image_size=resolution
+            ),
+        )
+        # 大参考图只上传一次，之后的请求只携带文件句柄
+        request_contents = uploaded_files.to_file_parts(self.file_uploader, contents)
+        return contents, request_contents, config
+    
+    @staticmethod
+    def _extract_image(response) -> Image.Image:
+        """First image part of an image model response"""
+        logger.debug("API response received, checking parts...")
+        for i, part in enumerate(response.parts or []):
+            if part.text is not None:   
+                logger.debug(f"Part {i}: TEXT - {part.text[:100]}")
+            else:
+                # Try to get image from part
+                try:
+                    logger.debug(f"Part {i}: Attempting to extract image...")
+                    image = part.as_image()
+                    if image:
+                        # Don't check image.size - it might not be a standard PIL Image yet
+                        logger.debug(f"Successfully extracted image from part {i}")
+                        return image
+                except Exception as e:
+                    logger.debug(f"Part {i}: Failed to extract image - {str(e)}")
+        
+        # If we get here, no image was found in the response
+        error_msg = "No image found in API response. "
+        if response.parts:
+            error_msg += f"Response had {len(response.parts)} parts but none contained valid images."
+        else:
+            error_msg += "Response had no parts."
+        
+        raise ValueError(error_msg)
+    
     def edit_image(self, prompt: str, current_image_path: str,
                   aspect_ratio: str = "16:9", resolution: str = "2K",
                   original_description: str = None,
                   additional_ref_images: Optional[List[Union[str, Image.Image]]] = None) -> Optional[Image.Image]:
         """
         Edit existing image with natural language instruction
-        Uses current image as reference
+        Uses current image as reference, sent at full quality (templates and material
+        references in additional_ref_images are still normalized)
         
         Args:
             prompt: Edit instruction
@@ -473,7 +893,8 @@ class AIService:
             edit_instruction=prompt,
             original_description=original_description
         )
-        return self.generate_image(edit_instruction, current_image_path, aspect_ratio, resolution, additional_ref_images)
+        return self.generate_image(edit_instruction, current_image_path, aspect_ratio, resolution,
+                                   additional_ref_images, ref_image_original=True)
     
     def parse_description_to_outline(self, project_context: ProjectContext) -> List[Dict]:
         """
@@ -487,15 +908,9 @@ class AIService:
         """
         parse_prompt = get_description_to_outline_prompt(project_context)
         
-        response = self.client.models.generate_content(
-            model=self.text_model,
-            contents=parse_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=1000),
-            ),
-        )
+        response_text = self._generate_text(parse_prompt, expect_json=True)
         
-        outline_json = response.text.strip().strip("```json").strip("```").strip()
+        outline_json = response_text.strip().strip("```json").strip("```").strip()
         outline = json.loads(outline_json)
         return outline
     
@@ -512,15 +927,9 @@ class AIService:
         """
         split_prompt = get_description_split_prompt(project_context, outline)
         
-        response = self.client.models.generate_content(
-            model=self.text_model,
-            contents=split_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=1000),
-            ),
-        )
+        response_text = self._generate_text(split_prompt, expect_json=True)
         
-        descriptions_json = response.text.strip().strip("```json").strip("```").strip()
+        descriptions_json = response_text.strip().strip("```json").strip("```").strip()
         descriptions = json.loads(descriptions_json)
         
         # 确保返回的是字符串列表
@@ -544,22 +953,18 @@ class AIService:
         Returns:
             修改后的大纲结构
         """
+        prefix = self._get_reference_prefix(project_context)
         refinement_prompt = get_outline_refinement_prompt(
             current_outline=current_outline,
             user_requirement=user_requirement,
             project_context=project_context,
-            previous_requirements=previous_requirements
+            previous_requirements=previous_requirements,
+            include_files=prefix is None
         )
         
-        response = self.client.models.generate_content(
-            model=self.text_model,
-            contents=refinement_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=1000),
-            ),
-        )
+        response_text = self._generate_text(refinement_prompt, expect_json=True, prefix=prefix)
         
-        outline_json = response.text.strip().strip("```json").strip("```").strip()
+        outline_json = response_text.strip().strip("```json").strip("```").strip()
         outline = json.loads(outline_json)
         return outline
     
@@ -580,23 +985,58 @@ class AIService:
         Returns:
             修改后的页面描述列表（字符串列表）
         """
+        refinement_prompt, prefix = self._descriptions_refinement_request(
+            current_descriptions, user_requirement, project_context, outline, previous_requirements
+        )
+        
+        response_text = self._generate_text(refinement_prompt, expect_json=True, prefix=prefix)
+        
+        return self._parse_refined_descriptions(response_text)
+    
+    def refine_descriptions_stream(self, current_descriptions: List[Dict], user_requirement: str,
+                                   project_context: ProjectContext,
+                                   outline: List[Dict] = None,
+                                   previous_requirements: Optional[List[str]] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        Streaming refine_descriptions()
+        
+        Yields:
+            ('delta', {'text'}) for every text chunk, ('description', {'index', 'text'}) as soon as
+            a page's description is complete, and finally ('descriptions', {'descriptions'})
+        """
+        refinement_prompt, prefix = self._descriptions_refinement_request(
+            current_descriptions, user_requirement, project_context, outline, previous_requirements
+        )
+        parser = JSONArrayStreamParser()
+        chunks = []
+        page_index = 0
+        for text in self._generate_text_stream(refinement_prompt, expect_json=True, prefix=prefix):
+            chunks.append(text)
+            yield 'delta', {'text': text}
+            for _, value, _ in parser.feed(text):
+                yield 'description', {'index': page_index, 'text': str(value)}
+                page_index += 1
+        
+        yield 'descriptions', {'descriptions': self._parse_refined_descriptions(''.join(chunks))}
+    
+    def _descriptions_refinement_request(self, current_descriptions: List[Dict], user_requirement: str,
+                                         project_context: ProjectContext, outline: Optional[List[Dict]],
+                                         previous_requirements: Optional[List[str]]):
+        """Prompt and reference-file prefix of a descriptions refinement request"""
+        prefix = self._get_reference_prefix(project_context)
         refinement_prompt = get_descriptions_refinement_prompt(
             current_descriptions=current_descriptions,
             user_requirement=user_requirement,
             project_context=project_context,
             outline=outline,
-            previous_requirements=previous_requirements
+            previous_requirements=previous_requirements,
+            include_files=prefix is None
         )
-        
-        response = self.client.models.generate_content(
-            model=self.text_model,
-            contents=refinement_prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=1000),
-            ),
-        )
-        
-        descriptions_json = response.text.strip().strip("```json").strip("```").strip()
+        return refinement_prompt, prefix
+    
+    @staticmethod
+    def _parse_refined_descriptions(response_text: str) -> List[str]:
+        descriptions_json = response_text.strip().strip("```json").strip("```").strip()
         descriptions = json.loads(descriptions_json)
         
         # 确保返回的是字符串列表
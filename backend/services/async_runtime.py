@@ -0,0 +1,125 @@
+"""
+Async Runtime - one asyncio event loop multiplexing all in-flight Gemini calls
+
+Bulk work (page images, description chunks, reference file captions) runs as coroutines on a
+single background event loop using the async genai client, instead of one blocked OS thread
+per in-flight request. Callers keep submitting work the same way and get a
+concurrent.futures.Future back. The few blocking steps (disk I/O, image decoding, SQLite) are
+handed to a small thread pool with run_blocking().
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict
+
+from .metrics import restore_context
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """Background event loop thread plus a bounded pool for blocking helpers"""
+
+    def __init__(self, enabled: bool = True, blocking_workers: int = 8):
+        self.enabled = enabled
+        self.blocking_workers = blocking_workers
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.executor = None
+        self.stats = {'submitted': 0, 'running': 0, 'blocking_calls': 0}
+        self.pending = 0  # submitted coroutines whose future is not done yet
+
+    def configure(self, enabled: bool = None, blocking_workers: int = None):
+        """Apply app config (called once on startup)"""
+        if enabled is not None:
+            self.enabled = enabled
+        if blocking_workers is not None and blocking_workers > 0:
+            self.blocking_workers = blocking_workers
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.blocking_workers, thread_name_prefix='async-blocking'
+                )
+                self.loop = asyncio.new_event_loop()
+                self.loop.set_default_executor(self.executor)
+                self.thread = threading.Thread(
+                    target=self._run_loop, name='async-runtime', daemon=True
+                )
+                self.thread.start()
+                logger.info(f"Async runtime started ({self.blocking_workers} blocking workers)")
+            return self.loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Awaitable) -> Future:
+        """
+        Schedule a coroutine on the runtime loop, returns a concurrent.futures.Future
+
+        The coroutine sees the caller's context variables (e.g. the task id used for metrics).
+        """
+        loop = self._ensure_started()
+        with self.lock:
+            self.stats['submitted'] += 1
+            self.pending += 1
+        future = asyncio.run_coroutine_threadsafe(self._track(coro, contextvars.copy_context()), loop)
+        # Also runs for coroutines cancelled before they started
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self.lock:
+            self.pending -= 1
+
+    def run(self, coro: Awaitable) -> Any:
+        """Run a coroutine on the runtime loop and block the calling thread for its result"""
+        return self.submit(coro).result()
+
+    async def _track(self, coro: Awaitable, context: contextvars.Context) -> Any:
+        with self.lock:
+            self.stats['running'] += 1
+        try:
+            restore_context(context)
+            return await coro
+        finally:
+            with self.lock:
+                self.stats['running'] -= 1
+
+    async def run_blocking(self, fn: Callable, *args, **kwargs) -> Any:
+        """Await a blocking function on the helper pool (call from a runtime coroutine)"""
+        with self.lock:
+            self.stats['blocking_calls'] += 1
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, functools.partial(context.run, fn, *args, **kwargs))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'enabled': self.enabled,
+                'started': self.loop is not None,
+                # Counted here: the loop's own task set can't be read from another thread
+                'pending_tasks': self.pending,
+                **self.stats,
+            }
+
+    def shutdown(self):
+        """Stop the loop and the blocking pool"""
+        with self.lock:
+            loop, self.loop = self.loop, None
+            executor, self.executor = self.executor, None
+        if loop:
+            loop.call_soon_threadsafe(loop.stop)
+        if executor:
+            executor.shutdown(wait=False)
+
+
+# Global runtime instance, configured from app config on startup
+async_runtime = AsyncRuntime()
@@ -0,0 +1,140 @@
+"""
+Client Registry - application-scoped Gemini clients with pooled keep-alive connections
+
+Controllers used to build a new AIService, and with it a new genai.Client and fresh HTTP
+connection pools, for every request, so each call paid a TCP + TLS handshake. The registry
+keeps one genai.Client per (api_key, api_base) backed by shared httpx clients with a bounded
+keep-alive pool (HTTP/2 when the h2 package is installed), and one AIService per client.
+
+The async httpx client is only used from the async runtime's event loop; its pooled
+connections are bound to that loop.
+"""
+import threading
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+from google import genai
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClientRegistry:
+    """genai.Client / AIService instances shared by all requests and tasks"""
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 60.0, http2: bool = True):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.lock = threading.Lock()
+        self.clients = {}  # (api_key, api_base) -> genai.Client
+        self.ai_services = {}  # (api_key, api_base) -> AIService
+        self.http_clients = []  # httpx clients owned by the registry
+        self.stats = {'clients_created': 0, 'client_hits': 0}
+
+    def configure(self, max_connections: int = None, max_keepalive_connections: int = None,
+                  keepalive_expiry: float = None, http2: bool = None):
+        """Apply app config (called once on startup, before the first client is created)"""
+        if max_connections is not None and max_connections > 0:
+            self.max_connections = max_connections
+        if max_keepalive_connections is not None and max_keepalive_connections >= 0:
+            self.max_keepalive_connections = max_keepalive_connections
+        if keepalive_expiry is not None:
+            self.keepalive_expiry = keepalive_expiry
+        if http2 is not None:
+            self.http2 = http2
+
+    def _use_http2(self) -> bool:
+        if not self.http2:
+            return False
+        if not _http2_available():
+            logger.info("h2 is not installed, Gemini clients use HTTP/1.1 keep-alive "
+                        "(pip install 'httpx[http2]' to enable HTTP/2)")
+            self.http2 = False
+            return False
+        return True
+
+    def _build_client(self, api_key: str, api_base: Optional[str]) -> genai.Client:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        http2 = self._use_http2()
+        # No client-level timeout: genai passes its per-request timeout (None = unlimited)
+        http_client = httpx.Client(limits=limits, http2=http2, timeout=None)
+        async_http_client = httpx.AsyncClient(limits=limits, http2=http2, timeout=None)
+        self.http_clients.extend([http_client, async_http_client])
+
+        logger.info(f"Created Gemini client for {api_base or 'default endpoint'} "
+                    f"(pool {self.max_connections}/{self.max_keepalive_connections}, http2={http2})")
+        return genai.Client(
+            http_options=types.HttpOptions(
+                base_url=api_base,
+                httpx_client=http_client,
+                httpx_async_client=async_http_client
+            ),
+            api_key=api_key
+        )
+
+    def get_client(self, api_key: str, api_base: Optional[str] = None) -> genai.Client:
+        """Shared genai.Client for an API key and endpoint"""
+        key = (api_key, api_base or None)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                client = self._build_client(api_key, api_base or None)
+                self.clients[key] = client
+                self.stats['clients_created'] += 1
+            else:
+                self.stats['client_hits'] += 1
+            return client
+
+    def get_ai_service(self, api_key: str, api_base: Optional[str] = None):
+        """Shared AIService for an API key and endpoint (AIService holds no per-request state)"""
+        from .ai_service import AIService
+
+        key = (api_key, api_base or None)
+        with self.lock:
+            ai_service = self.ai_services.get(key)
+        if ai_service is None:
+            ai_service = AIService(api_key, api_base)
+            with self.lock:
+                ai_service = self.ai_services.setdefault(key, ai_service)
+        return ai_service
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                **self.stats,
+                'clients': len(self.clients),
+                'ai_services': len(self.ai_services),
+                'http2': self.http2,
+                'max_connections': self.max_connections,
+                'max_keepalive_connections': self.max_keepalive_connections,
+            }
+
+    def close(self):
+        """Close the pooled connections (process shutdown)"""
+        with self.lock:
+            http_clients, self.http_clients = self.http_clients, []
+            self.clients.clear()
+            self.ai_services.clear()
+        for http_client in http_clients:
+            if isinstance(http_client, httpx.Client):
+                http_client.close()
+
+
+# Global registry instance, pool sizes are configured from app config on startup
+client_registry = ClientRegistry()
@@ -0,0 +1,144 @@
+"""
+Context Cache - reuse the shared reference-file prefix across prompts of a project
+
+The reference-file XML is the same in every page-description and refine prompt of a
+project. When it is large enough to be worth it, the prefix is uploaded once as a Gemini
+cached-content handle and each prompt only carries its own delta. Small prefixes, or a
+server that refuses caching, fall back to a PromptPrefix holding the text inline.
+"""
+import threading
+import time
+import logging
+from typing import Optional
+
+from google.genai import types
+
+from .rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class PromptPrefix:
+    """Shared prompt prefix: a cached-content handle on the server, or inline text"""
+
+    def __init__(self, key: str, text: str, cache_name: Optional[str] = None):
+        self.key = key
+        self.text = text
+        self.cache_name = cache_name
+
+    @property
+    def is_cached(self) -> bool:
+        return bool(self.cache_name)
+
+
+class ContextCacheManager:
+    """
+    Maps (model, prefix key) to a Gemini cached-content handle
+
+    The key identifies the exact prefix content (reference file ids + updated_at), the scope
+    identifies the set of files. When a scope shows up with a new key the files changed, so the
+    handle of the old key is deleted instead of waiting for its TTL.
+    """
+
+    def __init__(self, enabled: bool = True, ttl_seconds: int = 3600, min_tokens: int = 1024):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.lock = threading.Lock()
+        self.entries = {}  # (model, key) -> {'name': str, 'expires_at': float}
+        self.scope_keys = {}  # (model, scope) -> key
+        self.key_locks = {}  # (model, key) -> Lock, one creator per prefix
+        self.failures = {}  # (model, key) -> time before which creation is not retried
+        self.stats = {'hits': 0, 'creates': 0, 'inline': 0, 'invalidations': 0}
+
+    def configure(self, enabled: bool = None, ttl_seconds: int = None, min_tokens: int = None):
+        """Apply app config (called once on startup)"""
+        if enabled is not None:
+            self.enabled = enabled
+        if ttl_seconds is not None:
+            self.ttl_seconds = ttl_seconds
+        if min_tokens is not None:
+            self.min_tokens = min_tokens
+
+    def get_prefix(self, client, model: str, scope: str, key: str, text: str) -> PromptPrefix:
+        """
+        Get a PromptPrefix for the given prefix text, creating the server-side cache if needed
+
+        Args:
+            client: genai.Client used to create/delete cached contents
+            model: Model the cache is bound to
+            scope: Identity of the file set (stable while files are only updated)
+            key: Identity of the exact prefix content
+            text: Prefix text
+        """
+        inline = PromptPrefix(key, text)
+        if not self.enabled or not text or estimate_tokens(text, output_tokens=0) < self.min_tokens:
+            self._count('inline')
+            return inline
+
+        entry_key = (model, key)
+        with self.lock:
+            stale_key = self.scope_keys.get((model, scope))
+            self.scope_keys[(model, scope)] = key
+            stale_entry = self.entries.pop((model, stale_key), None) if stale_key and stale_key != key else None
+            key_lock = self.key_locks.setdefault(entry_key, threading.Lock())
+
+        if stale_entry:
+            self._delete(client, stale_entry['name'])
+            self._count('invalidations')
+
+        with key_lock:
+            now = time.time()
+            with self.lock:
+                entry = self.entries.get(entry_key)
+                # Leave a margin so a handle does not expire between lookup and use
+                if entry and entry['expires_at'] > now + 60:
+                    self.stats['hits'] += 1
+                    return PromptPrefix(key, text, entry['name'])
+                if self.failures.get(entry_key, 0) > now:
+                    self.stats['inline'] += 1
+                    return inline
+
+            try:
+                cached = client.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        contents=[text],
+                        ttl=f"{self.ttl_seconds}s",
+                        display_name=f"reference-files-{key[:16]}",
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"Context cache creation failed for {model}, sending prefix inline: {str(e)}")
+                with self.lock:
+                    self.failures[entry_key] = now + 300
+                    self.stats['inline'] += 1
+                return inline
+
+            with self.lock:
+                self.entries[entry_key] = {'name': cached.name, 'expires_at': now + self.ttl_seconds}
+                self.failures.pop(entry_key, None)
+                self.stats['creates'] += 1
+            logger.info(f"Created context cache {cached.name} for reference files ({key[:12]})")
+            return PromptPrefix(key, text, cached.name)
+
+    def invalidate(self, model: str, key: str):
+        """Forget a handle the server no longer accepts (expired or deleted)"""
+        with self.lock:
+            if self.entries.pop((model, key), None):
+                self.stats['invalidations'] += 1
+
+    def _delete(self, client, name: str):
+        try:
+            client.caches.delete(name=name)
+            logger.info(f"Deleted stale context cache {name}")
+        except Exception as e:
+            logger.debug(f"Failed to delete context cache {name}: {str(e)}")
+
+    def _count(self, stat: str):
+        with self.lock:
+            self.stats[stat] += 1
+
+
+# Global context cache manager, configured from app config on startup
+context_cache = ContextCacheManager()
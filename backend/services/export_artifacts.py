@@ -0,0 +1,211 @@
+"""
+Export Artifacts - content-addressed cache of exported PPTX / PDF files
+
+An export is stored in the project's exports folder under a name derived from the format and
+the ordered list of slide images (path, mtime, size). Exporting a deck whose images did not
+change finds the existing file and returns it without rebuilding; any edit, regeneration or
+reordering of a page changes the key.
+
+Artifacts are written to a temporary name and renamed into place, so a lookup never sees a
+half-written file. After each export, artifacts of the project that no longer match the deck
+are deleted once they are older than a short grace period (a download of the previous version
+may still be running), and every artifact expires after max_age_seconds.
+
+A PPTX artifact can have a manifest next to it (.{name}.manifest.json) describing its slides,
+so the next export of the project patches it instead of rebuilding the deck (see pptx_writer).
+The manifest is deleted together with its artifact.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bump when the exporters change their output, so old artifacts are not served any more
+EXPORT_FORMAT_VERSION = 3
+
+EXPORT_FORMATS = ('pptx', 'pdf')
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def get_export_key(image_paths: List[str], export_format: str) -> str:
+    """Key of an export: format plus every slide image's path, mtime and size, in order"""
+    entries = []
+    for path in image_paths:
+        try:
+            stat = os.stat(path)
+            entries.append([path, stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            # Missing images are skipped by the exporters, keep them out of the key too
+            continue
+    payload = json.dumps([EXPORT_FORMAT_VERSION, export_format, entries])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_artifact_name(key: str, export_format: str) -> str:
+    return f"{key[:32]}.{export_format}"
+
+
+def get_manifest_path(artifact: Path) -> Path:
+    artifact = Path(artifact)
+    return artifact.parent / f".{artifact.name}{MANIFEST_SUFFIX}"
+
+
+class ExportArtifacts:
+    """Finds, builds and garbage-collects cached export files"""
+
+    def __init__(self, max_age_seconds: int = 7 * 24 * 3600, stale_grace_seconds: int = 600):
+        self.max_age_seconds = max_age_seconds
+        self.stale_grace_seconds = stale_grace_seconds
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'builds': 0, 'collected': 0}
+
+    def configure(self, max_age_seconds: int = None, stale_grace_seconds: int = None):
+        """Apply app config (called once on startup)"""
+        if max_age_seconds is not None and max_age_seconds > 0:
+            self.max_age_seconds = max_age_seconds
+        if stale_grace_seconds is not None and stale_grace_seconds >= 0:
+            self.stale_grace_seconds = stale_grace_seconds
+
+    def _count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def find(self, exports_dir: Path, key: str, export_format: str) -> Optional[Path]:
+        """Existing artifact for a key, if any"""
+        path = Path(exports_dir) / get_artifact_name(key, export_format)
+        if not path.is_file():
+            return None
+        try:
+            # Artifacts that keep being downloaded don't expire
+            os.utime(path)
+        except OSError:
+            return None
+        self._count('hits')
+        return path
+
+    def build(self, exports_dir: Path, key: str, export_format: str,
+              writer: Callable[[str], Any]) -> Path:
+        """
+        Create the artifact for a key with writer(output_path), unless it exists already
+
+        Args:
+            writer: Exporter writing the file, e.g. a partial of ExportService.create_pdf_from_images
+        """
+        exports_dir = Path(exports_dir)
+        path = exports_dir / get_artifact_name(key, export_format)
+        if path.is_file():
+            self._count('hits')
+            return path
+
+        temp_path = exports_dir / f".{path.name}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            writer(str(temp_path))
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        self._count('builds')
+        return path
+
+    def save_manifest(self, artifact: Path, manifest: Dict[str, Any]):
+        """Store the manifest of an artifact (written to a temporary name, then renamed)"""
+        path = get_manifest_path(artifact)
+        temp_path = path.parent / f"{path.name}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def find_latest_with_manifest(self, exports_dir: Path,
+                                  export_format: str) -> Tuple[Optional[Path], Optional[Dict[str, Any]]]:
+        """
+        Most recently built or downloaded artifact of a format that has a manifest
+
+        Returns:
+            (artifact path, manifest), or (None, None) if there is none
+        """
+        candidates = []
+        try:
+            for entry in os.scandir(exports_dir):
+                if entry.is_file() and entry.name.endswith(f'.{export_format}') and not entry.name.startswith('.'):
+                    candidates.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            return None, None
+
+        for _, path in sorted(candidates, reverse=True):
+            try:
+                with open(get_manifest_path(path), 'r', encoding='utf-8') as f:
+                    return Path(path), json.load(f)
+            except (OSError, ValueError):
+                continue
+        return None, None
+
+    def collect_garbage(self, exports_dir: Path, keep: Iterable[str] = ()) -> int:
+        """
+        Delete artifacts of one project's exports folder that are no longer needed
+
+        Args:
+            keep: Names of the artifacts matching the deck as it is now
+
+        Returns:
+            Number of deleted files
+        """
+        keep = set(keep)
+        now = time.time()
+        removed = 0
+        try:
+            entries = list(os.scandir(exports_dir))
+        except OSError:
+            return 0
+
+        ages = {}
+        for entry in entries:
+            try:
+                if entry.is_file():
+                    ages[entry.name] = now - entry.stat().st_mtime
+            except OSError:
+                continue
+
+        def is_garbage(name: str) -> bool:
+            if name.startswith('.') and name.endswith(MANIFEST_SUFFIX):
+                # Manifests live as long as their artifact
+                owner = name[1:-len(MANIFEST_SUFFIX)]
+                return owner not in ages or is_garbage(owner)
+            # Unmatched files (older decks, pre-cache exports, abandoned temp files) get a grace
+            # period for downloads still in progress; matching ones live until max_age
+            expired = ages[name] > self.max_age_seconds
+            stale = name not in keep and ages[name] > self.stale_grace_seconds
+            return expired or stale
+
+        for name in ages:
+            if is_garbage(name):
+                path = os.path.join(exports_dir, name)
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Could not delete export {path}: {str(e)}")
+
+        if removed:
+            self._count('collected', removed)
+            logger.info(f"Deleted {removed} stale exports from {exports_dir}")
+        return removed
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats)
+
+
+# Global instance, configured from app config on startup
+export_artifacts = ExportArtifacts()
@@ -5,12 +5,14 @@ Based on demo.py create_pptx_from_images()
 import os
 import logging
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List
 from pptx import Presentation
 from pptx.util import Inches
-from PIL import Image
 import io
 
+from .pdf_writer import StreamingPDFWriter
+from .pptx_writer import write_pptx
+
 logger = logging.getLogger(__name__)
 
 
@@ -67,11 +69,41 @@ class ExportService:
             pptx_bytes.seek(0)
             return pptx_bytes.getvalue()
     
+    @staticmethod
+    def update_pptx_from_images(image_paths: List[str], output_file: str, base_file: str = None,
+                                base_manifest: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Create PPTX file from image paths by patching a previous export (see pptx_writer)
+        
+        Slides whose image did not change are copied from base_file, only changed, added
+        and removed slides are written. Without a base this is a full build.
+        
+        Args:
+            image_paths: List of absolute paths to images
+            output_file: Output file path
+            base_file: Previous PPTX written by this method (optional)
+            base_manifest: Manifest returned for base_file
+        
+        Returns:
+            Manifest of output_file, to pass as base_manifest on the next export
+        """
+        try:
+            with open(output_file, 'wb') as f:
+                return write_pptx(image_paths, f, base_file, base_manifest)
+        except Exception:
+            # Don't leave a truncated PPTX behind
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+    
     @staticmethod
     def create_pdf_from_images(image_paths: List[str], output_file: str = None) -> bytes:
         """
         Create PDF file from image paths
         
+        Pages are streamed to the output one at a time (see StreamingPDFWriter), so memory
+        use does not grow with the number of slides.
+        
         Args:
             image_paths: List of absolute paths to images
             output_file: Optional output file path (if None, returns bytes)
@@ -79,43 +111,26 @@ class ExportService:
         Returns:
             PDF file as bytes if output_file is None
         """
-        images = []
-        
-        # Load all images
-        for image_path in image_paths:
-            if not os.path.exists(image_path):
-                logger.warning(f"Image not found: {image_path}")
-                continue
-            
-            img = Image.open(image_path)
-            
-            # Convert to RGB if necessary (PDF requires RGB)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            images.append(img)
-        
-        if not images:
-            raise ValueError("No valid images found for PDF export")
-        
-        # Save as PDF
         if output_file:
-            images[0].save(
-                output_file,
-                save_all=True,
-                append_images=images[1:],
-                format='PDF'
-            )
+            try:
+                with open(output_file, 'wb') as f:
+                    ExportService._write_pdf(image_paths, f)
+            except Exception:
+                # Don't leave a truncated PDF behind
+                if os.path.exists(output_file):
+                    os.remove(output_file)
+                raise
             return None
         else:
-            # Save to bytes
             pdf_bytes = io.BytesIO()
-            images[0].save(
-                pdf_bytes,
-                save_all=True,
-                append_images=images[1:],
-                format='PDF'
-            )
-            pdf_bytes.seek(0)
+            ExportService._write_pdf(image_paths, pdf_bytes)
             return pdf_bytes.getvalue()
-
+    
+    @staticmethod
+    def _write_pdf(image_paths: List[str], output) -> int:
+        """Write one page per existing image to a binary file object, returns the page count"""
+        writer = StreamingPDFWriter(output)
+        for image_path in image_paths:
+            writer.add_image_page(image_path)
+        writer.close()
+        return writer.page_count
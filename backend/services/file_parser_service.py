@@ -9,21 +9,27 @@ import zipfile
 import io
 import requests
 from typing import Optional, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from google import genai
+from concurrent.futures import as_completed
 from google.genai import types
 from PIL import Image
 from markitdown import MarkItDown
+from services.scheduler import job_scheduler, PRIORITY_BACKGROUND
+from services.rate_limiter import call_with_rate_limit, acall_with_rate_limit, estimate_tokens
+from services.metrics import estimate_request_bytes
+from services.async_runtime import async_runtime
+from services.client_registry import client_registry
 
 logger = logging.getLogger(__name__)
 
+CAPTION_PROMPT = "请用一句简短的中文描述这张图片的主要内容。只返回描述文字，不要其他解释。"
+
 
 class FileParserService:
     """Service for parsing files using MinerU and enhancing with image captions"""
     
     def __init__(self, mineru_token: str, mineru_api_base: str = "https://mineru.net",
                  google_api_key: str = "", google_api_base: str = "",
-                 image_caption_model: str = "gemini-2.5-flash"):
+                 image_caption_model: str = "gemini-2.5-flash", owner: Optional[str] = None):
         """
         Initialize the file parser service
         
@@ -33,6 +39,7 @@ class FileParserService:
             google_api_key: Google Gemini API key for image captioning
             google_api_base: Google Gemini API base URL
             image_caption_model: Model to use for image captioning
+            owner: Fairness key (user id) for caption jobs on the shared scheduler
         """
         self.mineru_token = mineru_token
         self.mineru_api_base = mineru_api_base
@@ -42,11 +49,9 @@ class FileParserService:
         # Initialize Gemini client for image captioning
         self.gemini_client = None
         if google_api_key:
-            self.gemini_client = genai.Client(
-                http_options=types.HttpOptions(base_url=google_api_base) if google_api_base else None,
-                api_key=google_api_key
-            )
+            self.gemini_client = client_registry.get_client(google_api_key, google_api_base or None)
         self.image_caption_model = image_caption_model
+        self.owner = owner
     
     def parse_file(self, file_path: str, filename: str) -> tuple[Optional[str], Optional[str], Optional[str], int]:
         """
@@ -486,14 +491,16 @@ class FileParserService:
         
         return enhanced_content, failed_count
     
-    def _generate_captions_parallel(self, image_urls: List[str], max_workers: int = 12, max_retries: int = 3) -> tuple[List[str], int]:
+    def _generate_captions_parallel(self, image_urls: List[str]) -> tuple[List[str], int]:
         """
-        Generate captions for multiple images in parallel with retry mechanism
+        Generate captions for multiple images in parallel
+        
+        Captions run as background jobs on the shared scheduler, so they only use
+        Gemini capacity that page image generation and edits leave free. Throttling
+        and transient errors are retried by the shared rate limiter.
         
         Args:
             image_urls: List of image URLs
-            max_workers: Maximum number of parallel workers
-            max_retries: Maximum number of retries for each image
             
         Returns:
             Tuple of (list of captions, number of failed images)
@@ -501,42 +508,39 @@ class FileParserService:
         captions = [""] * len(image_urls)
         failed_count = 0
         
-        def generate_with_retry(url: str, idx: int) -> tuple[int, str, bool]:
-            """Generate caption with retry logic"""
-            for attempt in range(max_retries):
-                try:
-                    caption = self._generate_single_caption(url)
-                    if caption:
-                        logger.debug(f"Generated caption for image {idx + 1}/{len(image_urls)} (attempt {attempt + 1})")
-                        return (idx, caption, True)
-                    else:
-                        logger.warning(f"Empty caption for image {idx + 1} (attempt {attempt + 1}/{max_retries})")
-                except Exception as e:
-                    logger.warning(f"Failed to generate caption for image {idx + 1} (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                    if attempt < max_retries - 1:
-                        import time
-                        time.sleep(1 * (attempt + 1))  # Exponential backoff: 1s, 2s, 3s
-            
-            # All retries failed
-            logger.error(f"Failed to generate caption for image {idx + 1} after {max_retries} attempts")
+        def caption_result(idx: int, caption: str) -> tuple[int, str, bool]:
+            if caption:
+                logger.debug(f"Generated caption for image {idx + 1}/{len(image_urls)}")
+                return (idx, caption, True)
+            
+            logger.error(f"Failed to generate caption for image {idx + 1}")
             return (idx, "", False)
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_idx = {
-                executor.submit(generate_with_retry, url, idx): idx
-                for idx, url in enumerate(image_urls)
-            }
-            
-            for future in as_completed(future_to_idx):
-                try:
-                    idx, caption, success = future.result()
-                    captions[idx] = caption
-                    if not success:
-                        failed_count += 1
-                except Exception as e:
-                    idx = future_to_idx[future]
-                    logger.error(f"Unexpected error generating caption for image {idx + 1}: {str(e)}")
+        def generate_caption_sync(url: str, idx: int) -> tuple[int, str, bool]:
+            """Generate caption for one image"""
+            return caption_result(idx, self._generate_single_caption(url))
+        
+        async def generate_caption_async(url: str, idx: int) -> tuple[int, str, bool]:
+            """Generate caption for one image on the async runtime"""
+            return caption_result(idx, await self._agenerate_single_caption(url))
+        
+        generate_caption = generate_caption_async if async_runtime.enabled else generate_caption_sync
+        future_to_idx = {
+            job_scheduler.submit(generate_caption, url, idx,
+                                 owner=self.owner, priority=PRIORITY_BACKGROUND): idx
+            for idx, url in enumerate(image_urls)
+        }
+        
+        for future in as_completed(future_to_idx):
+            try:
+                idx, caption, success = future.result()
+                captions[idx] = caption
+                if not success:
                     failed_count += 1
+            except Exception as e:
+                idx = future_to_idx[future]
+                logger.error(f"Unexpected error generating caption for image {idx + 1}: {str(e)}")
+                failed_count += 1
         
         return captions, failed_count
     
@@ -551,38 +555,24 @@ class FileParserService:
             Generated caption
         """
         try:
-            # Load image based on URL type
-            if image_url.startswith('http://') or image_url.startswith('https://'):
-                # Download from HTTP(S) URL
-                response = requests.get(image_url, timeout=30)
-                response.raise_for_status()
-                image = Image.open(io.BytesIO(response.content))
-            elif image_url.startswith('/files/mineru/'):
-                # Local MinerU extracted file with prefix matching support
-                from utils.path_utils import find_mineru_file_with_prefix
-                
-                # Find file with prefix matching
-                img_path = find_mineru_file_with_prefix(image_url)
-                
-                if img_path is None or not img_path.exists():
-                    logger.warning(f"Local image file not found (with prefix matching): {image_url}")
-                    return ""
-                
-                image = Image.open(img_path)
-            else:
-                # Unsupported path type
-                logger.warning(f"Unsupported image path type: {image_url}")
+            image = self._load_caption_image(image_url)
+            if image is None:
                 return ""
             
             # Generate caption using Gemini
-            prompt = "请用一句简短的中文描述这张图片的主要内容。只返回描述文字，不要其他解释。"
-            
-            result = self.gemini_client.models.generate_content(
-                model=self.image_caption_model,
-                contents=[image, prompt],
-                config=types.GenerateContentConfig(
-                    temperature=0.3,  # Lower temperature for more consistent captions
-                )
+            contents = [image, CAPTION_PROMPT]
+            result = call_with_rate_limit(
+                self.image_caption_model,
+                lambda: self.gemini_client.models.generate_content(
+                    model=self.image_caption_model,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        temperature=0.3,  # Lower temperature for more consistent captions
+                    )
+                ),
+                estimated_tokens=estimate_tokens(contents, output_tokens=100),
+                request_bytes=estimate_request_bytes(contents),
+                source='file_parser', operation='caption'
             )
             
             caption = result.text.strip()
@@ -591,4 +581,66 @@ class FileParserService:
         except Exception as e:
             logger.warning(f"Failed to generate caption for {image_url}: {str(e)}")
             return ""  # Return empty string on failure
-
+    
+    async def _agenerate_single_caption(self, image_url: str) -> str:
+        """_generate_single_caption() on the async client, for the async runtime"""
+        try:
+            # Download / decode / encode off the event loop
+            image_part = await async_runtime.run_blocking(self._load_caption_part, image_url)
+            if image_part is None:
+                return ""
+            
+            contents = [image_part, CAPTION_PROMPT]
+            result = await acall_with_rate_limit(
+                self.image_caption_model,
+                lambda: self.gemini_client.aio.models.generate_content(
+                    model=self.image_caption_model,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        temperature=0.3,
+                    )
+                ),
+                estimated_tokens=estimate_tokens(contents, output_tokens=100),
+                request_bytes=estimate_request_bytes(contents),
+                source='file_parser', operation='caption'
+            )
+            return result.text.strip()
+        
+        except Exception as e:
+            logger.warning(f"Failed to generate caption for {image_url}: {str(e)}")
+            return ""
+    
+    def _load_caption_image(self, image_url: str) -> Optional[Image.Image]:
+        """Load an image to caption, None if the path is unsupported or missing"""
+        # Load image based on URL type
+        if image_url.startswith('http://') or image_url.startswith('https://'):
+            # Download from HTTP(S) URL
+            response = requests.get(image_url, timeout=30)
+            response.raise_for_status()
+            return Image.open(io.BytesIO(response.content))
+        elif image_url.startswith('/files/mineru/'):
+            # Local MinerU extracted file with prefix matching support
+            from utils.path_utils import find_mineru_file_with_prefix
+            
+            # Find file with prefix matching
+            img_path = find_mineru_file_with_prefix(image_url)
+            
+            if img_path is None or not img_path.exists():
+                logger.warning(f"Local image file not found (with prefix matching): {image_url}")
+                return None
+            
+            return Image.open(img_path)
+        else:
+            # Unsupported path type
+            logger.warning(f"Unsupported image path type: {image_url}")
+            return None
+    
+    def _load_caption_part(self, image_url: str) -> Optional[types.Part]:
+        """_load_caption_image() already encoded as an inline part"""
+        image = self._load_caption_image(image_url)
+        if image is None:
+            return None
+        image_format = image.format if image.format in ('JPEG', 'PNG', 'WEBP') else 'PNG'
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+        return types.Part.from_bytes(data=buffer.getvalue(), mime_type=Image.MIME[image_format])
@@ -8,6 +8,8 @@ from typing import Optional
 from werkzeug.utils import secure_filename
 from PIL import Image
 
+from .thumbnails import thumbnails
+
 
 class FileService:
     """Service for file management"""
@@ -94,7 +96,9 @@ class FileService:
         
         # Generate filename with version number or timestamp
         if version_number is not None:
-            filename = f"{page_id}_v{version_number}.{ext}"
+            # Random suffix: concurrent edits can pick the same version number, and the name
+            # must never be reused since browsers cache versioned images as immutable
+            filename = f"{page_id}_v{version_number}_{uuid.uuid4().hex[:12]}.{ext}"
         else:
             # Use timestamp for unique filename
             import time
@@ -107,6 +111,9 @@ class FileService:
         # Some PIL Image objects may not support format parameter, so we use extension
         image.save(str(filepath))
         
+        # Thumbnails for slide grids and project lists, made in the background
+        thumbnails.pregenerate(str(filepath))
+        
         # Return relative path
         return str(filepath.relative_to(self.upload_folder))
 
@@ -223,10 +230,11 @@ class FileService:
         """
         pages_dir = self._get_pages_dir(project_id)
         
-        # Find and delete page image (any extension)
-        for file in pages_dir.glob(f"{page_id}.*"):
-            if file.is_file():
-                file.unlink()
+        # Find and delete page image (any extension), plus its normalized reference-image sidecar
+        for pattern in (f"{page_id}.*", f".{page_id}.*"):
+            for file in pages_dir.glob(pattern):
+                if file.is_file():
+                    file.unlink()
         
         return True
     
@@ -0,0 +1,191 @@
+"""
+File Uploads - send recurring reference images once, then refer to them by handle
+
+Large inline images (the 2K template, material images) are otherwise serialized into the body
+of every image request. Parts above a size threshold are uploaded through a FileUploader and
+the returned URI is reused until shortly before the handle expires. Handles are content
+addressed (sha256 of the bytes) per uploader scope, so every page of every deck using the same
+template shares one upload.
+
+GeminiFileUploader talks to the Gemini Files API; LocalFileUploader is an in-memory stand-in
+for tests and offline runs.
+"""
+import hashlib
+import io
+import threading
+import time
+import logging
+from datetime import timezone
+from typing import Any, Dict, List, Optional
+
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Gemini keeps uploaded files for 48 hours
+DEFAULT_HANDLE_TTL_SECONDS = 48 * 3600
+# Stop using a handle this long before it expires, a long request must not outlive it
+EXPIRY_MARGIN_SECONDS = 3600
+DEFAULT_MIN_BYTES = 256 * 1024
+
+
+class UploadedFile:
+    """Handle of an uploaded file"""
+
+    def __init__(self, uri: str, mime_type: str, expires_at: float, name: Optional[str] = None):
+        self.uri = uri
+        self.mime_type = mime_type
+        self.expires_at = expires_at
+        self.name = name
+
+
+class FileUploader:
+    """Upload API abstraction: turns bytes into a file handle usable in generate_content"""
+
+    # Handles of different uploaders (API keys / endpoints) are not interchangeable
+    scope = 'default'
+
+    def upload(self, data: bytes, mime_type: str, display_name: str = None) -> UploadedFile:
+        raise NotImplementedError
+
+    def delete(self, name: str):
+        pass
+
+
+class GeminiFileUploader(FileUploader):
+    """Uploads through the Gemini Files API of a genai.Client"""
+
+    def __init__(self, client, scope: str):
+        self.client = client
+        self.scope = scope
+
+    def upload(self, data: bytes, mime_type: str, display_name: str = None) -> UploadedFile:
+        uploaded = self.client.files.upload(
+            file=io.BytesIO(data),
+            config=types.UploadFileConfig(mime_type=mime_type, display_name=display_name)
+        )
+        state = getattr(uploaded.state, 'value', uploaded.state)
+        if state and state != 'ACTIVE':
+            raise RuntimeError(f"Uploaded file {uploaded.name} is {state}, not ACTIVE")
+
+        expires_at = time.time() + DEFAULT_HANDLE_TTL_SECONDS
+        if uploaded.expiration_time:
+            expiration = uploaded.expiration_time
+            if expiration.tzinfo is None:
+                expiration = expiration.replace(tzinfo=timezone.utc)
+            expires_at = min(expires_at, expiration.timestamp())
+        return UploadedFile(uploaded.uri, uploaded.mime_type or mime_type, expires_at, uploaded.name)
+
+    def delete(self, name: str):
+        self.client.files.delete(name=name)
+
+
+class LocalFileUploader(FileUploader):
+    """In-memory uploader for tests: records uploads and returns local:// handles"""
+
+    scope = 'local'
+
+    def __init__(self, ttl_seconds: int = DEFAULT_HANDLE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.files = {}  # uri -> (data, mime_type)
+        self.uploads = 0
+
+    def upload(self, data: bytes, mime_type: str, display_name: str = None) -> UploadedFile:
+        self.uploads += 1
+        uri = f"local://files/{hashlib.sha256(data).hexdigest()[:32]}"
+        self.files[uri] = (data, mime_type)
+        return UploadedFile(uri, mime_type, time.time() + self.ttl_seconds, uri)
+
+    def delete(self, name: str):
+        self.files.pop(name, None)
+
+
+class UploadedFileCache:
+    """
+    Maps (uploader scope, content hash) to an uploaded file handle
+
+    Parts below min_bytes stay inline (an upload costs an extra round trip). A failed upload
+    falls back to the inline part and is not retried for a few minutes.
+    """
+
+    def __init__(self, enabled: bool = True, min_bytes: int = DEFAULT_MIN_BYTES):
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.lock = threading.Lock()
+        self.handles = {}  # (scope, sha256) -> UploadedFile
+        self.key_locks = {}  # (scope, sha256) -> Lock, one upload per content
+        self.failures = {}  # (scope, sha256) -> time before which upload is not retried
+        self.stats = {'hits': 0, 'uploads': 0, 'inline': 0, 'invalidations': 0, 'bytes_saved': 0}
+
+    def configure(self, enabled: bool = None, min_bytes: int = None):
+        """Apply app config (called once on startup)"""
+        if enabled is not None:
+            self.enabled = enabled
+        if min_bytes is not None:
+            self.min_bytes = min_bytes
+
+    def to_file_parts(self, uploader: FileUploader, contents: List[Any]) -> List[Any]:
+        """Replace large inline image parts of a contents list with uploaded file parts"""
+        return [self.to_file_part(uploader, item) if isinstance(item, types.Part) else item
+                for item in contents]
+
+    def to_file_part(self, uploader: FileUploader, part: types.Part) -> types.Part:
+        """File-handle version of an inline part, or the part itself if it stays inline"""
+        blob = part.inline_data
+        if not self.enabled or uploader is None or not blob or not blob.data or len(blob.data) < self.min_bytes:
+            return part
+
+        key = (uploader.scope, hashlib.sha256(blob.data).hexdigest())
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            now = time.time()
+            with self.lock:
+                handle = self.handles.get(key)
+                if handle and handle.expires_at - EXPIRY_MARGIN_SECONDS > now:
+                    self.stats['hits'] += 1
+                    self.stats['bytes_saved'] += len(blob.data)
+                    return types.Part.from_uri(file_uri=handle.uri, mime_type=handle.mime_type)
+                if self.failures.get(key, 0) > now:
+                    self.stats['inline'] += 1
+                    return part
+
+            try:
+                handle = uploader.upload(blob.data, blob.mime_type, display_name=f"ref-{key[1][:16]}")
+            except Exception as e:
+                logger.warning(f"Reference image upload failed, sending it inline: {str(e)}")
+                with self.lock:
+                    self.failures[key] = now + 300
+                    self.stats['inline'] += 1
+                return part
+
+            with self.lock:
+                self.handles[key] = handle
+                self.failures.pop(key, None)
+                self.stats['uploads'] += 1
+            logger.info(f"Uploaded reference image {key[1][:12]} ({len(blob.data)} bytes) as {handle.uri}")
+            return types.Part.from_uri(file_uri=handle.uri, mime_type=handle.mime_type)
+
+    def invalidate(self, uploader: FileUploader, uris: List[str]):
+        """Forget handles the server no longer accepts (deleted or expired early)"""
+        uris = set(uris)
+        with self.lock:
+            for key in [key for key, handle in self.handles.items()
+                        if key[0] == uploader.scope and handle.uri in uris]:
+                del self.handles[key]
+                self.stats['invalidations'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {**self.stats, 'handles': len(self.handles)}
+
+
+def get_file_uris(contents: List[Any]) -> List[str]:
+    """URIs of the file parts in a contents list"""
+    return [item.file_data.file_uri for item in contents
+            if isinstance(item, types.Part) and item.file_data and item.file_data.file_uri]
+
+
+# Global handle cache, configured from app config on startup
+uploaded_files = UploadedFileCache()
@@ -0,0 +1,238 @@
+"""
+Hedging - duplicate slow image requests to cut the latency tail of a deck
+
+A deck is done when its slowest page is done, and image calls have a long tail. With hedging
+enabled, a page call still running after the p90 latency observed for its model gets a second,
+identical request; whichever finishes first wins and the loser is cancelled (closing its HTTP
+request). On the thread path the original call keeps the page job's thread and the hedge is
+queued on the job_scheduler, so it is counted against the global cap like any other call; a
+blocking call can't be abandoned, so there the hedge stands in when the original call fails.
+
+Each deck gets a HedgeBudget (a fraction of its pages) so the extra cost stays bounded.
+The latency of every original call is recorded, hedged or not and whether it answered, failed
+or lost, so the p90 is ready once enabled and does not drift down as hedges win.
+"""
+import asyncio
+import contextvars
+import math
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .scheduler import job_scheduler, PRIORITY_BULK
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeBudget:
+    """Number of hedge requests one deck may still fire"""
+
+    def __init__(self, limit: int):
+        self.limit = max(0, limit)
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            if self.used >= self.limit:
+                return False
+            self.used += 1
+            return True
+
+
+class LatencyTracker:
+    """Sliding window of successful call durations per model"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}  # model -> deque of seconds
+
+    def observe(self, model: str, seconds: float):
+        with self.lock:
+            self.samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        with self.lock:
+            samples = sorted(self.samples.get(model, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))
+        return samples[index]
+
+
+class HedgingPolicy:
+    """Latency tracking plus the hedge decision for image calls"""
+
+    def __init__(self, enabled: bool = False, percentile: float = 0.9, min_samples: int = 20,
+                 budget_fraction: float = 0.1, min_delay: float = 5.0):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget_fraction = budget_fraction
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker()
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'budget_exhausted': 0}
+
+    def configure(self, enabled: bool = None, percentile: float = None, min_samples: int = None,
+                  budget_fraction: float = None, min_delay: float = None):
+        """Apply app config (called once on startup)"""
+        if enabled is not None:
+            self.enabled = enabled
+        if percentile is not None and 0 < percentile < 1:
+            self.percentile = percentile
+        if min_samples is not None and min_samples > 0:
+            self.min_samples = min_samples
+        if budget_fraction is not None and budget_fraction >= 0:
+            self.budget_fraction = budget_fraction
+        if min_delay is not None and min_delay >= 0:
+            self.min_delay = min_delay
+
+    def new_budget(self, pages: int) -> Optional[HedgeBudget]:
+        """Budget for a deck of `pages` pages (None when hedging is off)"""
+        if not self.enabled or pages <= 0:
+            return None
+        return HedgeBudget(max(1, math.ceil(pages * self.budget_fraction)) if self.budget_fraction else 0)
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds after which a call gets hedged, None until enough latencies are known"""
+        delay = self.latencies.percentile(model, self.percentile, self.min_samples)
+        return max(delay, self.min_delay) if delay is not None else None
+
+    def _count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _observe(self, model: str, started: float):
+        """
+        Sample the original call's latency, whether it answered, failed or lost. Hedges are not
+        sampled: they are only seen when they win, which would pull the p90 down over time.
+        """
+        self.latencies.observe(model, time.monotonic() - started)
+
+    def call(self, model: str, budget: Optional[HedgeBudget], fn: Callable[[], Any],
+             owner: Optional[str] = None, priority: int = PRIORITY_BULK) -> Any:
+        """
+        Run fn() on the calling thread; if it outlives the model's p90, a second fn() call is
+        queued on the job_scheduler (owner / priority as for the page job) so it takes a slot of
+        its own. A blocking call can't be abandoned, so here the hedge is a backup: its answer is
+        used when the original call fails. A hedge still queued when the original call returns
+        is dropped, one already running finishes in its own scheduler slot.
+        """
+        self._count('calls')
+        started = time.monotonic()
+        delay = self.hedge_delay(model) if budget is not None else None
+        if delay is None:
+            try:
+                return fn()
+            finally:
+                self._observe(model, started)
+
+        lock = threading.Lock()
+        state = {'finished': False, 'hedge': None}
+        # The hedge job runs with the caller's context variables (task id for metrics)
+        context = contextvars.copy_context()
+
+        def start_hedge():
+            with lock:
+                if not state['finished'] and self._acquire(budget, model):
+                    state['hedge'] = job_scheduler.submit(context.run, fn, owner=owner, priority=priority)
+
+        timer = threading.Timer(delay, start_hedge)
+        timer.daemon = True
+        timer.start()
+        try:
+            result = fn()
+            error = None
+        except Exception as e:
+            result, error = None, e
+        with lock:
+            state['finished'] = True
+            hedge = state['hedge']
+        timer.cancel()
+        self._observe(model, started)
+
+        # A hedge still queued is dropped: never wait for a slot here, the page job holding
+        # this thread may be the one the hedge is waiting for. A running one is only waited
+        # for when the original call failed.
+        if hedge is None or hedge.cancel() or (error is None and result is not None):
+            if error:
+                raise error
+            return result
+        try:
+            hedge_result = hedge.result()
+        except Exception:
+            hedge_result = None
+        if hedge_result is None:
+            if error:
+                raise error
+            return result
+        self._count('hedge_wins')
+        return hedge_result
+
+    async def acall(self, model: str, budget: Optional[HedgeBudget],
+                    fn: Callable[[], Awaitable[Any]]) -> Any:
+        """call() for coroutines: the losing request is cancelled"""
+        self._count('calls')
+        started = time.monotonic()
+        delay = self.hedge_delay(model) if budget is not None else None
+        if delay is None:
+            try:
+                return await fn()
+            finally:
+                self._observe(model, started)
+
+        primary = asyncio.ensure_future(fn())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not self._acquire(budget, model):
+            try:
+                return await primary
+            finally:
+                self._observe(model, started)
+
+        hedge = asyncio.ensure_future(fn())
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if primary in done:
+                    self._observe(model, started)
+                for task in done:
+                    if task.exception() is None and task.result() is not None:
+                        if task is hedge:
+                            self._count('hedge_wins')
+                        return task.result()
+                    error = task.exception() or error
+        finally:
+            if primary in pending:
+                # Cancelled as the loser: it would have taken at least this long
+                self._observe(model, started)
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Let the loser unwind (and give back its rate limiter slot) before returning
+                await asyncio.gather(*pending, return_exceptions=True)
+        if error:
+            raise error
+        return None
+
+    def _acquire(self, budget: HedgeBudget, model: str) -> bool:
+        if budget.try_acquire():
+            self._count('hedged')
+            logger.info(f"Hedging slow {model} call ({budget.used}/{budget.limit} of deck budget)")
+            return True
+        self._count('budget_exhausted')
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+        return {'enabled': self.enabled, **stats}
+
+
+# Global policy for page image calls, configured from app config on startup (disabled by default)
+image_hedging = HedgingPolicy()
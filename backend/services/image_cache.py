@@ -0,0 +1,322 @@
+"""
+Reference Image Cache - prepared reference images for image generation, shared process-wide
+
+Every page of a deck sends the same template (and often the same material images) to the
+image model. Instead of decoding the file and letting the SDK re-encode it for each request,
+images are prepared once and kept as a ready-made types.Part in an LRU with a byte budget.
+
+Preparing normalizes the image: downscale to the model's effective input resolution, flatten
+alpha onto white, drop metadata and re-encode as JPEG/WebP at a quality target. The original
+bytes are kept instead when they are already acceptable and smaller. For local files the
+result is also memoized on disk in a hidden sidecar next to the source
+(.{name}.ref-{settings}.{ext}), so restarts and other workers skip the work too.
+
+Local files are keyed by path + mtime + size, URLs are revalidated with ETag / Last-Modified.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from PIL import Image, ImageOps
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+# Longest side worth sending, the model downsamples larger inputs anyway
+DEFAULT_MAX_DIMENSION = 1536
+DEFAULT_FORMAT = 'jpeg'
+DEFAULT_QUALITY = 85
+
+OUTPUT_FORMATS = {'jpeg': ('JPEG', 'image/jpeg', 'jpg'), 'webp': ('WEBP', 'image/webp', 'webp')}
+MIME_BY_EXTENSION = {'jpg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+class ReferenceImageCache:
+    """LRU of prepared image Parts with a byte budget and hit/miss counters"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_dimension: int = DEFAULT_MAX_DIMENSION,
+                 output_format: str = DEFAULT_FORMAT, quality: int = DEFAULT_QUALITY,
+                 disk_cache: bool = True, url_revalidate_seconds: int = 60):
+        self.max_bytes = max_bytes
+        self.max_dimension = max_dimension
+        self.output_format = output_format if output_format in OUTPUT_FORMATS else DEFAULT_FORMAT
+        self.quality = quality
+        self.disk_cache = disk_cache
+        self.url_revalidate_seconds = url_revalidate_seconds
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> {'part', 'size', 'etag', 'last_modified', 'validated_at'}
+        self.size = 0
+        self.mineru_paths = {}  # /files/mineru/... -> resolved local path
+        self.stats_counters = {
+            'hits': 0, 'misses': 0, 'disk_hits': 0, 'revalidated': 0, 'evictions': 0,
+            'source_bytes': 0, 'prepared_bytes': 0,
+        }
+
+    def configure(self, max_bytes: int = None, max_dimension: int = None, output_format: str = None,
+                  quality: int = None, disk_cache: bool = None):
+        """Apply app config (called once on startup)"""
+        with self.lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if max_dimension is not None:
+                self.max_dimension = max_dimension
+            if output_format is not None:
+                self.output_format = output_format.lower() if output_format.lower() in OUTPUT_FORMATS else DEFAULT_FORMAT
+            if quality is not None:
+                self.quality = quality
+            if disk_cache is not None:
+                self.disk_cache = disk_cache
+            self.entries.clear()
+            self.size = 0
+
+    def get_part(self, source: str) -> Optional[types.Part]:
+        """
+        Prepared Part for a local path, an http(s) URL or a /files/mineru/ path
+
+        Returns:
+            types.Part, or None if the image cannot be found / downloaded
+        """
+        if source.startswith('http://') or source.startswith('https://'):
+            return self._get_url_part(source)
+        if source.startswith('/files/mineru/'):
+            local_path = self._resolve_mineru_path(source)
+            return self._get_file_part(local_path) if local_path else None
+        if os.path.exists(source):
+            return self._get_file_part(source)
+        return None
+
+    def prepare(self, image: Image.Image, raw: Optional[bytes] = None) -> types.Part:
+        """
+        Normalize an image to the Part sent to the API
+
+        Args:
+            image: Decoded (or lazily opened) image
+            raw: Original encoded bytes, kept when they are already in the output format,
+                small enough and not larger than the normalized encoding
+        """
+        data, mime_type = self._normalize(image, raw)
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+    @property
+    def settings_tag(self) -> str:
+        """Short identity of the normalization settings, part of the sidecar name"""
+        settings = f"{self.max_dimension}|{self.output_format}|{self.quality}"
+        return hashlib.sha1(settings.encode('utf-8')).hexdigest()[:8]
+
+    def _normalize(self, image: Image.Image, raw: Optional[bytes] = None) -> Tuple[bytes, str]:
+        """Downscale, flatten alpha, strip metadata and re-encode; returns (bytes, mime_type)"""
+        pil_format, mime_type, _ = OUTPUT_FORMATS[self.output_format]
+        source_format = image.format
+        needs_resize = bool(self.max_dimension) and max(image.size) > self.max_dimension
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+        has_metadata = bool(image.info.get('exif') or image.info.get('icc_profile'))
+
+        if needs_resize:
+            # draft() lets JPEG decode at a reduced scale instead of full size
+            image.draft('RGB', (self.max_dimension, self.max_dimension))
+        image.load()
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(image)
+
+        if has_alpha:
+            rgba = image.convert('RGBA')
+            flattened = Image.new('RGB', rgba.size, (255, 255, 255))
+            flattened.paste(rgba, mask=rgba.getchannel('A'))
+            image = flattened
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        if max(image.size) > (self.max_dimension or max(image.size)):
+            image = image.copy()
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.Resampling.LANCZOS)
+
+        # Saving a fresh image writes no EXIF / ICC / text chunks
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, quality=self.quality, optimize=True)
+        data = buffer.getvalue()
+
+        if (raw is not None and not needs_resize and not has_alpha and not has_metadata
+                and source_format == pil_format and len(raw) <= len(data)):
+            data = raw
+        return data, mime_type
+
+    def _sidecar_path(self, path: str) -> str:
+        directory, name = os.path.split(os.path.abspath(path))
+        _, _, extension = OUTPUT_FORMATS[self.output_format]
+        return os.path.join(directory, f".{name}.ref-{self.settings_tag}.{extension}")
+
+    def _read_sidecar(self, path: str, source_mtime_ns: int) -> Optional[types.Part]:
+        """Normalized bytes memoized next to the source, if they are newer than the source"""
+        sidecar = self._sidecar_path(path)
+        try:
+            if os.stat(sidecar).st_mtime_ns < source_mtime_ns:
+                return None
+            with open(sidecar, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        mime_type = MIME_BY_EXTENSION[sidecar.rsplit('.', 1)[1]]
+        return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+    def _write_sidecar(self, path: str, data: bytes):
+        """Atomically write the sidecar and drop sidecars of older settings (best effort)"""
+        sidecar = self._sidecar_path(path)
+        directory, name = os.path.split(os.path.abspath(path))
+        tmp_path = f"{sidecar}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, sidecar)
+            stale_prefix = f".{name}.ref-"
+            for fname in os.listdir(directory):
+                if fname.startswith(stale_prefix) and os.path.join(directory, fname) != sidecar \
+                        and not fname.endswith('.tmp'):
+                    os.remove(os.path.join(directory, fname))
+        except OSError as e:
+            logger.debug(f"Could not write reference image sidecar for {path}: {str(e)}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _get_file_part(self, path: str) -> Optional[types.Part]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = ('file', os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+        entry = self._lookup(key)
+        if entry:
+            return entry['part']
+
+        part = self._read_sidecar(path, stat.st_mtime_ns) if self.disk_cache else None
+        if part is not None:
+            self._count('disk_hits')
+        else:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            part = self.prepare(Image.open(io.BytesIO(raw)), raw)
+            self._record_sizes(len(raw), len(part.inline_data.data))
+            if self.disk_cache:
+                self._write_sidecar(path, part.inline_data.data)
+        self._store(key, part)
+        return part
+
+    def _get_url_part(self, url: str) -> Optional[types.Part]:
+        key = ('url', url)
+        entry = self._lookup(key, count=False)
+        headers = {}
+        if entry:
+            if time.time() - entry['validated_at'] < self.url_revalidate_seconds:
+                self._count('hits')
+                return entry['part']
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            logger.debug(f"Downloading image from URL: {url}")
+            response = requests.get(url, timeout=30, headers=headers)
+            if entry and response.status_code == 304:
+                with self.lock:
+                    entry['validated_at'] = time.time()
+                    self.stats_counters['revalidated'] += 1
+                    self.stats_counters['hits'] += 1
+                return entry['part']
+            response.raise_for_status()
+            part = self.prepare(Image.open(io.BytesIO(response.content)), response.content)
+            self._record_sizes(len(response.content), len(part.inline_data.data))
+        except Exception as e:
+            logger.error(f"Failed to download image from {url}: {str(e)}")
+            return None
+
+        self._count('misses')
+        if response.headers.get('ETag') or response.headers.get('Last-Modified'):
+            self._store(key, part, etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'))
+        else:
+            # Without validators the content can only be trusted for the revalidation window
+            self._store(key, part)
+        return part
+
+    def _resolve_mineru_path(self, mineru_path: str) -> Optional[str]:
+        """Resolve a MinerU path once, prefix matching scans the extract directory"""
+        from utils.path_utils import find_mineru_file_with_prefix
+
+        with self.lock:
+            local_path = self.mineru_paths.get(mineru_path)
+        if local_path and os.path.exists(local_path):
+            return local_path
+
+        matched_path = find_mineru_file_with_prefix(mineru_path)
+        local_path = str(matched_path) if matched_path and matched_path.exists() else None
+        if local_path:
+            with self.lock:
+                if len(self.mineru_paths) > 4096:
+                    self.mineru_paths.clear()
+                self.mineru_paths[mineru_path] = local_path
+        return local_path
+
+    def _lookup(self, key: Tuple, count: bool = True) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                self.entries.move_to_end(key)
+            if count:
+                self.stats_counters['hits' if entry else 'misses'] += 1
+            return entry
+
+    def _store(self, key: Tuple, part: types.Part, etag: str = None, last_modified: str = None):
+        size = len(part.inline_data.data)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous:
+                self.size -= previous['size']
+            # Files are keyed by mtime, so an older version of the same path is dead weight
+            if key[0] == 'file':
+                for stale_key in [k for k in self.entries if k[0] == 'file' and k[1] == key[1]]:
+                    self.size -= self.entries.pop(stale_key)['size']
+            self.entries[key] = {
+                'part': part,
+                'size': size,
+                'etag': etag,
+                'last_modified': last_modified,
+                'validated_at': time.time(),
+            }
+            self.size += size
+            while self.size > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted['size']
+                self.stats_counters['evictions'] += 1
+
+    def _record_sizes(self, source_bytes: int, prepared_bytes: int):
+        with self.lock:
+            self.stats_counters['source_bytes'] += source_bytes
+            self.stats_counters['prepared_bytes'] += prepared_bytes
+
+    def _count(self, stat: str):
+        with self.lock:
+            self.stats_counters[stat] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                **self.stats_counters,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Global cache instance, budget and size are configured from app config on startup
+reference_images = ReferenceImageCache()
@@ -0,0 +1,139 @@
+"""
+JSON Stream - incremental parsing of a JSON array while the model is still writing it
+
+Streamed outline / description answers are a JSON array (optionally wrapped in a ```json
+fence). JSONArrayStreamParser scans the text as it arrives and reports every array element
+as soon as it is closed, so callers can show the first pages long before the completion ends.
+"""
+import json
+import re
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PART_NAME = re.compile(r'"part"\s*:\s*"((?:\\.|[^"\\])*)"')
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental scanner for a top-level JSON array
+
+    Elements are reported with their depth: 1 for elements of the top-level array, 3 for
+    elements of an array nested in a top-level object (the "pages" of an outline part), and so
+    on. Only elements of arrays are reported, never object members. Text before the first '['
+    (a ```json fence) and after the closing ']' is ignored.
+    """
+
+    def __init__(self, depths: Iterable[int] = (1,)):
+        self.depths = set(depths)
+        self.buffer = ''
+        self.pos = 0
+        self.stack = []  # [(opening char, start index)]
+        self.in_string = False
+        self.escape = False
+        self.string_start = None  # start of a string that is an array element
+        self.scalar_start = None  # start of a number / true / false / null array element
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[int, Any, Optional[str]]]:
+        """
+        Add text and return the elements closed by it
+
+        Returns:
+            List of (depth, value, enclosing) where enclosing is the text of the enclosing
+            top-level element so far (None for depth 1 elements)
+        """
+        self.buffer += chunk
+        results = []
+        buf = self.buffer
+        i = self.pos
+
+        while i < len(buf) and not self.done:
+            c = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == '\\':
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.string_start is not None:
+                        self._emit(results, buf[self.string_start:i + 1], i)
+                        self.string_start = None
+            elif not self.stack:
+                if c == '[':
+                    self.stack.append((c, i))
+            elif c == '"':
+                self.in_string = True
+                if self._is_element_position():
+                    self.string_start = i
+            elif c in '[{':
+                self._end_scalar(results, i)
+                self.stack.append((c, i))
+            elif c in ']}':
+                self._end_scalar(results, i)
+                _, start = self.stack.pop()
+                if not self.stack:
+                    self.done = True
+                elif self._is_element_position():
+                    self._emit(results, buf[start:i + 1], i)
+            elif c == ',':
+                self._end_scalar(results, i)
+            elif not c.isspace() and self.scalar_start is None and self._is_element_position():
+                self.scalar_start = i
+            i += 1
+
+        self.pos = i
+        return results
+
+    def _is_element_position(self) -> bool:
+        return self.stack[-1][0] == '[' and len(self.stack) in self.depths
+
+    def _end_scalar(self, results: List, end: int):
+        if self.scalar_start is not None:
+            self._emit(results, self.buffer[self.scalar_start:end].strip(), end)
+            self.scalar_start = None
+
+    def _emit(self, results: List, text: str, end: int):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            logger.debug(f"Skipping unparsable streamed element: {text[:80]}")
+            return
+        depth = len(self.stack)
+        enclosing = self.buffer[self.stack[1][1]:end] if depth > 1 else None
+        results.append((depth, value, enclosing))
+
+
+class OutlineStreamParser:
+    """
+    Reports outline pages as they close, for both outline formats
+
+    Simple format: every top-level object is a page. Part-based format: pages inside a part's
+    "pages" array are reported one by one with the part name attached, the closing part object
+    itself is not reported again.
+    """
+
+    def __init__(self):
+        self.parser = JSONArrayStreamParser(depths=(1, 3))
+        self.parts_with_pages = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        pages = []
+        for depth, value, enclosing in self.parser.feed(chunk):
+            if not isinstance(value, dict):
+                continue
+            if depth == 3:
+                if '"pages"' not in enclosing:
+                    continue
+                page = value.copy()
+                match = _PART_NAME.search(enclosing)
+                if match:
+                    page['part'] = json.loads(f'"{match.group(1)}"')
+                pages.append(page)
+            elif 'pages' in value and 'part' in value:
+                self.parts_with_pages += 1
+            else:
+                pages.append(value)
+        return pages
@@ -0,0 +1,229 @@
+"""
+Metrics - per-call instrumentation of Gemini requests
+
+Every model call made through call_with_rate_limit / acall_with_rate_limit is recorded with
+its latency (including rate-limiter waits and retries), prompt / response tokens, request
+payload bytes, retry count and outcome. Aggregates are rendered in the Prometheus text format
+on /metrics; calls made while a background task runs are also summed per task (the task id
+travels in a context variable that the task manager, scheduler and async runtime carry over
+to the threads / coroutines doing the work) and stored in Task.metrics when the task ends.
+"""
+import contextvars
+import threading
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Task the current thread / coroutine works for
+current_task_id = contextvars.ContextVar('current_task_id', default=None)
+
+# Latency histogram buckets in seconds (image calls take tens of seconds)
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+MAX_TRACKED_TASKS = 1000
+
+
+@contextmanager
+def task_scope(task_id: str):
+    """Attribute the model calls made inside the block to a task"""
+    token = current_task_id.set(task_id)
+    try:
+        yield
+    finally:
+        current_task_id.reset(token)
+
+
+def restore_context(context: contextvars.Context):
+    """Set the variables of a captured context in the current one (start of a coroutine)"""
+    for var, value in context.items():
+        if var.get(None) is not value:
+            var.set(value)
+
+
+def estimate_request_bytes(contents: Any) -> int:
+    """Approximate payload size of a generate_content request"""
+    items = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = 0
+    for item in items:
+        if isinstance(item, str):
+            total += len(item.encode('utf-8'))
+            continue
+        inline_data = getattr(item, 'inline_data', None)
+        file_data = getattr(item, 'file_data', None)
+        text = getattr(item, 'text', None)
+        if inline_data is not None and inline_data.data:
+            # Inline bytes are base64 encoded in the JSON body
+            total += (len(inline_data.data) + 2) // 3 * 4
+        elif file_data is not None and file_data.file_uri:
+            total += len(file_data.file_uri)
+        elif isinstance(text, str):
+            total += len(text.encode('utf-8'))
+        elif hasattr(item, 'size') and hasattr(item, 'mode'):
+            # PIL image, serialized by the SDK; raw pixel size is an upper bound
+            width, height = item.size
+            total += width * height * len(item.getbands())
+    return total
+
+
+def get_usage_tokens(response: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt tokens, response tokens incl. thinking) from a response's usage metadata"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None, None
+    prompt = getattr(usage, 'prompt_token_count', None)
+    candidates = getattr(usage, 'candidates_token_count', None)
+    thoughts = getattr(usage, 'thoughts_token_count', None)
+    response_tokens = None
+    if isinstance(candidates, int) or isinstance(thoughts, int):
+        response_tokens = (candidates if isinstance(candidates, int) else 0) + \
+            (thoughts if isinstance(thoughts, int) else 0)
+    return (prompt if isinstance(prompt, int) else None), response_tokens
+
+
+def _empty_totals() -> Dict[str, float]:
+    return {'calls': 0, 'errors': 0, 'retries': 0, 'duration_seconds': 0.0,
+            'prompt_tokens': 0, 'response_tokens': 0, 'request_bytes': 0}
+
+
+def _add(totals: Dict[str, float], duration: float, prompt_tokens: Optional[int],
+         response_tokens: Optional[int], request_bytes: int, retries: int, outcome: str):
+    totals['calls'] += 1
+    totals['errors'] += 0 if outcome == 'success' else 1
+    totals['retries'] += retries
+    totals['duration_seconds'] += duration
+    totals['prompt_tokens'] += prompt_tokens or 0
+    totals['response_tokens'] += response_tokens or 0
+    totals['request_bytes'] += request_bytes or 0
+
+
+class AIMetrics:
+    """Process-wide aggregates plus per-task breakdowns of model calls"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}  # (source, model, operation, outcome) -> totals + histogram counts
+        self.tasks = OrderedDict()  # task_id -> {'total': totals, 'by_model': {model: totals}}
+        self.started_at = time.time()
+
+    def record(self, model: str, duration: float, response: Any = None, request_bytes: int = 0,
+               retries: int = 0, outcome: str = 'success', source: str = 'ai_service',
+               operation: str = 'generate_content'):
+        """Record one model call (all attempts of it)"""
+        prompt_tokens, response_tokens = get_usage_tokens(response)
+        key = (source, model, operation, outcome)
+        task_id = current_task_id.get()
+
+        with self.lock:
+            entry = self.series.get(key)
+            if entry is None:
+                entry = self.series[key] = {**_empty_totals(), 'buckets': [0] * len(LATENCY_BUCKETS)}
+            _add(entry, duration, prompt_tokens, response_tokens, request_bytes, retries, outcome)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    entry['buckets'][i] += 1
+
+            if task_id:
+                breakdown = self.tasks.get(task_id)
+                if breakdown is None:
+                    breakdown = self.tasks[task_id] = {'total': _empty_totals(), 'by_model': {}}
+                    while len(self.tasks) > MAX_TRACKED_TASKS:
+                        self.tasks.popitem(last=False)
+                _add(breakdown['total'], duration, prompt_tokens, response_tokens,
+                     request_bytes, retries, outcome)
+                _add(breakdown['by_model'].setdefault(model, _empty_totals()), duration,
+                     prompt_tokens, response_tokens, request_bytes, retries, outcome)
+
+    def task_breakdown(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Per-task totals and per-model split, None if the task made no model calls"""
+        with self.lock:
+            breakdown = self.tasks.get(task_id)
+            if breakdown is None:
+                return None
+            return {
+                **_rounded(breakdown['total']),
+                'by_model': {model: _rounded(totals) for model, totals in breakdown['by_model'].items()},
+            }
+
+    def pop_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """task_breakdown() and forget the task (its numbers are persisted on the row)"""
+        breakdown = self.task_breakdown(task_id)
+        with self.lock:
+            self.tasks.pop(task_id, None)
+        return breakdown
+
+    def render_prometheus(self, gauges: Iterable[Tuple[str, str, Dict[str, str], float]] = ()) -> str:
+        """
+        Prometheus text exposition of the call aggregates
+
+        Args:
+            gauges: Extra (name, help, labels, value) samples, e.g. scheduler / limiter state
+        """
+        with self.lock:
+            series = [(key, {**entry, 'buckets': list(entry['buckets'])})
+                      for key, entry in self.series.items()]
+
+        lines = []
+        counters = [
+            ('gemini_calls_total', 'Gemini model calls', 'calls'),
+            ('gemini_call_retries_total', 'Retries of Gemini model calls', 'retries'),
+            ('gemini_prompt_tokens_total', 'Prompt tokens reported by Gemini', 'prompt_tokens'),
+            ('gemini_response_tokens_total', 'Response (incl. thinking) tokens reported by Gemini', 'response_tokens'),
+            ('gemini_request_bytes_total', 'Approximate request payload bytes sent to Gemini', 'request_bytes'),
+        ]
+        for name, help_text, field in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for key, entry in series:
+                lines.append(f'{name}{_labels(key)} {_number(entry[field])}')
+
+        name = 'gemini_call_duration_seconds'
+        lines.append(f'# HELP {name} Gemini call latency including rate limiter waits and retries')
+        lines.append(f'# TYPE {name} histogram')
+        for key, entry in series:
+            for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+                lines.append(f'{name}_bucket{_labels(key, le=_number(bound))} {count}')
+            lines.append(f'{name}_bucket{_labels(key, le="+Inf")} {entry["calls"]}')
+            lines.append(f'{name}_sum{_labels(key)} {_number(entry["duration_seconds"])}')
+            lines.append(f'{name}_count{_labels(key)} {entry["calls"]}')
+
+        seen = set()
+        for name, help_text, labels, value in gauges:
+            if name not in seen:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} gauge')
+                seen.add(name)
+            lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _rounded(totals: Dict[str, float]) -> Dict[str, Any]:
+    return {**totals, 'duration_seconds': round(totals['duration_seconds'], 3)}
+
+
+def _labels(key: Tuple[str, str, str, str], **extra) -> str:
+    source, model, operation, outcome = key
+    return _format_labels({'source': source, 'model': model, 'operation': operation,
+                           'outcome': outcome, **extra})
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    parts: List[str] = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Global metrics registry
+ai_metrics = AIMetrics()
@@ -0,0 +1,230 @@
+"""
+PDF Writer - streams slide images into a PDF one page at a time
+
+Each image is embedded in its already-compressed form where PDF can read it directly:
+JPEG files as DCTDecode streams and 8-bit, non-interlaced grayscale / RGB PNG files as the
+Flate stream made of their IDAT chunks (with the PNG predictor). Both are copied from disk in
+fixed-size chunks without decoding. Anything else (alpha, palette, WebP, ...) is decoded for
+that page only, converted to RGB and Flate-compressed.
+
+Page size is the image size in points (72 dpi), the same as Pillow's PDF export. Memory use does
+not grow with the page count: only the byte offsets of the written objects are kept.
+"""
+import os
+import struct
+import zlib
+import logging
+from typing import BinaryIO, List, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG color type -> (PDF color space, components)
+_PNG_COLOR_SPACES = {0: ('/DeviceGray', 1), 2: ('/DeviceRGB', 3)}
+_JPEG_COLOR_SPACES = {'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
+
+
+def _png_idat_chunks(f: BinaryIO) -> Optional[Tuple[int, int, int, List[Tuple[int, int]]]]:
+    """
+    (width, height, components, [(offset, length) of IDAT data]) of a PNG that PDF can embed
+    as is, or None if it needs decoding
+    """
+    if f.read(8) != PNG_SIGNATURE:
+        return None
+    header = None
+    chunks = []
+    while True:
+        raw = f.read(8)
+        if len(raw) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', raw)
+        if chunk_type == b'IHDR':
+            header = struct.unpack('>IIBBBBB', f.read(13))
+            f.seek(4, os.SEEK_CUR)
+            continue
+        if chunk_type == b'IDAT':
+            chunks.append((f.tell(), length))
+        elif chunk_type == b'IEND':
+            break
+        f.seek(length + 4, os.SEEK_CUR)
+
+    if header is None or not chunks:
+        return None
+    width, height, bit_depth, color_type, compression, filter_method, interlace = header
+    if bit_depth != 8 or color_type not in _PNG_COLOR_SPACES or interlace or compression or filter_method:
+        return None
+    return width, height, _PNG_COLOR_SPACES[color_type][1], chunks
+
+
+class StreamingPDFWriter:
+    """
+    Writes a PDF with one full-page image per page to a binary file object
+
+    Usage:
+        with open(path, 'wb') as f:
+            writer = StreamingPDFWriter(f)
+            for image_path in image_paths:
+                writer.add_image_page(image_path)
+            writer.close()
+    """
+
+    def __init__(self, output: BinaryIO):
+        self.output = output
+        self.offsets = {}  # object number -> byte offset
+        self.page_refs = []
+        self.position = 0
+        self.next_object = 3  # 1: catalog, 2: page tree (written by close())
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_refs)
+
+    def _write(self, data: bytes):
+        self.output.write(data)
+        self.position += len(data)
+
+    def _allocate(self) -> int:
+        number = self.next_object
+        self.next_object += 1
+        return number
+
+    def _begin_object(self, number: int):
+        self.offsets[number] = self.position
+        self._write(f'{number} 0 obj\n'.encode('ascii'))
+
+    def _write_object(self, number: int, body: str):
+        self._begin_object(number)
+        self._write(body.encode('ascii') + b'\nendobj\n')
+
+    def _write_stream(self, number: int, dictionary: str, length: int, chunks):
+        """Stream object whose data is produced by an iterable of byte chunks totalling length"""
+        self._begin_object(number)
+        self._write(f'<< {dictionary} /Length {length} >>\nstream\n'.encode('ascii'))
+        written = 0
+        for chunk in chunks:
+            written += len(chunk)
+            self._write(chunk)
+        if written != length:
+            raise ValueError(f"Stream length mismatch ({written} != {length})")
+        self._write(b'\nendstream\nendobj\n')
+
+    def add_image_page(self, image_path: str) -> bool:
+        """
+        Append a page showing the image at image_path
+
+        Returns:
+            False if the file does not exist (the page is skipped)
+        """
+        if not os.path.exists(image_path):
+            logger.warning(f"Image not found: {image_path}")
+            return False
+
+        image_number = self._allocate()
+        with open(image_path, 'rb') as f:
+            size = self._write_passthrough_image(image_number, f)
+        if size is None:
+            size = self._write_decoded_image(image_number, image_path)
+        width, height = size
+
+        content = f'q {width} 0 0 {height} 0 0 cm /Im0 Do Q'.encode('ascii')
+        content_number = self._allocate()
+        self._write_stream(content_number, '', len(content), [content])
+
+        page_number = self._allocate()
+        self._write_object(
+            page_number,
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] '
+            f'/Resources << /XObject << /Im0 {image_number} 0 R >> /ProcSet [/PDF /ImageC /ImageB] >> '
+            f'/Contents {content_number} 0 R >>'
+        )
+        self.page_refs.append(page_number)
+        return True
+
+    def _write_passthrough_image(self, number: int, f: BinaryIO) -> Optional[Tuple[int, int]]:
+        """Embed JPEG / simple PNG bytes as they are, None if the image needs decoding"""
+        with Image.open(f) as img:
+            image_format, mode, (width, height) = img.format, img.mode, img.size
+
+        if image_format == 'JPEG' and mode in _JPEG_COLOR_SPACES:
+            f.seek(0, os.SEEK_END)
+            length = f.tell()
+            f.seek(0)
+            # Adobe CMYK JPEGs store inverted values
+            decode = ' /Decode [1 0 1 0 1 0 1 0]' if mode == 'CMYK' else ''
+            self._write_stream(
+                number,
+                f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                f'/ColorSpace {_JPEG_COLOR_SPACES[mode]} /BitsPerComponent 8 /Filter /DCTDecode{decode}',
+                length, self._copy(f, [(0, length)])
+            )
+            return width, height
+
+        if image_format == 'PNG':
+            f.seek(0)
+            png = _png_idat_chunks(f)
+            if png is None:
+                return None
+            width, height, components, chunks = png
+            color_space = '/DeviceGray' if components == 1 else '/DeviceRGB'
+            self._write_stream(
+                number,
+                f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+                f'/ColorSpace {color_space} /BitsPerComponent 8 /Filter /FlateDecode '
+                f'/DecodeParms << /Predictor 15 /Colors {components} /BitsPerComponent 8 /Columns {width} >>',
+                sum(length for _, length in chunks), self._copy(f, chunks)
+            )
+            return width, height
+
+        return None
+
+    @staticmethod
+    def _copy(f: BinaryIO, ranges: List[Tuple[int, int]]):
+        for offset, length in ranges:
+            f.seek(offset)
+            while length > 0:
+                chunk = f.read(min(COPY_CHUNK_SIZE, length))
+                if not chunk:
+                    raise ValueError("Unexpected end of image file")
+                length -= len(chunk)
+                yield chunk
+
+    def _write_decoded_image(self, number: int, image_path: str) -> Tuple[int, int]:
+        """Decode one image, convert it to RGB and embed it Flate-compressed"""
+        with Image.open(image_path) as img:
+            rgb = img.convert('RGB') if img.mode != 'RGB' else img.copy()
+        width, height = rgb.size
+        raw = rgb.tobytes()
+        rgb.close()
+        data = zlib.compress(raw, 6)
+        del raw
+        self._write_stream(
+            number,
+            f'/Type /XObject /Subtype /Image /Width {width} /Height {height} '
+            f'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode',
+            len(data), [data]
+        )
+        return width, height
+
+    def close(self):
+        """Write the page tree, catalog, cross-reference table and trailer"""
+        if not self.page_refs:
+            raise ValueError("No valid images found for PDF export")
+
+        kids = ' '.join(f'{number} 0 R' for number in self.page_refs)
+        self._write_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.page_refs)} >>')
+        self._write_object(1, '<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_offset = self.position
+        lines = [f'xref\n0 {self.next_object}\n', '0000000000 65535 f \n']
+        for number in range(1, self.next_object):
+            lines.append(f'{self.offsets[number]:010d} 00000 n \n')
+        self._write(''.join(lines).encode('ascii'))
+        self._write(
+            f'trailer\n<< /Size {self.next_object} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'
+            .encode('ascii')
+        )
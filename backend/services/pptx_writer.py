@@ -0,0 +1,361 @@
+"""
+PPTX Writer - builds image-only presentations by patching a previous package
+
+Every slide of an exported deck is the same blank-layout slide with one full-size picture, so
+a deck is fully described by its ordered list of slide images. The writer takes a previous
+package plus its manifest (which source image each slide shows and which slide / media parts
+hold it) and produces the new package by copying it part by part:
+
+- slides whose image did not change are copied as they are (moved in the slide list if the
+  pages were reordered);
+- slides whose image changed keep their slide part and get a new media part;
+- slides are cloned for added pages and dropped, with their media, for removed pages.
+
+Only the new images are read from disk; the rest of the package is copied entry by entry.
+Pictures are stored uncompressed in the zip (PNG / JPEG are compressed already), so copying
+them is plain I/O. Without a usable previous package the same code starts from a one-slide
+skeleton made by python-pptx, which is then a full build.
+"""
+import io
+import os
+import re
+import shutil
+import zipfile
+import logging
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from lxml import etree
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+_NS_CT = 'http://schemas.openxmlformats.org/package/2006/content-types'
+_NS_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_NS_P = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+_NS_R = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_REL_SLIDE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide'
+_REL_IMAGE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+_SLIDE_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.slide+xml'
+
+_CONTENT_TYPES = '[Content_Types].xml'
+_PRESENTATION = 'ppt/presentation.xml'
+_PRESENTATION_RELS = 'ppt/_rels/presentation.xml.rels'
+
+# Pillow format -> (extension, content type) PowerPoint reads natively
+_IMAGE_TYPES = {
+    'PNG': ('png', 'image/png'),
+    'JPEG': ('jpeg', 'image/jpeg'),
+    'GIF': ('gif', 'image/gif'),
+    'BMP': ('bmp', 'image/bmp'),
+    'TIFF': ('tiff', 'image/tiff'),
+}
+
+_skeleton = None
+
+
+def _get_skeleton() -> Tuple[bytes, Dict[str, Any]]:
+    """One-slide 16:9 package made by python-pptx, with its manifest"""
+    global _skeleton
+    if _skeleton is None:
+        from pptx import Presentation
+        from pptx.util import Inches
+
+        placeholder = io.BytesIO()
+        Image.new('RGB', (16, 9), (255, 255, 255)).save(placeholder, format='PNG')
+        placeholder.seek(0)
+
+        prs = Presentation()
+        # Set slide dimensions to 16:9 (width 10 inches, height 5.625 inches)
+        prs.slide_width = Inches(10)
+        prs.slide_height = Inches(5.625)
+        # Layout 6 is the blank layout, the picture fills the entire slide
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        slide.shapes.add_picture(placeholder, left=0, top=0, width=prs.slide_width, height=prs.slide_height)
+        media = next(rel.target_part.partname for rel in slide.part.rels.values() if rel.reltype == _REL_IMAGE)
+
+        package = io.BytesIO()
+        prs.save(package)
+        _skeleton = (package.getvalue(), {
+            'version': MANIFEST_VERSION,
+            'slides': [{
+                'source': None,
+                'slide': slide.part.partname.lstrip('/'),
+                'media': media.lstrip('/'),
+            }],
+        })
+    return _skeleton
+
+
+def _rels_name(part_name: str) -> str:
+    directory, filename = part_name.rsplit('/', 1)
+    return f'{directory}/_rels/{filename}.rels'
+
+
+def _source_of(image_path: str) -> Optional[List]:
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return None
+    return [image_path, stat.st_mtime_ns, stat.st_size]
+
+
+def _parse(data: bytes):
+    return etree.fromstring(data)
+
+
+def _serialize(root) -> bytes:
+    return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+
+class _Package:
+    """Previous package opened for patching"""
+
+    def __init__(self, source, manifest: Dict[str, Any]):
+        self.zip = zipfile.ZipFile(source)
+        self.names = set(self.zip.namelist())
+        self.slides = manifest['slides']
+        for slide in self.slides:
+            for name in (slide['slide'], _rels_name(slide['slide']), slide['media']):
+                if name not in self.names:
+                    raise ValueError(f"Part {name} missing from previous package")
+
+    def read(self, name: str) -> bytes:
+        return self.zip.read(name)
+
+    def close(self):
+        self.zip.close()
+
+
+def _open_base(base_file: Optional[str], base_manifest: Optional[Dict[str, Any]]) -> _Package:
+    if base_file and base_manifest and base_manifest.get('version') == MANIFEST_VERSION:
+        try:
+            return _Package(base_file, base_manifest)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+            logger.info(f"Previous PPTX {base_file} not usable, building from scratch: {str(e)}")
+    skeleton, manifest = _get_skeleton()
+    return _Package(io.BytesIO(skeleton), manifest)
+
+
+def write_pptx(image_paths: List[str], output: BinaryIO, base_file: Optional[str] = None,
+               base_manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Write a presentation with one full-slide picture per existing image
+
+    Args:
+        image_paths: Absolute paths of the slide images, in order (missing files are skipped)
+        output: Binary file object for the new package
+        base_file: Previous package to patch (optional)
+        base_manifest: Manifest returned when base_file was written
+
+    Returns:
+        Manifest of the new package (pass it back with the file for the next export)
+    """
+    sources = []
+    for image_path in image_paths:
+        source = _source_of(image_path)
+        if source is None:
+            logger.warning(f"Image not found: {image_path}")
+            continue
+        sources.append(source)
+    if not sources:
+        raise ValueError("No valid images found for PPTX export")
+
+    base = _open_base(base_file, base_manifest)
+    try:
+        return _patch(base, sources, output)
+    finally:
+        base.close()
+
+
+def _patch(base: _Package, sources: List[List], output: BinaryIO) -> Dict[str, Any]:
+    # 1. Match new slides to old ones: unchanged images first, then reuse leftover slide parts
+    unused = list(range(len(base.slides)))
+    plan = [None] * len(sources)  # index -> old slide index (or None for a new slide part)
+    for i, source in enumerate(sources):
+        for j in unused:
+            if base.slides[j]['source'] == source:
+                plan[i] = j
+                unused.remove(j)
+                break
+    changed = set()
+    for i in range(len(sources)):
+        if plan[i] is None and unused:
+            plan[i] = unused.pop(0)
+            changed.add(i)
+    removed = [base.slides[j] for j in unused]
+
+    # 2. New part names
+    taken = set(base.names)
+    numbers = [int(n) for name in taken for n in re.findall(r'^ppt/slides/slide(\d+)\.xml$', name)]
+    next_slide = max(numbers, default=0) + 1
+    media_numbers = [int(n) for name in taken for n in re.findall(r'^ppt/media/image(\d+)\.\w+$', name)]
+    next_media = max(media_numbers, default=0) + 1
+
+    template = base.slides[0]
+    slides = []
+    new_media = {}  # media part -> (source path, stored as is)
+    media_types = {}  # extension -> content type
+    for i, source in enumerate(sources):
+        if plan[i] is not None and i not in changed:
+            slides.append({**base.slides[plan[i]], 'new': False, 'rels_changed': False})
+            continue
+        image_format = _get_image_format(source[0])
+        extension, content_type = _IMAGE_TYPES.get(image_format, _IMAGE_TYPES['PNG'])
+        media = f'ppt/media/image{next_media}.{extension}'
+        next_media += 1
+        new_media[media] = (source[0], image_format in _IMAGE_TYPES)
+        media_types[extension] = content_type
+        if plan[i] is not None:
+            slides.append({'source': source, 'slide': base.slides[plan[i]]['slide'], 'media': media,
+                           'new': False, 'rels_changed': True})
+        else:
+            slides.append({'source': source, 'slide': f'ppt/slides/slide{next_slide}.xml', 'media': media,
+                           'new': True, 'rels_changed': True, 'template': template['slide']})
+            next_slide += 1
+
+    # Media of old slides nobody shows any more
+    kept_media = {slide['media'] for slide in slides}
+    dropped = {slide['slide'] for slide in removed}
+    dropped |= {_rels_name(slide['slide']) for slide in removed}
+    dropped |= {old['media'] for old in base.slides if old['media'] not in kept_media}
+
+    # 3. Package-level XML
+    overrides = {
+        _CONTENT_TYPES: _content_types(base, slides, removed, media_types),
+    }
+    presentation, presentation_rels = _slide_list(base, slides, removed)
+    overrides[_PRESENTATION] = presentation
+    overrides[_PRESENTATION_RELS] = presentation_rels
+    for slide in slides:
+        if slide['rels_changed']:
+            source_rels = _rels_name(slide['template'] if slide['new'] else slide['slide'])
+            overrides[_rels_name(slide['slide'])] = _slide_rels(base.read(source_rels), slide['media'])
+
+    # 4. Write: previous entries in order (patched or copied), then the new parts
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as out:
+        for info in base.zip.infolist():
+            name = info.filename
+            if name in dropped:
+                continue
+            if name in overrides:
+                out.writestr(name, overrides.pop(name))
+                continue
+            target = zipfile.ZipInfo(name, date_time=info.date_time)
+            target.compress_type = zipfile.ZIP_STORED if name.startswith('ppt/media/') else zipfile.ZIP_DEFLATED
+            target.external_attr = info.external_attr
+            with base.zip.open(info) as src, out.open(target, 'w', force_zip64=info.file_size > 2 ** 31) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        for slide in slides:
+            if slide['new']:
+                out.writestr(slide['slide'], base.read(slide['template']))
+        for name, data in overrides.items():
+            out.writestr(name, data)
+        for media, (image_path, native) in new_media.items():
+            _write_media(out, media, image_path, native)
+
+    return {
+        'version': MANIFEST_VERSION,
+        'slides': [{'source': slide['source'], 'slide': slide['slide'], 'media': slide['media']}
+                   for slide in slides],
+        'patched': sum(1 for slide in slides if slide['rels_changed']),
+    }
+
+
+def _get_image_format(image_path: str) -> Optional[str]:
+    try:
+        with Image.open(image_path) as img:
+            return img.format
+    except Exception:
+        return None
+
+
+def _write_media(out: zipfile.ZipFile, name: str, image_path: str, native: bool):
+    info = zipfile.ZipInfo(name)
+    info.compress_type = zipfile.ZIP_STORED
+    if native:
+        with open(image_path, 'rb') as src, out.open(info, 'w', force_zip64=os.path.getsize(image_path) > 2 ** 31) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return
+    # WebP and other formats PowerPoint can't show: convert this one image to PNG
+    with Image.open(image_path) as img:
+        buffer = io.BytesIO()
+        img.convert('RGBA' if 'A' in img.getbands() else 'RGB').save(buffer, format='PNG')
+    out.writestr(info, buffer.getvalue())
+
+
+def _content_types(base: _Package, slides: List[Dict], removed: List[Dict],
+                   media_types: Dict[str, str]) -> bytes:
+    root = _parse(base.read(_CONTENT_TYPES))
+    removed_parts = {'/' + slide['slide'] for slide in removed}
+    for override in root.findall(f'{{{_NS_CT}}}Override'):
+        if override.get('PartName') in removed_parts:
+            root.remove(override)
+
+    defaults = {d.get('Extension').lower() for d in root.findall(f'{{{_NS_CT}}}Default')}
+    for extension, content_type in media_types.items():
+        if extension not in defaults:
+            root.insert(0, etree.Element(f'{{{_NS_CT}}}Default', Extension=extension, ContentType=content_type))
+
+    for slide in slides:
+        if slide['new']:
+            etree.SubElement(root, f'{{{_NS_CT}}}Override', PartName='/' + slide['slide'],
+                             ContentType=_SLIDE_CONTENT_TYPE)
+    return _serialize(root)
+
+
+def _slide_list(base: _Package, slides: List[Dict], removed: List[Dict]) -> Tuple[bytes, bytes]:
+    """presentation.xml with the new slide order and its relationships"""
+    rels = _parse(base.read(_PRESENTATION_RELS))
+    rid_of = {}  # slide part -> relationship element
+    for rel in rels.findall(f'{{{_NS_REL}}}Relationship'):
+        if rel.get('Type') == _REL_SLIDE:
+            rid_of['ppt/' + rel.get('Target').lstrip('/').removeprefix('ppt/')] = rel
+
+    removed_parts = {slide['slide'] for slide in removed}
+    for part, rel in list(rid_of.items()):
+        if part in removed_parts:
+            rels.remove(rel)
+            del rid_of[part]
+
+    used_ids = {rel.get('Id') for rel in rels.findall(f'{{{_NS_REL}}}Relationship')}
+    next_rid = 1
+    for slide in slides:
+        if slide['slide'] not in rid_of:
+            while f'rId{next_rid}' in used_ids:
+                next_rid += 1
+            rel = etree.SubElement(rels, f'{{{_NS_REL}}}Relationship', Id=f'rId{next_rid}', Type=_REL_SLIDE,
+                                   Target=slide['slide'].removeprefix('ppt/'))
+            used_ids.add(rel.get('Id'))
+            rid_of[slide['slide']] = rel
+
+    presentation = _parse(base.read(_PRESENTATION))
+    slide_list = presentation.find(f'{{{_NS_P}}}sldIdLst')
+    if slide_list is None:
+        slide_list = etree.Element(f'{{{_NS_P}}}sldIdLst')
+        presentation.find(f'{{{_NS_P}}}sldMasterIdLst').addnext(slide_list)
+    id_of = {}  # relationship id -> existing sldId element
+    for slide_id in slide_list.findall(f'{{{_NS_P}}}sldId'):
+        id_of[slide_id.get(f'{{{_NS_R}}}id')] = slide_id
+        slide_list.remove(slide_id)
+
+    next_id = max([int(e.get('id')) for e in id_of.values()] + [255]) + 1
+    for slide in slides:
+        rid = rid_of[slide['slide']].get('Id')
+        element = id_of.get(rid)
+        if element is None:
+            element = etree.Element(f'{{{_NS_P}}}sldId', id=str(next_id))
+            element.set(f'{{{_NS_R}}}id', rid)
+            next_id += 1
+        slide_list.append(element)
+    return _serialize(presentation), _serialize(rels)
+
+
+def _slide_rels(data: bytes, media: str) -> bytes:
+    """Slide relationships pointing the picture at another media part"""
+    rels = _parse(data)
+    for rel in rels.findall(f'{{{_NS_REL}}}Relationship'):
+        if rel.get('Type') == _REL_IMAGE:
+            rel.set('Target', '../media/' + media.rsplit('/', 1)[1])
+    return _serialize(rels)
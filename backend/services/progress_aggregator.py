@@ -0,0 +1,159 @@
+"""
+Progress Aggregator - coalesce page status and task progress writes of batch tasks
+
+Batch tasks used to commit twice per finished page (page row, then task progress), which
+serialises the workers on the SQLite writer lock. The aggregator buffers page updates and
+progress counters and writes them in a single transaction per flush: every flush_interval
+seconds or every flush_every pages, plus a final flush when the task completes or fails.
+"""
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from models import db, Page, Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 0.25
+DEFAULT_FLUSH_EVERY = 8
+
+
+class ProgressAggregator:
+    """
+    Buffers page/task writes of one task and flushes them together
+
+    update_page() may be called from worker threads; flush() and finish() must run on the
+    task's own thread inside its app context, which owns the database session.
+    """
+
+    def __init__(self, task_id: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 flush_every: int = DEFAULT_FLUSH_EVERY):
+        self.task_id = task_id
+        self.flush_interval = flush_interval
+        self.flush_every = max(1, flush_every)
+        self.lock = threading.Lock()
+
+        self.pending_pages = {}  # page_id -> {field: value}, later updates win
+        self.pending_finished = 0
+        self.pending_checkpoints = {}  # progress key -> page ids finished since the last flush
+        self.counters = {}  # progress key -> latest value (completed, failed, ...)
+        self.last_flush_at = time.monotonic()
+
+        # Instrumentation
+        self.commits = 0
+        self.page_writes = 0
+
+    def update_page(self, page_id: str, **fields):
+        """Queue field updates for a page (status, generated_image_path, description_content)"""
+        with self.lock:
+            self.pending_pages.setdefault(page_id, {}).update(fields)
+
+    def page_finished(self, page_id: str, completed: int, failed: int, error: Optional[str] = None,
+                      checkpoint: str = 'completed_pages', counters: Optional[Dict[str, int]] = None,
+                      **fields):
+        """
+        Queue the final state of a page (for a stage) together with the task counters
+
+        Args:
+            page_id: Page ID
+            completed: Task 'completed' counter after this page
+            failed: Task 'failed' counter after this page
+            error: Error message if the page failed; successful pages are added to the checkpoint
+            checkpoint: Progress key of the resume checkpoint list the page is recorded in
+            counters: Additional progress counters to update
+            **fields: Page columns to write
+        """
+        with self.lock:
+            self.pending_pages.setdefault(page_id, {}).update(fields)
+            if not error:
+                self.pending_checkpoints.setdefault(checkpoint, []).append(page_id)
+            self.counters.update(counters or {})
+            self.counters['completed'] = completed
+            self.counters['failed'] = failed
+            self.pending_finished += 1
+
+    def time_to_flush(self) -> Optional[float]:
+        """Seconds until the pending updates are due, None if nothing is pending"""
+        with self.lock:
+            if not self.pending_pages and not self.counters:
+                return None
+            return max(0.0, self.last_flush_at + self.flush_interval - time.monotonic())
+
+    def maybe_flush(self):
+        """Flush if the interval elapsed or enough pages finished since the last flush"""
+        with self.lock:
+            due = self.pending_finished >= self.flush_every or (
+                (self.pending_pages or self.counters)
+                and time.monotonic() - self.last_flush_at >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self, status: Optional[str] = None, error_message: Optional[str] = None):
+        """
+        Write all pending page updates and the task progress in one transaction
+
+        Args:
+            status: Optional final task status (COMPLETED / FAILED) written in the same transaction
+            error_message: Error message stored with a FAILED status
+        """
+        with self.lock:
+            pending_pages, self.pending_pages = self.pending_pages, {}
+            checkpoints, self.pending_checkpoints = self.pending_checkpoints, {}
+            counters, self.counters = self.counters, {}
+            self.pending_finished = 0
+            self.last_flush_at = time.monotonic()
+
+        if not pending_pages and not counters and status is None:
+            return
+
+        try:
+            if pending_pages:
+                pages = Page.query.filter(Page.id.in_(list(pending_pages.keys()))).all()
+                for page in pages:
+                    for field, value in pending_pages[page.id].items():
+                        if field == 'description_content':
+                            page.set_description_content(value)
+                        else:
+                            setattr(page, field, value)
+
+            task = Task.query.get(self.task_id)
+            if task:
+                progress = task.get_progress()
+                for key, page_ids in checkpoints.items():
+                    checkpoint = progress.setdefault(key, [])
+                    checkpoint.extend(page_id for page_id in page_ids if page_id not in checkpoint)
+                progress.update(counters)
+                progress['db_commits'] = self.commits + 1
+                task.set_progress(progress)
+                if status:
+                    task.status = status
+                    task.completed_at = datetime.utcnow()
+                    if error_message:
+                        task.error_message = error_message
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the updates back so the next flush retries them
+            with self.lock:
+                for page_id, fields in pending_pages.items():
+                    self.pending_pages[page_id] = {**fields, **self.pending_pages.get(page_id, {})}
+                for key, page_ids in checkpoints.items():
+                    self.pending_checkpoints[key] = page_ids + self.pending_checkpoints.get(key, [])
+                self.counters = {**counters, **self.counters}
+            raise
+
+        self.commits += 1
+        self.page_writes += len(pending_pages)
+
+    def finish(self, status: str, error_message: Optional[str] = None):
+        """Final flush that also records the task's terminal status"""
+        self.flush(status=status, error_message=error_message)
+        logger.info(f"Task {self.task_id} {status}: {self.commits} progress commits "
+                    f"for {self.page_writes} page writes")
+
+    def stats(self) -> Dict[str, Any]:
+        return {'commits': self.commits, 'page_writes': self.page_writes}
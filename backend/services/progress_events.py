@@ -0,0 +1,141 @@
+"""
+Progress Events - in-process pub/sub for task progress
+
+task_manager publishes per-page events (started, description ready, image ready,
+failed) and task-level events here; the SSE endpoint streams them to clients, so
+watching a task costs no database reads. Only durable state goes to the database.
+"""
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Task-level events that end a stream
+TERMINAL_EVENTS = ('task_completed', 'task_failed')
+
+
+class Subscription:
+    """A subscriber's view on one task's event stream"""
+
+    def __init__(self, bus: 'ProgressEventBus', task_id: str):
+        self.bus = bus
+        self.task_id = task_id
+        self.queue = queue.Queue()
+
+    def get(self, timeout: float = None) -> Optional[Dict[str, Any]]:
+        """Next event, or None if nothing arrived within timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class ProgressEventBus:
+    """
+    Per-task topics with a bounded replay buffer
+
+    Each event gets a per-task increasing id so reconnecting clients (SSE Last-Event-ID)
+    only receive what they missed. Topics of finished tasks are dropped after retention_seconds.
+    """
+
+    def __init__(self, buffer_size: int = 500, retention_seconds: int = 300):
+        self.buffer_size = buffer_size
+        self.retention_seconds = retention_seconds
+        self.lock = threading.Lock()
+        self.topics = {}  # task_id -> {'events': deque, 'next_id': int, 'subscribers': set, 'finished_at': float}
+
+    def _get_topic(self, task_id: str) -> Dict[str, Any]:
+        topic = self.topics.get(task_id)
+        if topic is None:
+            topic = {
+                'events': deque(maxlen=self.buffer_size),
+                'next_id': 1,
+                'subscribers': set(),
+                'finished_at': None,
+                'updated_at': time.time(),
+            }
+            self.topics[task_id] = topic
+        return topic
+
+    def publish(self, task_id: str, event_type: str, data: Dict[str, Any] = None):
+        """
+        Publish an event for a task
+
+        Args:
+            task_id: Task ID
+            event_type: e.g. page_started, description_ready, image_ready, page_failed,
+                progress, task_completed, task_failed
+            data: JSON-serializable payload
+        """
+        if not task_id:
+            return
+
+        with self.lock:
+            topic = self._get_topic(task_id)
+            event = {
+                'id': topic['next_id'],
+                'event': event_type,
+                'task_id': task_id,
+                'data': data or {},
+                'timestamp': time.time(),
+            }
+            topic['next_id'] += 1
+            topic['updated_at'] = event['timestamp']
+            topic['events'].append(event)
+            if event_type in TERMINAL_EVENTS:
+                topic['finished_at'] = time.time()
+            subscribers = list(topic['subscribers'])
+            self._prune_locked()
+
+        for subscription in subscribers:
+            subscription.queue.put(event)
+
+    def subscribe(self, task_id: str, last_event_id: int = 0) -> Tuple[Subscription, List[Dict[str, Any]]]:
+        """
+        Subscribe to a task
+
+        Returns:
+            (subscription, backlog) where backlog holds buffered events newer than last_event_id
+        """
+        subscription = Subscription(self, task_id)
+        with self.lock:
+            self._prune_locked()
+            topic = self._get_topic(task_id)
+            topic['subscribers'].add(subscription)
+            backlog = [event for event in topic['events'] if event['id'] > last_event_id]
+        return subscription, backlog
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            topic = self.topics.get(subscription.task_id)
+            if topic:
+                topic['subscribers'].discard(subscription)
+
+    def is_finished(self, task_id: str) -> bool:
+        with self.lock:
+            topic = self.topics.get(task_id)
+            return bool(topic and topic['finished_at'])
+
+    def _prune_locked(self):
+        """Drop topics nobody listens to: finished ones after retention, idle ones after an hour"""
+        now = time.time()
+        expired = [
+            task_id for task_id, topic in self.topics.items()
+            if not topic['subscribers'] and (
+                (topic['finished_at'] and now - topic['finished_at'] > self.retention_seconds)
+                or now - topic['updated_at'] > 3600
+            )
+        ]
+        for task_id in expired:
+            del self.topics[task_id]
+
+
+# Global event bus instance
+progress_events = ProgressEventBus()
@@ -40,6 +40,19 @@ def _format_reference_files_xml(reference_files_content: Optional[List[Dict[str,
     return '\n'.join(xml_parts)
 
 
+def get_reference_files_prefix(project_context: 'ProjectContext') -> str:
+    """
+    参考文件前缀（所有带参考文件的 prompt 的公共开头），用于上下文缓存
+    
+    Args:
+        project_context: 项目上下文对象
+        
+    Returns:
+        参考文件 XML，没有参考文件时为空字符串
+    """
+    return _format_reference_files_xml(project_context.reference_files_content)
+
+
 def get_outline_generation_prompt(project_context: 'ProjectContext') -> str:
     """
     生成 PPT 大纲的 prompt
@@ -156,7 +169,7 @@ def get_outline_parsing_prompt(project_context: 'ProjectContext') -> str:
 
 def get_page_description_prompt(project_context: 'ProjectContext', outline: list, 
                                 page_outline: dict, page_index: int, 
-                                part_info: str = "") -> str:
+                                part_info: str = "", include_files: bool = True) -> str:
     """
     生成单个页面描述的 prompt
     
@@ -166,11 +179,12 @@ def get_page_description_prompt(project_context: 'ProjectContext', outline: list
         page_outline: 当前页面的大纲
         page_index: 页面编号（从1开始）
         part_info: 可选的章节信息
+        include_files: 是否在开头拼接参考文件（使用上下文缓存时为 False）
         
     Returns:
         格式化后的 prompt 字符串
     """
-    files_xml = _format_reference_files_xml(project_context.reference_files_content)
+    files_xml = _format_reference_files_xml(project_context.reference_files_content) if include_files else ""
     # 根据项目类型选择最相关的原始输入
     if project_context.creation_type == 'idea' and project_context.idea_prompt:
         original_input = project_context.idea_prompt
@@ -208,6 +222,68 @@ def get_page_description_prompt(project_context: 'ProjectContext', outline: list
     return final_prompt
 
 
+def get_batch_page_descriptions_prompt(project_context: 'ProjectContext', outline: list,
+                                       pages: List[Dict], include_files: bool = True) -> str:
+    """
+    一次生成多个页面描述的 prompt（批量模式，参考文件和大纲只发送一次）
+    
+    Args:
+        project_context: 项目上下文对象，包含所有原始信息
+        outline: 完整大纲
+        pages: 本批次的页面列表，每项包含 page_index（从1开始）和 page_outline
+        include_files: 是否在开头拼接参考文件（使用上下文缓存时为 False）
+        
+    Returns:
+        格式化后的 prompt 字符串，要求模型返回 JSON 数组
+    """
+    files_xml = _format_reference_files_xml(project_context.reference_files_content) if include_files else ""
+    # 根据项目类型选择最相关的原始输入
+    if project_context.creation_type == 'idea' and project_context.idea_prompt:
+        original_input = project_context.idea_prompt
+    elif project_context.creation_type == 'outline' and project_context.outline_text:
+        original_input = f"用户提供的大纲：\n{project_context.outline_text}"
+    elif project_context.creation_type == 'descriptions' and project_context.description_text:
+        original_input = f"用户提供的描述：\n{project_context.description_text}"
+    else:
+        original_input = project_context.idea_prompt or ""
+    
+    pages_text = "\n".join(
+        f"- page {page['page_index']}"
+        + (f" (belongs to: {page['page_outline']['part']})" if 'part' in page['page_outline'] else "")
+        + f": {page['page_outline']}"
+        for page in pages
+    )
+    
+    prompt = dedent(f"""\
+    we are generating the text description for each ppt page.
+    the original user request is: \n{original_input}\n
+    We already have the entire outline: \n{outline}\n
+    Now please generate the descriptions for the following {len(pages)} pages:
+    {pages_text}
+    Each description includes page title, text to render(keep it concise), don't include any other text.
+    For example:
+    页面标题：原始社会：与自然共生
+    
+    页面文字：
+    - 狩猎采集文明： 人类活动规模小，对环境影响有限。
+    - 依赖性强： 生活完全依赖于自然资源的直接供给，对自然规律敬畏。
+    - 适应而非改造： 通过观察和模仿学习自然，发展出适应当地环境的生存技能。
+    - 影响特点： 局部、短期、低强度，生态系统有充足的自我恢复能力。
+    其他页面素材（如果有请加上，包括markdown图片链接等）
+    
+    提示：如果参考文件中包含以 /files/ 开头的本地文件URL图片（例如 /files/mineru/xxx/image.png），请将这些图片以markdown格式输出，例如：![图片描述](/files/mineru/xxx/image.png)，而不是作为普通文本。这些图片应该被包含在页面描述中，以便后续生成PPT时使用。
+    
+    使用全中文输出。
+    
+    Return a JSON array with exactly one object per requested page, in the same order:
+    [{{"page_index": <page number>, "description": "<description text>"}}]
+    """)
+    
+    final_prompt = files_xml + prompt
+    logger.debug(f"[get_batch_page_descriptions_prompt] Final prompt:\n{final_prompt}")
+    return final_prompt
+
+
 def get_image_generation_prompt(page_desc: str, outline_text: str, 
                                 current_section: str,
                                 has_material_images: bool = False,
@@ -411,7 +487,8 @@ def get_description_split_prompt(project_context: 'ProjectContext', outline: Lis
 
 def get_outline_refinement_prompt(current_outline: List[Dict], user_requirement: str,
                                    project_context: 'ProjectContext',
-                                   previous_requirements: Optional[List[str]] = None) -> str:
+                                   previous_requirements: Optional[List[str]] = None,
+                                   include_files: bool = True) -> str:
     """
     根据用户要求修改已有大纲的 prompt
     
@@ -420,11 +497,12 @@ def get_outline_refinement_prompt(current_outline: List[Dict], user_requirement:
         user_requirement: 用户的新要求
         project_context: 项目上下文对象，包含所有原始信息
         previous_requirements: 之前的修改要求列表（可选）
+        include_files: 是否在开头拼接参考文件（使用上下文缓存时为 False）
         
     Returns:
         格式化后的 prompt 字符串
     """
-    files_xml = _format_reference_files_xml(project_context.reference_files_content)
+    files_xml = _format_reference_files_xml(project_context.reference_files_content) if include_files else ""
     
     # 处理空大纲的情况
     if not current_outline or len(current_outline) == 0:
@@ -504,7 +582,8 @@ def get_outline_refinement_prompt(current_outline: List[Dict], user_requirement:
 def get_descriptions_refinement_prompt(current_descriptions: List[Dict], user_requirement: str,
                                        project_context: 'ProjectContext',
                                        outline: List[Dict] = None,
-                                       previous_requirements: Optional[List[str]] = None) -> str:
+                                       previous_requirements: Optional[List[str]] = None,
+                                       include_files: bool = True) -> str:
     """
     根据用户要求修改已有页面描述的 prompt
     
@@ -514,11 +593,12 @@ def get_descriptions_refinement_prompt(current_descriptions: List[Dict], user_re
         project_context: 项目上下文对象，包含所有原始信息
         outline: 完整的大纲结构（可选）
         previous_requirements: 之前的修改要求列表（可选）
+        include_files: 是否在开头拼接参考文件（使用上下文缓存时为 False）
         
     Returns:
         格式化后的 prompt 字符串
     """
-    files_xml = _format_reference_files_xml(project_context.reference_files_content)
+    files_xml = _format_reference_files_xml(project_context.reference_files_content) if include_files else ""
     
     # 构建之前的修改历史记录
     previous_req_text = ""
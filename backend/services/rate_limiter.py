@@ -0,0 +1,412 @@
+"""
+Rate Limiter - client-side Gemini quota control shared by all AI calls
+
+One ModelRateLimiter per model (quotas are per model) combining:
+- requests-per-minute and tokens-per-minute token buckets
+- AIMD concurrency: +1/limit per success, halved on 429/503
+- a shared pause when the server tells us to retry after N seconds
+- jittered exponential retry for throttling, 5xx and network errors
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+from google.genai import errors
+
+from .metrics import ai_metrics
+
+logger = logging.getLogger(__name__)
+
+# Default per-model limits, override with the AI_RATE_LIMITS config (JSON)
+DEFAULT_MODEL_LIMITS = {
+    'gemini-2.5-flash': {'rpm': 1000, 'tpm': 1000000, 'concurrency': 32},
+    'gemini-3-pro-image-preview': {'rpm': 60, 'tpm': 500000, 'concurrency': 16},
+}
+FALLBACK_LIMITS = {'rpm': 60, 'tpm': 250000, 'concurrency': 8}
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}
+
+# Rough token costs used before the response tells us the real usage
+TOKENS_PER_IMAGE = 258
+CHARS_PER_TOKEN = 4
+DEFAULT_OUTPUT_TOKENS = 1000
+
+
+class TokenBucket:
+    """Classic token bucket, refilled continuously"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take `amount` tokens (may go negative) and return how long the caller has to wait
+        before the reservation is covered. Requests larger than the bucket are capped to it.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.refill_per_second
+
+    def adjust(self, delta: float):
+        """Give back (positive) or take more (negative) tokens after the real cost is known"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class ModelRateLimiter:
+    """RPM/TPM buckets plus AIMD concurrency limit for a single model"""
+
+    def __init__(self, model: str, rpm: int, tpm: int, concurrency: int, min_concurrency: int = 1):
+        self.model = model
+        self.max_concurrency = max(1, concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+
+        self.request_bucket = TokenBucket(rpm, rpm / 60.0)
+        self.token_bucket = TokenBucket(tpm, tpm / 60.0)
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+
+        # Counters for observability
+        self.stats = {'requests': 0, 'throttled': 0, 'retries': 0, 'errors': 0}
+
+    def acquire(self, estimated_tokens: int):
+        """Block until a concurrency slot and bucket budget are available"""
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.condition.wait(self.paused_until - now)
+                    continue
+                if self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                    continue
+                break
+            self.in_flight += 1
+            wait_time = max(
+                self.request_bucket.reserve(1),
+                self.token_bucket.reserve(estimated_tokens)
+            )
+            self.stats['requests'] += 1
+
+        if wait_time > 0:
+            logger.debug(f"Rate limiter [{self.model}] waiting {wait_time:.2f}s for quota")
+            time.sleep(wait_time)
+
+    async def acquire_async(self, estimated_tokens: int):
+        """acquire() for coroutines: waits with asyncio.sleep instead of blocking the loop"""
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                elif self.in_flight >= int(self.limit):
+                    # Slots are released from threads and coroutines alike, so poll briefly
+                    delay = 0.05
+                else:
+                    self.in_flight += 1
+                    wait_time = max(
+                        self.request_bucket.reserve(1),
+                        self.token_bucket.reserve(estimated_tokens)
+                    )
+                    self.stats['requests'] += 1
+                    break
+            await asyncio.sleep(delay)
+
+        if wait_time > 0:
+            logger.debug(f"Rate limiter [{self.model}] waiting {wait_time:.2f}s for quota")
+            try:
+                await asyncio.sleep(wait_time)
+            except BaseException:
+                # Cancelled while waiting for quota: the slot was already taken
+                self.release(estimated_tokens, cancelled=True)
+                raise
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int] = None,
+                throttled: bool = False, retry_after: Optional[float] = None,
+                cancelled: bool = False):
+        """Return the slot and feed the outcome back into the AIMD controller"""
+        with self.condition:
+            self.in_flight -= 1
+            if actual_tokens is not None:
+                self.token_bucket.adjust(estimated_tokens - actual_tokens)
+
+            if cancelled:
+                # Abandoned before an answer, says nothing about the server's capacity
+                pass
+            elif throttled:
+                self.stats['throttled'] += 1
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+                logger.warning(
+                    f"Rate limiter [{self.model}] throttled, concurrency limit -> {int(self.limit)}"
+                    + (f", pausing {retry_after:.1f}s" if retry_after else "")
+                )
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+            self.condition.notify_all()
+
+    def has_headroom(self, fraction: float = 0.5) -> bool:
+        """
+        True when the model is well below its limits: not paused, fewer than `fraction` of the
+        concurrency limit in flight and at least `fraction` of the request bucket left.
+        Optional work (speculative variants) checks this so it only spends idle quota.
+        """
+        with self.condition:
+            now = time.monotonic()
+            if now < self.paused_until or self.in_flight >= int(self.limit) * fraction:
+                return False
+            self.request_bucket._refill(now)
+            return self.request_bucket.tokens >= self.request_bucket.capacity * fraction
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limiter state"""
+        with self.condition:
+            return {
+                'model': self.model,
+                'concurrency_limit': int(self.limit),
+                'in_flight': self.in_flight,
+                **self.stats,
+            }
+
+
+class RateLimiterRegistry:
+    """Process-wide registry of per-model limiters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limits = {model: dict(limits) for model, limits in DEFAULT_MODEL_LIMITS.items()}
+        self.limiters = {}  # model -> ModelRateLimiter
+        self.max_retries = 5
+        self.base_delay = 1.0
+        self.max_delay = 60.0
+
+    def configure(self, limits: Optional[Dict[str, Dict[str, int]]] = None,
+                  max_retries: int = None, base_delay: float = None, max_delay: float = None):
+        """Override per-model limits and retry policy (existing limiters are rebuilt)"""
+        with self.lock:
+            for model, model_limits in (limits or {}).items():
+                self.limits.setdefault(model, dict(FALLBACK_LIMITS)).update(model_limits)
+            if max_retries is not None:
+                self.max_retries = max_retries
+            if base_delay is not None:
+                self.base_delay = base_delay
+            if max_delay is not None:
+                self.max_delay = max_delay
+            self.limiters = {}
+
+    def get(self, model: str) -> ModelRateLimiter:
+        """Get (or lazily create) the limiter for a model"""
+        with self.lock:
+            limiter = self.limiters.get(model)
+            if limiter is None:
+                limits = self.limits.get(model, FALLBACK_LIMITS)
+                limiter = ModelRateLimiter(
+                    model, rpm=limits['rpm'], tpm=limits['tpm'], concurrency=limits['concurrency']
+                )
+                self.limiters[model] = limiter
+            return limiter
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            limiters = list(self.limiters.values())
+        return {limiter.model: limiter.snapshot() for limiter in limiters}
+
+
+rate_limiters = RateLimiterRegistry()
+
+
+def estimate_tokens(contents: Any, output_tokens: int = DEFAULT_OUTPUT_TOKENS) -> int:
+    """Rough token estimate for a generate_content request"""
+    items = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = output_tokens
+    for item in items:
+        if isinstance(item, str):
+            total += len(item) // CHARS_PER_TOKEN + 1
+        else:
+            # Images and file parts
+            total += TOKENS_PER_IMAGE
+    return total
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """HTTP status code of an API error, if any"""
+    if isinstance(error, errors.APIError):
+        return error.code
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    return None
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Server-suggested delay in seconds, from the Retry-After header or the
+    google.rpc.RetryInfo detail ("retryDelay": "17s") of a Gemini error
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('retry-after')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+
+    details = getattr(error, 'details', None)
+    if isinstance(details, dict):
+        error_body = details.get('error', details)
+        for detail in error_body.get('details', []) or []:
+            if isinstance(detail, dict) and 'retryDelay' in detail:
+                match = re.match(r'^\s*([\d.]+)s\s*$', str(detail['retryDelay']))
+                if match:
+                    return float(match.group(1))
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Throttling, server errors and transient network errors are worth retrying"""
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+def get_response_tokens(response: Any) -> Optional[int]:
+    """Actual token usage reported by a generate_content response"""
+    usage = getattr(response, 'usage_metadata', None)
+    total = getattr(usage, 'total_token_count', None) if usage else None
+    return total if isinstance(total, int) else None
+
+
+def call_with_rate_limit(model: str, fn: Callable[[], Any], estimated_tokens: int,
+                         request_bytes: int = 0, source: str = 'ai_service',
+                         operation: str = 'generate_content') -> Any:
+    """
+    Run a Gemini call under the model's limiter, retrying throttled/transient failures
+    with full-jitter exponential backoff (or the server's retry-after when given)
+
+    Args:
+        model: Model name, selects the limiter
+        fn: Zero-argument callable that performs the request
+        estimated_tokens: Token budget reserved before the request is sent
+        request_bytes, source, operation: Recorded with the call's metrics
+    """
+    limiter = rate_limiters.get(model)
+    attempt = 0
+    started = time.monotonic()
+
+    while True:
+        limiter.acquire(estimated_tokens)
+        try:
+            response = fn()
+        except Exception as e:
+            status_code = get_status_code(e)
+            throttled = status_code in THROTTLE_STATUS_CODES
+            retry_after = get_retry_after(e) if throttled else None
+            limiter.release(estimated_tokens, throttled=throttled, retry_after=retry_after)
+
+            if not is_retryable(e) or attempt >= rate_limiters.max_retries:
+                with limiter.condition:
+                    limiter.stats['errors'] += 1
+                ai_metrics.record(model, time.monotonic() - started, request_bytes=request_bytes,
+                                  retries=attempt, outcome='throttled' if throttled else 'error',
+                                  source=source, operation=operation)
+                raise
+
+            backoff = min(rate_limiters.max_delay, rate_limiters.base_delay * (2 ** attempt))
+            delay = retry_after if retry_after is not None else random.uniform(0, backoff)
+            attempt += 1
+            with limiter.condition:
+                limiter.stats['retries'] += 1
+            logger.warning(
+                f"Gemini call to {model} failed ({status_code or type(e).__name__}), "
+                f"retry {attempt}/{rate_limiters.max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+            continue
+
+        limiter.release(estimated_tokens, actual_tokens=get_response_tokens(response))
+        ai_metrics.record(model, time.monotonic() - started, response=response,
+                          request_bytes=request_bytes, retries=attempt,
+                          source=source, operation=operation)
+        return response
+
+
+async def acall_with_rate_limit(model: str, fn: Callable[[], Awaitable[Any]], estimated_tokens: int,
+                                request_bytes: int = 0, source: str = 'ai_service',
+                                operation: str = 'generate_content') -> Any:
+    """
+    Async version of call_with_rate_limit for the async genai client
+
+    Args:
+        model: Model name, selects the limiter
+        fn: Zero-argument callable returning the request coroutine (called again on retry)
+        estimated_tokens: Token budget reserved before the request is sent
+        request_bytes, source, operation: Recorded with the call's metrics
+    """
+    limiter = rate_limiters.get(model)
+    attempt = 0
+    started = time.monotonic()
+
+    while True:
+        await limiter.acquire_async(estimated_tokens)
+        try:
+            response = await fn()
+        except asyncio.CancelledError:
+            # Cancelled by the caller (a hedge loser, a failed batch): give the slot back
+            limiter.release(estimated_tokens, cancelled=True)
+            raise
+        except Exception as e:
+            status_code = get_status_code(e)
+            throttled = status_code in THROTTLE_STATUS_CODES
+            retry_after = get_retry_after(e) if throttled else None
+            limiter.release(estimated_tokens, throttled=throttled, retry_after=retry_after)
+
+            if not is_retryable(e) or attempt >= rate_limiters.max_retries:
+                with limiter.condition:
+                    limiter.stats['errors'] += 1
+                ai_metrics.record(model, time.monotonic() - started, request_bytes=request_bytes,
+                                  retries=attempt, outcome='throttled' if throttled else 'error',
+                                  source=source, operation=operation)
+                raise
+
+            backoff = min(rate_limiters.max_delay, rate_limiters.base_delay * (2 ** attempt))
+            delay = retry_after if retry_after is not None else random.uniform(0, backoff)
+            attempt += 1
+            with limiter.condition:
+                limiter.stats['retries'] += 1
+            logger.warning(
+                f"Gemini call to {model} failed ({status_code or type(e).__name__}), "
+                f"retry {attempt}/{rate_limiters.max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+            continue
+
+        limiter.release(estimated_tokens, actual_tokens=get_response_tokens(response))
+        ai_metrics.record(model, time.monotonic() - started, response=response,
+                          request_bytes=request_bytes, retries=attempt,
+                          source=source, operation=operation)
+        return response
@@ -0,0 +1,201 @@
+"""
+Response Cache - content-addressed, disk-backed cache for Gemini text generation
+
+Entries are keyed by sha256(model, prompt, generation config) and stored in a small
+SQLite file next to the main database. Expired entries are dropped on read, and the
+least recently used entries are evicted once the cache grows past its byte budget.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResponseCache:
+    """SQLite-backed text response cache with TTL, LRU size eviction and hit/miss counters"""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = DEFAULT_MAX_BYTES, enabled: bool = True):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._initialized = False
+
+    def configure(self, path: Optional[str] = None, ttl_seconds: int = None,
+                  max_bytes: int = None, enabled: bool = None):
+        """Apply app config (called once on startup)"""
+        with self.lock:
+            if path is not None:
+                self.path = path
+                self._initialized = False
+            if ttl_seconds is not None:
+                self.ttl_seconds = ttl_seconds
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if enabled is not None:
+                self.enabled = enabled
+
+    @staticmethod
+    def make_key(model: str, contents: Any, config: Any = None) -> str:
+        """Content address of a request: hash of model, prompt and generation config"""
+        if config is not None and hasattr(config, 'model_dump'):
+            config = config.model_dump(mode='json', exclude_none=True)
+        payload = json.dumps(
+            {'model': model, 'contents': contents, 'config': config},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access_at REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_access ON responses(last_access_at)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response text, or None on a miss / expired entry"""
+        if not self.enabled or not self.path:
+            return None
+
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self._connect()
+                try:
+                    row = conn.execute(
+                        "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and row[1] > now:
+                        conn.execute(
+                            "UPDATE responses SET last_access_at = ?, hit_count = hit_count + 1 WHERE key = ?",
+                            (now, key)
+                        )
+                        conn.commit()
+                        self.hits += 1
+                        return row[0]
+
+                    if row:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        conn.commit()
+                    self.misses += 1
+                    return None
+                finally:
+                    conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+
+    def set(self, key: str, model: str, value: str):
+        """Store a response and evict least recently used entries over the byte budget"""
+        if not self.enabled or not self.path or value is None:
+            return
+
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        try:
+            with self.lock:
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses "
+                        "(key, model, value, size, created_at, expires_at, last_access_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (key, model, value, size, now, now + self.ttl_seconds, now)
+                    )
+                    self._evict(conn, now)
+                    conn.commit()
+                finally:
+                    conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then LRU entries until the cache fits max_bytes"""
+        cursor = conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        self.evictions += cursor.rowcount
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evict_keys = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access_at ASC"):
+            if total <= self.max_bytes:
+                break
+            evict_keys.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", evict_keys)
+        self.evictions += len(evict_keys)
+
+    def clear(self):
+        """Remove all entries"""
+        if not self.path:
+            return
+        with self.lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        entries, size = 0, 0
+        if self.enabled and self.path:
+            try:
+                with self.lock:
+                    conn = self._connect()
+                    try:
+                        entries, size = conn.execute(
+                            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                        ).fetchone()
+                    finally:
+                        conn.close()
+            except sqlite3.Error:
+                pass
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+        }
+
+
+# Global cache instance, path/TTL/size are configured from app config on startup
+response_cache = ResponseCache()
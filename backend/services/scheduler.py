@@ -0,0 +1,182 @@
+"""
+Job Scheduler - one shared, fair scheduler for all Gemini image/caption jobs
+
+Every page image, edit, material and caption call goes through the same scheduler so the
+total number of concurrent Gemini calls is capped globally, no matter how many decks run at
+once. Within a priority class jobs are ordered by weighted fair queuing per owner (user),
+so one user with a 40-page deck cannot starve another user's 5-page deck.
+
+Coroutine functions are run on the shared async runtime instead of a thread of their own, so
+in-flight async jobs only hold a scheduler slot, not an OS thread.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priority classes (lower value is served first)
+PRIORITY_INTERACTIVE = 0  # single page regenerate / edit / material, a user is waiting on it
+PRIORITY_BULK = 1         # whole-deck image runs
+PRIORITY_BACKGROUND = 2   # reference file captioning
+PRIORITY_SPECULATIVE = 3  # pre-generated edit variants, only run on idle capacity
+
+ANONYMOUS_OWNER = 'anonymous'
+
+
+class _Job:
+    """A queued unit of work"""
+
+    __slots__ = ('fn', 'args', 'kwargs', 'owner', 'priority', 'future', 'context')
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict, owner: str, priority: int):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.owner = owner
+        self.priority = priority
+        self.future = Future()
+        # Context variables of the submitter (e.g. the task id used for metrics)
+        self.context = contextvars.copy_context()
+
+
+class FairScheduler:
+    """
+    Global concurrency cap + per-owner weighted fair queuing + strict priority classes
+
+    Each owner has a virtual finish time. A new job gets the start tag
+    max(virtual_time, owner_finish) and advances the owner's finish time by 1 / weight,
+    so owners with queued work are served round-robin in proportion to their weight.
+    Interactive jobs are always dispatched before bulk jobs, bulk before background.
+    Speculative jobs only start while at most half of the capacity is in use, so they never
+    hold the slots a user-facing job would need.
+    """
+
+    def __init__(self, max_concurrency: int = 8):
+        """Initialize scheduler"""
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+
+        self._queue = []  # heap of (priority, start_tag, seq, job)
+        self._seq = itertools.count()
+        self._running = 0
+        self._virtual_time = 0.0
+        self._finish_tags = {}  # owner -> virtual finish time of its last queued job
+        self._weights = {}  # owner -> weight (default 1.0)
+        self._dispatched = 0
+
+    def configure(self, max_concurrency: int = None):
+        """Update the global concurrency cap (takes effect for the next dispatch)"""
+        with self.lock:
+            if max_concurrency is not None and max_concurrency > 0:
+                self.max_concurrency = max_concurrency
+            self._dispatch_locked()
+
+    def set_weight(self, owner: str, weight: float):
+        """Give an owner a larger (or smaller) share of the capacity"""
+        with self.lock:
+            self._weights[owner or ANONYMOUS_OWNER] = max(float(weight), 0.01)
+
+    def submit(self, fn: Callable, *args, owner: Optional[str] = None,
+               priority: int = PRIORITY_BULK, **kwargs) -> Future:
+        """
+        Queue a job and return a Future for its result
+
+        Args:
+            fn: Callable to run
+            owner: Fairness key, usually the user id
+            priority: One of the PRIORITY_* classes
+        """
+        owner = owner or ANONYMOUS_OWNER
+        job = _Job(fn, args, kwargs, owner, priority)
+
+        with self.lock:
+            weight = self._weights.get(owner, 1.0)
+            start_tag = max(self._virtual_time, self._finish_tags.get(owner, 0.0))
+            self._finish_tags[owner] = start_tag + 1.0 / weight
+            heapq.heappush(self._queue, (priority, start_tag, next(self._seq), job))
+            self._dispatch_locked()
+
+        return job.future
+
+    def run(self, fn: Callable, *args, owner: Optional[str] = None,
+            priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Any:
+        """Queue a job and block until its result is available"""
+        return self.submit(fn, *args, owner=owner, priority=priority, **kwargs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of scheduler state"""
+        with self.lock:
+            queued = {}
+            for priority, _, _, _ in self._queue:
+                queued[priority] = queued.get(priority, 0) + 1
+            return {
+                'max_concurrency': self.max_concurrency,
+                'running': self._running,
+                'queued': len(self._queue),
+                'queued_by_priority': queued,
+                'dispatched': self._dispatched,
+            }
+
+    def _dispatch_locked(self):
+        """Start queued jobs while there is free capacity (caller holds the lock)"""
+        while self._queue and self._running < self.max_concurrency:
+            if (self._queue[0][0] >= PRIORITY_SPECULATIVE
+                    and self._running >= max(1, self.max_concurrency // 2)):
+                break
+            _, start_tag, _, job = heapq.heappop(self._queue)
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            self._virtual_time = max(self._virtual_time, start_tag)
+            self._running += 1
+            self._dispatched += 1
+
+            if asyncio.iscoroutinefunction(job.fn):
+                from .async_runtime import async_runtime
+                async_runtime.submit(self._run_async_job(job))
+            else:
+                thread = threading.Thread(target=self._run_job, args=(job,), daemon=True)
+                thread.start()
+
+        # Owners whose finish time is behind the virtual clock have no backlog left
+        if len(self._finish_tags) > 1024:
+            self._finish_tags = {
+                owner: tag for owner, tag in self._finish_tags.items()
+                if tag > self._virtual_time
+            }
+
+    def _run_job(self, job: _Job):
+        """Run a job in its own thread and release its slot when done"""
+        try:
+            result = job.context.run(job.fn, *job.args, **job.kwargs)
+            job.future.set_result(result)
+        except BaseException as e:
+            job.future.set_exception(e)
+        finally:
+            with self.lock:
+                self._running -= 1
+                self._dispatch_locked()
+
+    async def _run_async_job(self, job: _Job):
+        """Await a coroutine job on the async runtime loop and release its slot when done"""
+        from .metrics import restore_context
+        try:
+            restore_context(job.context)
+            result = await job.fn(*job.args, **job.kwargs)
+            job.future.set_result(result)
+        except BaseException as e:
+            job.future.set_exception(e)
+        finally:
+            with self.lock:
+                self._running -= 1
+                self._dispatch_locked()
+
+
+# Global scheduler instance, capacity is configured from app config on startup
+job_scheduler = FairScheduler(max_concurrency=8)
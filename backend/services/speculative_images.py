@@ -0,0 +1,263 @@
+"""
+Speculative Images - pre-generate likely edits of finished pages on idle quota
+
+After a deck's images are done, users tend to send the same few edit instructions. When
+enabled, every finished page gets one variant per configured instruction, generated as
+PRIORITY_SPECULATIVE scheduler jobs (they only start on idle capacity and are dropped when
+the image model's rate limiter has no headroom). Variants are PageImageVersion rows with
+is_speculative set, hidden from the version history until used.
+
+An edit whose instruction, source image, page description and size match a variant is
+served by promoting that row to the current version, without calling the model. Variants
+derived from an image that has since changed, older than max_age_seconds, or beyond the
+disk budget (oldest first) are deleted.
+"""
+import hashlib
+import json
+import os
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from models import db, Page, PageImageVersion
+from .scheduler import job_scheduler, PRIORITY_SPECULATIVE
+from .rate_limiter import rate_limiters
+from .metrics import task_scope
+
+logger = logging.getLogger(__name__)
+
+# 常用的编辑指令（可通过 SPECULATIVE_VARIANT_INSTRUCTIONS 配置覆盖）
+DEFAULT_INSTRUCTIONS = [
+    '让配色更加简洁明亮',
+    '减少文字，增加留白',
+    '放大标题，突出重点',
+]
+
+
+def normalize_instruction(instruction: str) -> str:
+    """Instructions match case- and whitespace-insensitively"""
+    return ' '.join((instruction or '').split()).lower()
+
+
+def get_variant_key(instruction: str, source_image_path: str, original_description: Optional[str],
+                    aspect_ratio: str, resolution: str) -> str:
+    """Everything that determines the edited image (besides the model's randomness)"""
+    payload = json.dumps([
+        normalize_instruction(instruction), source_image_path, original_description or '',
+        aspect_ratio, resolution
+    ], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SpeculativeVariants:
+    """Schedules, looks up, promotes and evicts speculative edit variants"""
+
+    def __init__(self, enabled: bool = False, instructions: Optional[List[str]] = None,
+                 max_age_seconds: int = 24 * 3600, disk_budget_bytes: int = 512 * 1024 * 1024,
+                 idle_fraction: float = 0.5):
+        self.enabled = enabled
+        self.instructions = list(instructions or DEFAULT_INSTRUCTIONS)
+        self.max_age_seconds = max_age_seconds
+        self.disk_budget_bytes = disk_budget_bytes
+        self.idle_fraction = idle_fraction
+        self.lock = threading.Lock()
+        self.evict_lock = threading.Lock()
+        self.stats = {'scheduled': 0, 'generated': 0, 'skipped_busy': 0, 'discarded': 0,
+                      'failed': 0, 'hits': 0, 'evicted': 0}
+
+    def configure(self, enabled: bool = None, instructions: Optional[List[str]] = None,
+                  max_age_seconds: int = None, disk_budget_bytes: int = None,
+                  idle_fraction: float = None):
+        """Apply app config (called once on startup)"""
+        if enabled is not None:
+            self.enabled = enabled
+        if instructions is not None:
+            self.instructions = [i for i in instructions if normalize_instruction(i)]
+        if max_age_seconds is not None and max_age_seconds > 0:
+            self.max_age_seconds = max_age_seconds
+        if disk_budget_bytes is not None and disk_budget_bytes >= 0:
+            self.disk_budget_bytes = disk_budget_bytes
+        if idle_fraction is not None and 0 < idle_fraction <= 1:
+            self.idle_fraction = idle_fraction
+
+    def _count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+    def schedule_project(self, project_id: str, ai_service, file_service, aspect_ratio: str,
+                         resolution: str, app, owner: Optional[str] = None) -> int:
+        """
+        Queue variant jobs for every finished page of a project (call from an app context)
+
+        Returns:
+            Number of queued jobs
+        """
+        if not self.enabled or not self.instructions:
+            return 0
+
+        try:
+            self.evict(file_service)
+            page_ids = [page_id for (page_id,) in db.session.query(Page.id).filter(
+                Page.project_id == project_id,
+                Page.status == 'COMPLETED',
+                Page.generated_image_path.isnot(None)
+            ).order_by(Page.order_index).all()]
+        except Exception as e:
+            logger.warning(f"Could not schedule speculative variants for {project_id}: {str(e)}")
+            return 0
+
+        # Breadth first: the first instruction for every page before the second one
+        queued = 0
+        for instruction in self.instructions:
+            for page_id in page_ids:
+                job_scheduler.submit(
+                    self._generate_variant, project_id, page_id, instruction,
+                    ai_service, file_service, aspect_ratio, resolution, app,
+                    owner=owner, priority=PRIORITY_SPECULATIVE
+                )
+                queued += 1
+
+        with self.lock:
+            self.stats['scheduled'] += queued
+        logger.info(f"Queued {queued} speculative variants for project {project_id}")
+        return queued
+
+    def _generate_variant(self, project_id: str, page_id: str, instruction: str,
+                          ai_service, file_service, aspect_ratio: str, resolution: str, app):
+        """Scheduler job: generate and store one variant unless it exists or quota is busy"""
+        from .task_manager import _get_description_text
+
+        # Not part of the task that scheduled it
+        with app.app_context(), task_scope(None):
+            try:
+                page = Page.query.get(page_id)
+                if not page or page.status != 'COMPLETED' or not page.generated_image_path:
+                    return
+                source_image_path = page.generated_image_path
+                desc_content = page.get_description_content()
+                original_description = _get_description_text(desc_content) if desc_content else None
+                key = get_variant_key(instruction, source_image_path, original_description,
+                                      aspect_ratio, resolution)
+                if PageImageVersion.query.filter_by(page_id=page_id, is_speculative=True,
+                                                    speculative_key=key).first():
+                    return
+                db.session.remove()
+
+                if not rate_limiters.get(ai_service.image_model).has_headroom(self.idle_fraction):
+                    self._count('skipped_busy')
+                    return
+
+                image = ai_service.edit_image(
+                    instruction, file_service.get_absolute_path(source_image_path),
+                    aspect_ratio, resolution, original_description=original_description
+                )
+                if not image:
+                    raise ValueError("No image returned")
+
+                # The page may have been edited or regenerated in the meantime
+                page = Page.query.get(page_id)
+                if not page or page.generated_image_path != source_image_path:
+                    self._count('discarded')
+                    return
+
+                image_path = file_service.save_generated_image(image, project_id, page_id)
+                db.session.add(PageImageVersion(
+                    page_id=page_id,
+                    image_path=image_path,
+                    version_number=0,
+                    is_current=False,
+                    is_speculative=True,
+                    speculative_key=key,
+                    speculative_instruction=instruction[:500]
+                ))
+                db.session.commit()
+                self._count('generated')
+                logger.debug(f"Speculative variant for page {page_id}: {instruction}")
+            except Exception as e:
+                db.session.rollback()
+                self._count('failed')
+                logger.warning(f"Speculative variant for page {page_id} failed: {str(e)}")
+                return
+
+            self.evict(file_service)
+
+    def find_variant(self, page: Page, instruction: str, original_description: Optional[str],
+                     aspect_ratio: str, resolution: str, file_service) -> Optional[PageImageVersion]:
+        """Unused variant matching an edit request on the page's current image, if any"""
+        if not page.generated_image_path:
+            return None
+        key = get_variant_key(instruction, page.generated_image_path, original_description,
+                              aspect_ratio, resolution)
+        for variant in PageImageVersion.query.filter_by(page_id=page.id, is_speculative=True,
+                                                        speculative_key=key).all():
+            if os.path.isfile(file_service.get_absolute_path(variant.image_path)):
+                return variant
+        return None
+
+    def promote(self, page: Page, variant: PageImageVersion) -> PageImageVersion:
+        """Make a variant the page's current version (caller commits)"""
+        versions = PageImageVersion.query.filter_by(page_id=page.id, is_speculative=False).all()
+        for version in versions:
+            version.is_current = False
+
+        variant.is_speculative = False
+        variant.speculative_key = None
+        variant.version_number = len(versions) + 1
+        variant.is_current = True
+        variant.created_at = datetime.utcnow()
+
+        page.generated_image_path = variant.image_path
+        page.status = 'COMPLETED'
+        page.updated_at = datetime.utcnow()
+        self._count('hits')
+        return variant
+
+    def evict(self, file_service) -> int:
+        """
+        Delete stale, expired and over-budget variants
+
+        A variant is stale once its page changed after it was generated (new image, edited
+        description): its key can no longer match.
+        """
+        with self.evict_lock:
+            try:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.max_age_seconds)
+                variants = PageImageVersion.query.filter_by(is_speculative=True)\
+                    .order_by(PageImageVersion.created_at.desc()).all()
+
+                used_bytes = 0
+                evicted = []
+                for variant in variants:
+                    page = variant.page
+                    path = file_service.get_absolute_path(variant.image_path)
+                    size = os.path.getsize(path) if os.path.isfile(path) else None
+                    if (size is None or page is None or variant.created_at < cutoff
+                            or (page.updated_at and page.updated_at > variant.created_at)
+                            or used_bytes + size > self.disk_budget_bytes):
+                        evicted.append(variant)
+                    else:
+                        used_bytes += size
+
+                for variant in evicted:
+                    file_service.delete_page_image_version(variant.image_path)
+                    db.session.delete(variant)
+                if evicted:
+                    db.session.commit()
+                    with self.lock:
+                        self.stats['evicted'] += len(evicted)
+                    logger.info(f"Evicted {len(evicted)} speculative variants "
+                                f"({used_bytes} bytes kept)")
+                return len(evicted)
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Speculative variant eviction failed: {str(e)}")
+                return 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'enabled': self.enabled, 'instructions': len(self.instructions), **self.stats}
+
+
+# Global instance, configured from app config on startup (disabled by default)
+speculative_variants = SpeculativeVariants()
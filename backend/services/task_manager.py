@@ -1,30 +1,81 @@
 """
 Task Manager - handles background tasks using ThreadPoolExecutor
-No need for Celery or Redis, uses in-memory task tracking
+No need for Celery or Redis: task state and leases are persisted in the tasks table,
+so work orphaned by a restart is picked up again on startup
 """
+import os
+import asyncio
+import contextvars
+import heapq
+import json
+import socket
+import uuid
 import logging
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Callable, List, Dict, Any
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Dict, Any, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
 from models import db, Task, Page, Material
 from pathlib import Path
+from services.scheduler import job_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from services.progress_events import progress_events
+from services.progress_aggregator import ProgressAggregator
+from services.async_runtime import async_runtime
+from services.speculative_images import speculative_variants
+from services.hedging import image_hedging, HedgeBudget
+from services.metrics import ai_metrics, task_scope
+from services.export_artifacts import (
+    export_artifacts, get_export_key, get_artifact_name, EXPORT_FORMATS
+)
 
 logger = logging.getLogger(__name__)
 
 
 class TaskManager:
-    """Simple task manager using ThreadPoolExecutor"""
+    """
+    Task manager using ThreadPoolExecutor
+    
+    Every submitted task holds a lease (lease_owner / lease_expires_at) in the tasks table
+    that is renewed by a heartbeat thread. Tasks whose lease expired (the worker died or the
+    server was restarted) are re-queued through the resumer registered for their task_type.
+    """
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, lease_seconds: int = 60,
+                 heartbeat_interval: int = 15, max_attempts: int = 3):
         """Initialize task manager"""
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
         self.active_tasks = {}  # task_id -> Future
         self.lock = threading.Lock()
+        
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.max_attempts = max_attempts
+        self.resumers = {}  # task_type -> Callable[[Task, Flask], None]
+        
+        self._app = None
+        self._heartbeat_thread = None
+        self._stop_event = threading.Event()
+    
+    def register_resumer(self, task_type: str, resumer: Callable):
+        """
+        Register how to re-submit a task of the given type after a restart
+        
+        Args:
+            task_type: Task.task_type value
+            resumer: Callable(task, app) that rebuilds the task arguments from task.params
+                     and calls submit_task() again
+        """
+        self.resumers[task_type] = resumer
     
     def submit_task(self, task_id: str, func: Callable, *args, **kwargs):
-        """Submit a background task"""
-        future = self.executor.submit(func, task_id, *args, **kwargs)
+        """Submit a background task (must be called inside an app context)"""
+        from flask import current_app
+        self._acquire_lease(task_id)
+        
+        app = current_app._get_current_object()
+        future = self.executor.submit(self._run_task, app, task_id, func, *args, **kwargs)
         
         with self.lock:
             self.active_tasks[task_id] = future
@@ -32,6 +83,23 @@ class TaskManager:
         # Add callback to clean up when done
         future.add_done_callback(lambda f: self._cleanup_task(task_id))
     
+    def _run_task(self, app, task_id: str, func: Callable, /, *args, **kwargs):
+        """Run a task with its model calls attributed to it, then store their totals on the row"""
+        try:
+            with task_scope(task_id):
+                return func(task_id, *args, **kwargs)
+        finally:
+            breakdown = ai_metrics.pop_task(task_id)
+            if breakdown:
+                try:
+                    with app.app_context():
+                        Task.query.filter_by(id=task_id).update(
+                            {'metrics': json.dumps(breakdown)}, synchronize_session=False
+                        )
+                        db.session.commit()
+                except Exception as e:
+                    logger.warning(f"Could not save metrics of task {task_id}: {str(e)}")
+    
     def _cleanup_task(self, task_id: str):
         """Clean up completed task"""
         with self.lock:
@@ -43,24 +111,587 @@ class TaskManager:
         with self.lock:
             return task_id in self.active_tasks
     
+    def _acquire_lease(self, task_id: str):
+        """Take the lease of a task for this worker"""
+        now = datetime.utcnow()
+        Task.query.filter_by(id=task_id).update({
+            'lease_owner': self.worker_id,
+            'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+            'heartbeat_at': now,
+            'attempts': Task.attempts + 1,
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    def start(self, app):
+        """
+        Bind the manager to an app, re-queue orphaned tasks and start the heartbeat thread
+        
+        Args:
+            app: Flask app instance used for database access from the heartbeat thread
+        """
+        self.lease_seconds = app.config.get('TASK_LEASE_SECONDS', self.lease_seconds)
+        self.heartbeat_interval = app.config.get('TASK_HEARTBEAT_INTERVAL', self.heartbeat_interval)
+        self.max_attempts = app.config.get('TASK_MAX_ATTEMPTS', self.max_attempts)
+        self._app = app
+        
+        with app.app_context():
+            self.recover_tasks()
+        
+        if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+            self._stop_event.clear()
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, name='task-heartbeat', daemon=True
+            )
+            self._heartbeat_thread.start()
+        
+        logger.info(f"Task manager started as worker {self.worker_id}")
+    
+    def _heartbeat_loop(self):
+        """Renew leases of running tasks and reclaim expired ones"""
+        while not self._stop_event.wait(self.heartbeat_interval):
+            try:
+                with self._app.app_context():
+                    self._renew_leases()
+                    self.recover_tasks()
+            except Exception as e:
+                logger.error(f"Task heartbeat failed: {str(e)}", exc_info=True)
+    
+    def _renew_leases(self):
+        """Extend the lease of every task running in this process"""
+        with self.lock:
+            task_ids = list(self.active_tasks.keys())
+        
+        if not task_ids:
+            return
+        
+        now = datetime.utcnow()
+        Task.query.filter(
+            Task.id.in_(task_ids),
+            Task.lease_owner == self.worker_id
+        ).update({
+            'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+            'heartbeat_at': now,
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    def recover_tasks(self):
+        """
+        Re-queue PENDING/PROCESSING tasks whose lease has expired (must be called inside an app context)
+        
+        A task is claimed with a conditional UPDATE, so when several workers share the
+        database only one of them resumes it.
+        """
+        now = datetime.utcnow()
+        # Tasks that never got a lease are only considered orphaned once they are older than
+        # one lease period, so a task between commit and submit_task() is not stolen
+        orphaned = Task.query.filter(
+            Task.status.in_(['PENDING', 'PROCESSING']),
+            or_(
+                Task.lease_expires_at < now,
+                and_(Task.lease_expires_at.is_(None),
+                     Task.created_at < now - timedelta(seconds=self.lease_seconds))
+            )
+        ).all()
+        
+        for task in orphaned:
+            if self.is_task_active(task.id):
+                continue
+            
+            claimed = Task.query.filter(
+                Task.id == task.id,
+                or_(Task.lease_expires_at.is_(None), Task.lease_expires_at < now)
+            ).update({
+                'lease_owner': self.worker_id,
+                'lease_expires_at': now + timedelta(seconds=self.lease_seconds),
+            }, synchronize_session=False)
+            db.session.commit()
+            
+            if not claimed:
+                continue
+            
+            db.session.refresh(task)
+            resumer = self.resumers.get(task.task_type)
+            
+            if resumer is None:
+                self._fail_orphaned_task(task, "Task interrupted by server restart")
+            elif task.attempts >= self.max_attempts:
+                self._fail_orphaned_task(task, f"Task abandoned after {task.attempts} attempts")
+            else:
+                logger.info(f"Resuming orphaned task {task.id} ({task.task_type}), attempt {task.attempts + 1}")
+                try:
+                    resumer(task, self._app)
+                except Exception as e:
+                    logger.error(f"Failed to resume task {task.id}: {str(e)}", exc_info=True)
+                    db.session.rollback()
+                    self._fail_orphaned_task(task, f"Failed to resume task: {str(e)}")
+    
+    def _fail_orphaned_task(self, task: Task, message: str):
+        """
+        Mark an orphaned task as failed
+        
+        The page it was working on goes back to COMPLETED if its current image is still on disk
+        (an interrupted edit or regenerate never replaced it), FAILED otherwise. Uploaded
+        reference images the task kept in a temp dir are removed.
+        """
+        logger.warning(f"Task {task.id} ({task.task_type}) FAILED: {message}")
+        task.status = 'FAILED'
+        task.error_message = message
+        task.completed_at = datetime.utcnow()
+        
+        params = task.get_params()
+        page_id = params.get('page_id')
+        if page_id:
+            page = Page.query.get(page_id)
+            if page and page.status == 'GENERATING':
+                from flask import current_app
+                from services.file_service import FileService
+                image_path = None
+                if page.generated_image_path:
+                    file_service = FileService(current_app.config['UPLOAD_FOLDER'])
+                    image_path = Path(file_service.get_absolute_path(page.generated_image_path))
+                if image_path and image_path.is_file() and image_path.stat().st_size > 0:
+                    page.status = 'COMPLETED'
+                else:
+                    page.status = 'FAILED'
+        
+        db.session.commit()
+        
+        if params.get('temp_dir'):
+            import shutil
+            shutil.rmtree(params['temp_dir'], ignore_errors=True)
+        progress_events.publish(task.id, 'task_failed', {"error": message})
+    
     def shutdown(self):
         """Shutdown the executor"""
+        self._stop_event.set()
         self.executor.shutdown(wait=True)
 
 
 # Global task manager instance
-task_manager = TaskManager(max_workers=4)
+# Task threads mostly wait on job_scheduler, which caps the real Gemini concurrency,
+# so a few long deck runs must not block interactive edits from starting
+task_manager = TaskManager(max_workers=16)
+
+
+def get_task_owner(project_id: str) -> str:
+    """
+    Fairness key for job_scheduler: the project's user, or the project itself for
+    projects without a user ('global' materials share one bucket)
+    """
+    if not project_id or project_id == 'global':
+        return None
+    
+    from models import Project
+    project = Project.query.get(project_id)
+    if project and project.user_id:
+        return project.user_id
+    return project_id
+
+
+def is_page_stage_finished(page: Page, stage: str, file_service=None) -> bool:
+    """
+    Check whether a page already reached the end of a generation stage
+    
+    Args:
+        page: Page object
+        stage: 'descriptions' or 'images'
+        file_service: FileService used to verify the image file on disk (images stage)
+    
+    Returns:
+        True if the page can be skipped when resuming the stage
+    """
+    if stage == 'descriptions':
+        desc_content = page.get_description_content()
+        return page.status in ('DESCRIPTION_GENERATED', 'COMPLETED') and bool(
+            desc_content and (desc_content.get('text') or desc_content.get('text_content'))
+        )
+    
+    if page.status != 'COMPLETED' or not page.generated_image_path or file_service is None:
+        return False
+    
+    # The image must actually exist and not be an empty (truncated) file
+    image_path = Path(file_service.get_absolute_path(page.generated_image_path))
+    return image_path.is_file() and image_path.stat().st_size > 0
+
+
+def _generate_page_description(ai_service, project_context, outline: List[Dict],
+                               page_id: str, page_outline: Dict, page_index: int, app,
+                               use_cache: bool = True):
+    """
+    Generate description for a single page
+    注意：只传递 page_id（字符串），不传递 ORM 对象，避免跨线程会话问题
+    
+    Returns:
+        (page_id, desc_content, error)
+    """
+    # 关键修复：在子线程中也需要应用上下文
+    with app.app_context():
+        try:
+            desc_text = ai_service.generate_page_description(
+                project_context, outline, page_outline, page_index, use_cache=use_cache
+            )
+            
+            # Parse description into structured format
+            # This is a simplified version - you may want more sophisticated parsing
+            desc_content = {
+                "text": desc_text,
+                "generated_at": datetime.utcnow().isoformat()
+            }
+            
+            return (page_id, desc_content, None)
+        except Exception as e:
+            import traceback
+            error_detail = traceback.format_exc()
+            logger.error(f"Failed to generate description for page {page_id}: {error_detail}")
+            return (page_id, None, str(e))
+
+
+def _generate_page_descriptions(task_id: str, ai_service, project_context, outline: List[Dict],
+                                chunk: List[tuple], app, use_cache: bool = True) -> List[tuple]:
+    """
+    Generate descriptions for a chunk of (page_id, page_outline, page_index) in one request,
+    falling back to single-page calls for anything missing
+    
+    Returns:
+        List of (page_id, desc_content, error)
+    """
+    for page_id, _, page_index in chunk:
+        progress_events.publish(task_id, 'page_started', {"page_id": page_id, "page_index": page_index})
+    
+    if len(chunk) == 1:
+        return [_generate_page_description(ai_service, project_context, outline, *chunk[0], app,
+                                           use_cache=use_cache)]
+    
+    try:
+        with app.app_context():
+            descriptions = ai_service.generate_page_descriptions_batch(
+                project_context, outline,
+                [{"page_index": page_index, "page_outline": page_outline}
+                 for _, page_outline, page_index in chunk],
+                use_cache=use_cache
+            )
+    except Exception as e:
+        logger.warning(f"Batch description failed for pages "
+                       f"{[page_index for _, _, page_index in chunk]}, falling back: {str(e)}")
+        descriptions = {}
+    
+    results = []
+    for page_id, page_outline, page_index in chunk:
+        if page_index in descriptions:
+            results.append((page_id, {
+                "text": descriptions[page_index],
+                "generated_at": datetime.utcnow().isoformat()
+            }, None))
+        else:
+            results.append(_generate_page_description(
+                ai_service, project_context, outline, page_id, page_outline, page_index, app,
+                use_cache=use_cache
+            ))
+    return results
+
+
+async def _agenerate_page_description(ai_service, project_context, outline: List[Dict],
+                                      page_id: str, page_outline: Dict, page_index: int,
+                                      use_cache: bool = True):
+    """_generate_page_description() as a coroutine on the async runtime (no database access)"""
+    try:
+        desc_text = await ai_service.agenerate_page_description(
+            project_context, outline, page_outline, page_index, use_cache=use_cache
+        )
+        desc_content = {
+            "text": desc_text,
+            "generated_at": datetime.utcnow().isoformat()
+        }
+        return (page_id, desc_content, None)
+    except Exception as e:
+        logger.error(f"Failed to generate description for page {page_id}: {str(e)}", exc_info=True)
+        return (page_id, None, str(e))
+
+
+async def _agenerate_page_descriptions(task_id: str, ai_service, project_context, outline: List[Dict],
+                                       chunk: List[tuple], use_cache: bool = True) -> List[tuple]:
+    """_generate_page_descriptions() as a coroutine on the async runtime"""
+    for page_id, _, page_index in chunk:
+        progress_events.publish(task_id, 'page_started', {"page_id": page_id, "page_index": page_index})
+    
+    if len(chunk) == 1:
+        return [await _agenerate_page_description(ai_service, project_context, outline, *chunk[0],
+                                                  use_cache=use_cache)]
+    
+    try:
+        descriptions = await ai_service.agenerate_page_descriptions_batch(
+            project_context, outline,
+            [{"page_index": page_index, "page_outline": page_outline}
+             for _, page_outline, page_index in chunk],
+            use_cache=use_cache
+        )
+    except Exception as e:
+        logger.warning(f"Batch description failed for pages "
+                       f"{[page_index for _, _, page_index in chunk]}, falling back: {str(e)}")
+        descriptions = {}
+    
+    results = []
+    missing = []
+    for page_id, page_outline, page_index in chunk:
+        if page_index in descriptions:
+            results.append((page_id, {
+                "text": descriptions[page_index],
+                "generated_at": datetime.utcnow().isoformat()
+            }, None))
+        else:
+            missing.append((page_id, page_outline, page_index))
+    # Fallback calls of a chunk run concurrently
+    results.extend(await asyncio.gather(*[
+        _agenerate_page_description(ai_service, project_context, outline, *item, use_cache=use_cache)
+        for item in missing
+    ]))
+    return results
+
+
+class _DescriptionWorkers:
+    """
+    Runs description chunks with at most max_workers in flight: as coroutines on the async
+    runtime when it is enabled, otherwise on a thread pool. submit() returns a
+    concurrent.futures.Future either way. use_cache=False regenerates instead of replaying
+    cached answers.
+    """
+    
+    def __init__(self, max_workers: int, use_cache: bool = True):
+        self.max_workers = max(1, max_workers)
+        self.use_cache = use_cache
+        self.executor = None
+        self.semaphore = None
+        self.futures = []
+    
+    def __enter__(self):
+        if async_runtime.enabled:
+            self.semaphore = asyncio.Semaphore(self.max_workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self
+    
+    def submit(self, task_id: str, ai_service, project_context, outline: List[Dict],
+               chunk: List[tuple], app):
+        if self.executor:
+            # Carry the task id (metrics) over to the worker thread
+            return self.executor.submit(contextvars.copy_context().run, _generate_page_descriptions,
+                                        task_id, ai_service, project_context, outline, chunk, app,
+                                        self.use_cache)
+        future = async_runtime.submit(self._run(task_id, ai_service, project_context, outline, chunk))
+        self.futures.append(future)
+        return future
+    
+    async def _run(self, task_id: str, ai_service, project_context, outline: List[Dict], chunk: List[tuple]):
+        async with self.semaphore:
+            return await _agenerate_page_descriptions(task_id, ai_service, project_context, outline, chunk,
+                                                      use_cache=self.use_cache)
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+        elif exc_type is not None:
+            # The task failed, do not keep spending requests on its remaining chunks
+            for future in self.futures:
+                future.cancel()
+        return False
+
+
+def _get_description_text(desc_content: Dict) -> str:
+    """获取描述文本（可能是 text 字段或 text_content 数组）"""
+    desc_text = desc_content.get('text', '')
+    if not desc_text and desc_content.get('text_content'):
+        # 如果 text 字段不存在，尝试从 text_content 数组获取
+        text_content = desc_content.get('text_content', [])
+        if isinstance(text_content, list):
+            desc_text = '\n'.join(text_content)
+        else:
+            desc_text = str(text_content)
+    return desc_text
+
+
+def _build_page_image_prompt(ai_service, outline: List[Dict], page_id: str, page_data: Dict,
+                             page_index: int, desc_content: Dict, extra_requirements: str = None):
+    """
+    Image prompt of a page plus the material images referenced in its description
+    
+    Returns:
+        (prompt, additional_ref_images)
+    """
+    if not desc_content:
+        raise ValueError("No description content for page")
+    
+    desc_text = _get_description_text(desc_content)
+    logger.debug(f"Got description text for page {page_id}: {desc_text[:100]}...")
+    
+    # 从当前页面的描述内容中提取图片 URL
+    page_additional_ref_images = []
+    has_material_images = False
+    
+    # 从描述文本中提取图片
+    if desc_text:
+        image_urls = ai_service.extract_image_urls_from_markdown(desc_text)
+        if image_urls:
+            logger.info(f"Found {len(image_urls)} image(s) in page {page_id} description")
+            page_additional_ref_images = image_urls
+            has_material_images = True
+    
+    # Generate image prompt
+    prompt = ai_service.generate_image_prompt(
+        outline, page_data, desc_text, page_index,
+        has_material_images=has_material_images,
+        extra_requirements=extra_requirements
+    )
+    logger.debug(f"Generated image prompt for page {page_id}")
+    return prompt, page_additional_ref_images
+
+
+def _generate_page_image(task_id: str, project_id: str, page_id: str, page_data: Dict, page_index: int,
+                         ai_service, file_service, outline: List[Dict], ref_image_path: str,
+                         aspect_ratio: str, resolution: str, extra_requirements: str = None,
+                         total_pages: int = None, aggregator: ProgressAggregator = None, app=None,
+                         desc_content: Dict = None, hedge_budget: HedgeBudget = None):
+    """
+    Generate image for a single page
+    注意：只传递 page_id（字符串），不传递 ORM 对象，避免跨线程会话问题
+    
+    Args:
+        desc_content: Description to render; read from the page row when not given
+            (the pipelined deck task passes it along before the row is flushed)
+        hedge_budget: The deck's hedge budget; a call slower than the model's p90 gets a
+            duplicate request while the budget lasts (None: no hedging)
+    
+    Returns:
+        (page_id, image_path, error)
+    """
+    # 关键修复：在子线程中也需要应用上下文
+    with app.app_context():
+        try:
+            logger.debug(f"Starting image generation for page {page_id}, index {page_index}")
+            if desc_content is None:
+                # Get page from database in this thread
+                page_obj = Page.query.get(page_id)
+                if not page_obj:
+                    raise ValueError(f"Page {page_id} not found")
+                desc_content = page_obj.get_description_content()
+            
+            # Update page status (written with the next progress flush)
+            aggregator.update_page(page_id, status='GENERATING')
+            logger.debug(f"Page {page_id} status queued as GENERATING")
+            progress_events.publish(task_id, 'page_started', {"page_id": page_id, "page_index": page_index})
+            
+            prompt, page_additional_ref_images = _build_page_image_prompt(
+                ai_service, outline, page_id, page_data, page_index, desc_content, extra_requirements
+            )
+            
+            # Generate image
+            logger.info(f"🎨 Calling AI service to generate image for page {page_index}/{total_pages}...")
+            image = image_hedging.call(ai_service.image_model, hedge_budget, lambda: ai_service.generate_image(
+                prompt, ref_image_path, aspect_ratio, resolution,
+                additional_ref_images=page_additional_ref_images if page_additional_ref_images else None
+            ), owner=get_task_owner(project_id) if hedge_budget else None, priority=PRIORITY_BULK)
+            logger.info(f"✅ Image generated successfully for page {page_index}")
+            
+            if not image:
+                raise ValueError("Failed to generate image")
+            
+            # Save image
+            image_path = file_service.save_generated_image(
+                image, project_id, page_id
+            )
+            
+            return (page_id, image_path, None)
+            
+        except Exception as e:
+            import traceback
+            error_detail = traceback.format_exc()
+            logger.error(f"Failed to generate image for page {page_id}: {error_detail}")
+            return (page_id, None, str(e))
+
+
+async def _agenerate_page_image(task_id: str, project_id: str, page_id: str, page_data: Dict,
+                                page_index: int, ai_service, file_service, outline: List[Dict],
+                                ref_image_path: str, aspect_ratio: str, resolution: str,
+                                extra_requirements: str = None, total_pages: int = None,
+                                aggregator: ProgressAggregator = None, app=None, desc_content: Dict = None,
+                                hedge_budget: HedgeBudget = None):
+    """
+    _generate_page_image() as a coroutine on the async runtime
+    
+    Does not touch the database, so desc_content must be passed in; saving the image file
+    runs on the runtime's blocking pool.
+    
+    Returns:
+        (page_id, image_path, error)
+    """
+    try:
+        logger.debug(f"Starting image generation for page {page_id}, index {page_index}")
+        aggregator.update_page(page_id, status='GENERATING')
+        progress_events.publish(task_id, 'page_started', {"page_id": page_id, "page_index": page_index})
+        
+        prompt, page_additional_ref_images = _build_page_image_prompt(
+            ai_service, outline, page_id, page_data, page_index, desc_content, extra_requirements
+        )
+        
+        logger.info(f"🎨 Calling AI service to generate image for page {page_index}/{total_pages}...")
+        image = await image_hedging.acall(ai_service.image_model, hedge_budget, lambda: ai_service.agenerate_image(
+            prompt, ref_image_path, aspect_ratio, resolution,
+            additional_ref_images=page_additional_ref_images if page_additional_ref_images else None
+        ))
+        logger.info(f"✅ Image generated successfully for page {page_index}")
+        
+        if not image:
+            raise ValueError("Failed to generate image")
+        
+        image_path = await async_runtime.run_blocking(
+            file_service.save_generated_image, image, project_id, page_id
+        )
+        return (page_id, image_path, None)
+    
+    except Exception as e:
+        logger.error(f"Failed to generate image for page {page_id}: {str(e)}", exc_info=True)
+        return (page_id, None, str(e))
+
+
+def _get_page_image_job() -> Callable:
+    """Page image job for job_scheduler: the coroutine version when the async runtime is enabled"""
+    return _agenerate_page_image if async_runtime.enabled else _generate_page_image
+
+
+def _fail_batch_task(task_id: str, aggregator: Optional[ProgressAggregator], error: Exception):
+    """Mark a batch task as failed, flushing the page updates buffered so far"""
+    db.session.rollback()
+    if aggregator:
+        try:
+            aggregator.finish('FAILED', str(error))
+        except Exception as flush_error:
+            logger.error(f"Final progress flush for task {task_id} failed: {str(flush_error)}")
+            aggregator = None
+    
+    if not aggregator:
+        task = Task.query.get(task_id)
+        if task:
+            task.status = 'FAILED'
+            task.error_message = str(error)
+            task.completed_at = datetime.utcnow()
+            db.session.commit()
+    progress_events.publish(task_id, 'task_failed', {"error": str(error)})
 
 
 def generate_descriptions_task(task_id: str, project_id: str, ai_service, 
                                project_context, outline: List[Dict], 
-                               max_workers: int = 5, app=None):
+                               max_workers: int = 5, app=None, resume: bool = False,
+                               batch_mode: bool = False, max_batch_size: int = 8,
+                               use_cache: bool = True):
     """
     Background task for generating page descriptions
     Based on demo.py gen_desc() with parallel processing
     
     Note: app instance MUST be passed from the request context
     
+    In batch mode consecutive pages are grouped into chunks (size picked from the shared
+    context size) and each chunk is described by one structured call; pages missing from
+    a chunk's answer fall back to a single-page call.
+    
     Args:
         task_id: Task ID
         project_id: Project ID
@@ -69,10 +700,16 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
         outline: Complete outline structure
         max_workers: Maximum number of parallel workers
         app: Flask app instance
+        resume: Skip pages that already have a generated description
+        batch_mode: Generate several pages per request
+        max_batch_size: Upper bound of pages per request in batch mode
+        use_cache: False for an explicit regenerate, skips cached answers
     """
     if app is None:
         raise ValueError("Flask app instance must be provided")
     
+    aggregator = None
+    
     # 在整个任务中保持应用上下文
     with app.app_context():
         try:
@@ -95,83 +732,90 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
             if len(pages) != len(pages_data):
                 raise ValueError("Page count mismatch")
             
+            # Pages already finished by a previous attempt of this task (resumed after a restart),
+            # plus pages that already have a description when resuming explicitly
+            finished_page_ids = set(task.get_completed_pages())
+            completed_pages = [
+                p.id for p in pages
+                if p.id in finished_page_ids or (resume and is_page_stage_finished(p, 'descriptions'))
+            ]
+            if completed_pages:
+                logger.info(f"Task {task_id} resuming, skipping {len(completed_pages)} finished pages")
+            
             # Initialize progress
             task.set_progress({
                 "total": len(pages),
-                "completed": 0,
-                "failed": 0
+                "completed": len(completed_pages),
+                "failed": 0,
+                "skipped": len(completed_pages),
+                "completed_pages": completed_pages
             })
             db.session.commit()
+            progress_events.publish(task_id, 'task_started', {
+                "task_type": "GENERATE_DESCRIPTIONS",
+                "total": len(pages),
+                "completed": len(completed_pages),
+                "skipped": len(completed_pages)
+            })
             
             # Generate descriptions in parallel
-            completed = 0
+            completed = len(completed_pages)
             failed = 0
             
-            def generate_single_desc(page_id, page_outline, page_index):
-                """
-                Generate description for a single page
-                注意：只传递 page_id（字符串），不传递 ORM 对象，避免跨线程会话问题
-                """
-                # 关键修复：在子线程中也需要应用上下文
-                with app.app_context():
-                    try:
-                        desc_text = ai_service.generate_page_description(
-                            project_context, outline, page_outline, page_index
-                        )
-                        
-                        # Parse description into structured format
-                        # This is a simplified version - you may want more sophisticated parsing
-                        desc_content = {
-                            "text": desc_text,
-                            "generated_at": datetime.utcnow().isoformat()
-                        }
-                        
-                        return (page_id, desc_content, None)
-                    except Exception as e:
-                        import traceback
-                        error_detail = traceback.format_exc()
-                        logger.error(f"Failed to generate description for page {page_id}: {error_detail}")
-                        return (page_id, None, str(e))
-            
-            # Use ThreadPoolExecutor for parallel generation
             # 关键：提前提取 page.id，不要传递 ORM 对象到子线程
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [
-                    executor.submit(generate_single_desc, page.id, page_data, i)
-                    for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
-                ]
+            pending_pages = [
+                (page.id, page_data, i)
+                for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+                if page.id not in completed_pages
+            ]
+            
+            batch_size = 1
+            if batch_mode and pending_pages:
+                batch_size = ai_service.get_description_batch_size(
+                    project_context, outline, len(pending_pages), max_batch_size=max_batch_size
+                )
+                logger.info(f"Task {task_id} generating descriptions in batches of {batch_size}")
+            chunks = [pending_pages[i:i + batch_size] for i in range(0, len(pending_pages), batch_size)]
+            
+            # Page rows and task progress are written in coalesced transactions
+            aggregator = ProgressAggregator(task_id)
+            
+            # Parallel generation: coroutines on the async runtime, or a thread pool
+            with _DescriptionWorkers(max_workers, use_cache=use_cache) as workers:
+                remaining = {
+                    workers.submit(task_id, ai_service, project_context, outline, chunk, app)
+                    for chunk in chunks
+                }
                 
-                # Process results as they complete
-                for future in as_completed(futures):
-                    page_id, desc_content, error = future.result()
-                    
-                    # Update page in database
-                    page = Page.query.get(page_id)
-                    if page:
-                        if error:
-                            page.status = 'FAILED'
-                            failed += 1
-                        else:
-                            page.set_description_content(desc_content)
-                            page.status = 'DESCRIPTION_GENERATED'
-                            completed += 1
-                        
-                        db.session.commit()
-                    
-                    # Update task progress
-                    task = Task.query.get(task_id)
-                    if task:
-                        task.update_progress(completed=completed, failed=failed)
-                        db.session.commit()
-                        logger.info(f"Description Progress: {completed}/{len(pages)} pages completed")
-            
-            # Mark task as completed
-            task = Task.query.get(task_id)
-            if task:
-                task.status = 'COMPLETED'
-                task.completed_at = datetime.utcnow()
-                db.session.commit()
-                logger.info(f"Task {task_id} COMPLETED - {completed} pages generated, {failed} failed")
+                # Process results as they complete, flushing buffered writes in between
+                while remaining:
+                    done, remaining = wait(remaining, timeout=aggregator.time_to_flush(),
+                                           return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for page_id, desc_content, error in future.result():
+                            if error:
+                                failed += 1
+                                aggregator.page_finished(page_id, completed, failed, error=error, status='FAILED')
+                                progress_events.publish(task_id, 'page_failed', {
+                                    "page_id": page_id, "stage": "description", "error": error
+                                })
+                            else:
+                                completed += 1
+                                aggregator.page_finished(page_id, completed, failed,
+                                                       description_content=desc_content,
+                                                       status='DESCRIPTION_GENERATED')
+                                progress_events.publish(task_id, 'description_ready', {
+                                    "page_id": page_id, "description_content": desc_content
+                                })
+                            progress_events.publish(task_id, 'progress', {
+                                "total": len(pages), "completed": completed, "failed": failed
+                            })
+                            logger.info(f"Description Progress: {completed}/{len(pages)} pages completed")
+                    aggregator.maybe_flush()
+            
+            # Final flush, marks the task as completed in the same transaction
+            aggregator.finish('COMPLETED')
+            logger.info(f"Task {task_id} COMPLETED - {completed} pages generated, {failed} failed")
             
             # Update project status
             from models import Project
@@ -180,31 +824,36 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
                 project.status = 'DESCRIPTIONS_GENERATED'
                 db.session.commit()
                 logger.info(f"Project {project_id} status updated to DESCRIPTIONS_GENERATED")
+            
+            progress_events.publish(task_id, 'task_completed', {
+                "total": len(pages), "completed": completed, "failed": failed,
+                "db_commits": aggregator.commits
+            })
         
         except Exception as e:
-            # Mark task as failed
-            task = Task.query.get(task_id)
-            if task:
-                task.status = 'FAILED'
-                task.error_message = str(e)
-                task.completed_at = datetime.utcnow()
-                db.session.commit()
+            # Mark task as failed, keeping the pages finished so far
+            _fail_batch_task(task_id, aggregator, e)
 
 
 def generate_images_task(task_id: str, project_id: str, ai_service, file_service,
                         outline: List[Dict], use_template: bool = True, 
                         max_workers: int = 8, aspect_ratio: str = "16:9",
                         resolution: str = "2K", app=None,
-                        extra_requirements: str = None, limit: int = None):
+                        extra_requirements: str = None, limit: int = None,
+                        resume: bool = False):
     """
     Background task for generating page images
     Based on demo.py gen_images_parallel()
     
     Note: app instance MUST be passed from the request context
+    
+    If resume is True, pages that are already COMPLETED with a valid image on disk are skipped.
     """
     if app is None:
         raise ValueError("Flask app instance must be provided")
     
+    aggregator = None
+    
     with app.app_context():
         try:
             # Update task status to PROCESSING
@@ -232,137 +881,97 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
             if not ref_image_path:
                 raise ValueError("No template image found for project")
             
+            # Pages already finished by a previous attempt of this task (resumed after a restart),
+            # plus pages that already have a valid image on disk when resuming explicitly
+            finished_page_ids = set(task.get_completed_pages())
+            completed_pages = [
+                p.id for p in pages
+                if p.id in finished_page_ids or (resume and is_page_stage_finished(p, 'images', file_service))
+            ]
+            if completed_pages:
+                logger.info(f"Task {task_id} resuming, skipping {len(completed_pages)} finished pages")
+            
             # Initialize progress
             task.set_progress({
                 "total": len(pages),
-                "completed": 0,
-                "failed": 0
+                "completed": len(completed_pages),
+                "failed": 0,
+                "skipped": len(completed_pages),
+                "completed_pages": completed_pages
             })
             db.session.commit()
+            progress_events.publish(task_id, 'task_started', {
+                "task_type": "GENERATE_IMAGES",
+                "total": len(pages),
+                "completed": len(completed_pages),
+                "skipped": len(completed_pages)
+            })
             
             # Generate images in parallel
-            completed = 0
+            completed = len(completed_pages)
             failed = 0
             
-            def generate_single_image(page_id, page_data, page_index):
-                """
-                Generate image for a single page
-                注意：只传递 page_id（字符串），不传递 ORM 对象，避免跨线程会话问题
-                """
-                # 关键修复：在子线程中也需要应用上下文
-                with app.app_context():
-                    try:
-                        logger.debug(f"Starting image generation for page {page_id}, index {page_index}")
-                        # Get page from database in this thread
-                        page_obj = Page.query.get(page_id)
-                        if not page_obj:
-                            raise ValueError(f"Page {page_id} not found")
-                        
-                        # Update page status
-                        page_obj.status = 'GENERATING'
-                        db.session.commit()
-                        logger.debug(f"Page {page_id} status updated to GENERATING")
-                        
-                        # Get description content
-                        desc_content = page_obj.get_description_content()
-                        if not desc_content:
-                            raise ValueError("No description content for page")
-                        
-                        # 获取描述文本（可能是 text 字段或 text_content 数组）
-                        desc_text = desc_content.get('text', '')
-                        if not desc_text and desc_content.get('text_content'):
-                            # 如果 text 字段不存在，尝试从 text_content 数组获取
-                            text_content = desc_content.get('text_content', [])
-                            if isinstance(text_content, list):
-                                desc_text = '\n'.join(text_content)
-                            else:
-                                desc_text = str(text_content)
-                        
-                        logger.debug(f"Got description text for page {page_id}: {desc_text[:100]}...")
-                        
-                        # 从当前页面的描述内容中提取图片 URL
-                        page_additional_ref_images = []
-                        has_material_images = False
-                        
-                        # 从描述文本中提取图片
-                        if desc_text:
-                            image_urls = ai_service.extract_image_urls_from_markdown(desc_text)
-                            if image_urls:
-                                logger.info(f"Found {len(image_urls)} image(s) in page {page_id} description")
-                                page_additional_ref_images = image_urls
-                                has_material_images = True
-                        
-                        # Generate image prompt
-                        prompt = ai_service.generate_image_prompt(
-                            outline, page_data, desc_text, page_index,
-                            has_material_images=has_material_images,
-                            extra_requirements=extra_requirements
-                        )
-                        logger.debug(f"Generated image prompt for page {page_id}")
-                        
-                        # Generate image
-                        logger.info(f"🎨 Calling AI service to generate image for page {page_index}/{len(pages)}...")
-                        image = ai_service.generate_image(
-                            prompt, ref_image_path, aspect_ratio, resolution,
-                            additional_ref_images=page_additional_ref_images if page_additional_ref_images else None
-                        )
-                        logger.info(f"✅ Image generated successfully for page {page_index}")
-                        
-                        if not image:
-                            raise ValueError("Failed to generate image")
-                        
-                        # Save image
-                        image_path = file_service.save_generated_image(
-                            image, project_id, page_id
-                        )
-                        
-                        return (page_id, image_path, None)
-                        
-                    except Exception as e:
-                        import traceback
-                        error_detail = traceback.format_exc()
-                        logger.error(f"Failed to generate image for page {page_id}: {error_detail}")
-                        return (page_id, None, str(e))
-            
-            # Use ThreadPoolExecutor for parallel generation
+            # Page rows and task progress are written in coalesced transactions
+            aggregator = ProgressAggregator(task_id)
+            
+            # Pages are queued on the shared job_scheduler; max_workers only bounds how many
+            # pages of this deck are in flight at once (sliding window), the global cap and
+            # fairness between users are enforced by the scheduler
             # 关键：提前提取 page.id，不要传递 ORM 对象到子线程
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [
-                    executor.submit(generate_single_image, page.id, page_data, i)
-                    for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
-                ]
+            owner = get_task_owner(project_id)
+            # Descriptions are read here, so page jobs do not need the database
+            pending_pages = [
+                (page.id, page_data, i, page.get_description_content())
+                for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+                if page.id not in completed_pages
+            ]
+            pending_pages.reverse()
+            in_flight = set()
+            image_job = _get_page_image_job()
+            hedge_budget = image_hedging.new_budget(len(pending_pages))
+            
+            while pending_pages or in_flight:
+                while pending_pages and len(in_flight) < max(1, max_workers):
+                    page_id, page_data, page_index, desc_content = pending_pages.pop()
+                    in_flight.add(job_scheduler.submit(
+                        image_job, task_id, project_id, page_id, page_data, page_index,
+                        ai_service, file_service, outline, ref_image_path, aspect_ratio, resolution,
+                        extra_requirements=extra_requirements, total_pages=len(pages),
+                        aggregator=aggregator, app=app, desc_content=desc_content,
+                        hedge_budget=hedge_budget, owner=owner, priority=PRIORITY_BULK
+                    ))
+                
+                done, in_flight = wait(in_flight, timeout=aggregator.time_to_flush(),
+                                       return_when=FIRST_COMPLETED)
                 
-                # Process results as they complete
-                for future in as_completed(futures):
+                # Process results as they complete, flushing buffered writes in between
+                for future in done:
                     page_id, image_path, error = future.result()
                     
-                    # Update page in database
-                    page = Page.query.get(page_id)
-                    if page:
-                        if error:
-                            page.status = 'FAILED'
-                            failed += 1
-                        else:
-                            page.generated_image_path = image_path
-                            page.status = 'COMPLETED'
-                            completed += 1
-                        
-                        db.session.commit()
-                    
-                    # Update task progress
-                    task = Task.query.get(task_id)
-                    if task:
-                        task.update_progress(completed=completed, failed=failed)
-                        db.session.commit()
-                        logger.info(f"Image Progress: {completed}/{len(pages)} pages completed")
+                    if error:
+                        failed += 1
+                        aggregator.page_finished(page_id, completed, failed, error=error, status='FAILED')
+                        progress_events.publish(task_id, 'page_failed', {
+                            "page_id": page_id, "stage": "image", "error": error
+                        })
+                    else:
+                        completed += 1
+                        aggregator.page_finished(page_id, completed, failed,
+                                                 generated_image_path=image_path, status='COMPLETED')
+                        progress_events.publish(task_id, 'image_ready', {
+                            "page_id": page_id,
+                            "image_url": file_service.get_file_url(project_id, 'pages', Path(image_path).name)
+                        })
+                    progress_events.publish(task_id, 'progress', {
+                        "total": len(pages), "completed": completed, "failed": failed
+                    })
+                    logger.info(f"Image Progress: {completed}/{len(pages)} pages completed")
+                
+                aggregator.maybe_flush()
             
-            # Mark task as completed
-            task = Task.query.get(task_id)
-            if task:
-                task.status = 'COMPLETED'
-                task.completed_at = datetime.utcnow()
-                db.session.commit()
-                logger.info(f"Task {task_id} COMPLETED - {completed} images generated, {failed} failed")
+            # Final flush, marks the task as completed in the same transaction
+            aggregator.finish('COMPLETED')
+            logger.info(f"Task {task_id} COMPLETED - {completed} images generated, {failed} failed")
             
             # Update project status
             from models import Project
@@ -371,15 +980,245 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                 project.status = 'COMPLETED'
                 db.session.commit()
                 logger.info(f"Project {project_id} status updated to COMPLETED")
+            
+            progress_events.publish(task_id, 'task_completed', {
+                "total": len(pages), "completed": completed, "failed": failed,
+                "db_commits": aggregator.commits,
+                "hedged": hedge_budget.used if hedge_budget else 0
+            })
+            
+            # Opt-in: pre-generate likely edits of the finished pages on idle quota
+            speculative_variants.schedule_project(project_id, ai_service, file_service,
+                                                  aspect_ratio, resolution, app, owner=owner)
         
         except Exception as e:
-            # Mark task as failed
+            # Mark task as failed, keeping the pages finished so far
+            _fail_batch_task(task_id, aggregator, e)
+
+
+def generate_deck_task(task_id: str, project_id: str, ai_service, file_service,
+                       project_context, outline: List[Dict], description_workers: int = 5,
+                       image_workers: int = 8, use_template: bool = True,
+                       aspect_ratio: str = "16:9", resolution: str = "2K", app=None,
+                       extra_requirements: str = None, resume: bool = False,
+                       batch_mode: bool = False, max_batch_size: int = 8, use_cache: bool = True):
+    """
+    Background task generating descriptions and images of a whole deck as one pipeline
+    
+    Each page's image job is queued on the job_scheduler as soon as its description lands,
+    instead of waiting for every description first. The text stage runs on its own pool of
+    description_workers, the image stage keeps at most image_workers pages in flight; pages
+    are fed to the image stage in slide order so the first slides come back first.
+    
+    Note: app instance MUST be passed from the request context
+    
+    Progress: "completed" / "failed" count pages (a page is completed once its image is saved),
+    "described" counts finished descriptions. "described_pages" and "completed_pages" are the
+    resume checkpoints of the two stages.
+    
+    Args:
+        description_workers: Parallel description requests
+        image_workers: Pages of this deck in the image stage at once
+        resume: Skip descriptions / images that already exist
+        batch_mode: Describe several pages per request
+        max_batch_size: Upper bound of pages per description request in batch mode
+        use_cache: False for an explicit regenerate, skips cached descriptions
+    """
+    if app is None:
+        raise ValueError("Flask app instance must be provided")
+    
+    aggregator = None
+    
+    with app.app_context():
+        try:
             task = Task.query.get(task_id)
-            if task:
-                task.status = 'FAILED'
-                task.error_message = str(e)
-                task.completed_at = datetime.utcnow()
+            if not task:
+                logger.error(f"Task {task_id} not found")
+                return
+            
+            task.status = 'PROCESSING'
+            db.session.commit()
+            
+            pages_data = ai_service.flatten_outline(outline)
+            pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+            
+            if len(pages) != len(pages_data):
+                raise ValueError("Page count mismatch")
+            
+            ref_image_path = file_service.get_template_path(project_id) if use_template else None
+            if not ref_image_path:
+                raise ValueError("No template image found for project")
+            
+            # Checkpoints of a previous attempt (resumed after a restart), plus existing
+            # descriptions / valid images when resuming explicitly
+            progress = task.get_progress()
+            described_ids = set(progress.get('described_pages', []))
+            finished_ids = set(progress.get('completed_pages', []))
+            completed_pages = [
+                p.id for p in pages
+                if p.id in finished_ids or (resume and is_page_stage_finished(p, 'images', file_service))
+            ]
+            described_pages = [
+                p.id for p in pages
+                if p.id in completed_pages or (
+                    (p.id in described_ids or resume) and is_page_stage_finished(p, 'descriptions')
+                )
+            ]
+            if described_pages:
+                logger.info(f"Task {task_id} resuming, {len(described_pages)} pages described, "
+                            f"{len(completed_pages)} pages finished")
+            
+            task.set_progress({
+                "total": len(pages),
+                "completed": len(completed_pages),
+                "failed": 0,
+                "described": len(described_pages),
+                "skipped": len(completed_pages),
+                "completed_pages": completed_pages,
+                "described_pages": described_pages
+            })
+            db.session.commit()
+            progress_events.publish(task_id, 'task_started', {
+                "task_type": "GENERATE_DECK",
+                "total": len(pages),
+                "completed": len(completed_pages),
+                "described": len(described_pages),
+                "skipped": len(completed_pages)
+            })
+            
+            completed = len(completed_pages)
+            described = len(described_pages)
+            failed = 0
+            aggregator = ProgressAggregator(task_id)
+            owner = get_task_owner(project_id)
+            
+            # 关键：提前提取 page.id，不要传递 ORM 对象到子线程
+            page_info = {
+                page.id: (page_data, i)
+                for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+            }
+            
+            # Pages whose description already exists go straight to the image stage
+            image_queue = [
+                (page_info[page.id][1], page.id, page.get_description_content())
+                for page in pages
+                if page.id in described_pages and page.id not in completed_pages
+            ]
+            heapq.heapify(image_queue)
+            
+            to_describe = [
+                (page.id, page_info[page.id][0], page_info[page.id][1])
+                for page in pages if page.id not in described_pages
+            ]
+            batch_size = 1
+            if batch_mode and to_describe:
+                batch_size = ai_service.get_description_batch_size(
+                    project_context, outline, len(to_describe), max_batch_size=max_batch_size
+                )
+            chunks = [to_describe[i:i + batch_size] for i in range(0, len(to_describe), batch_size)]
+            
+            image_job = _get_page_image_job()
+            hedge_budget = image_hedging.new_budget(len(pages) - len(completed_pages))
+            with _DescriptionWorkers(description_workers, use_cache=use_cache) as workers:
+                description_futures = {
+                    workers.submit(task_id, ai_service, project_context, outline, chunk, app)
+                    for chunk in chunks
+                }
+                image_futures = set()
+                
+                while description_futures or image_futures or image_queue:
+                    # Image stage: keep up to image_workers pages of this deck in flight
+                    while image_queue and len(image_futures) < max(1, image_workers):
+                        page_index, page_id, desc_content = heapq.heappop(image_queue)
+                        image_futures.add(job_scheduler.submit(
+                            image_job, task_id, project_id, page_id,
+                            page_info[page_id][0], page_index, ai_service, file_service, outline,
+                            ref_image_path, aspect_ratio, resolution,
+                            extra_requirements=extra_requirements, total_pages=len(pages),
+                            aggregator=aggregator, app=app, desc_content=desc_content,
+                            hedge_budget=hedge_budget, owner=owner, priority=PRIORITY_BULK
+                        ))
+                    
+                    done, _ = wait(description_futures | image_futures,
+                                   timeout=aggregator.time_to_flush(), return_when=FIRST_COMPLETED)
+                    
+                    for future in done:
+                        if future in description_futures:
+                            description_futures.discard(future)
+                            for page_id, desc_content, error in future.result():
+                                if error:
+                                    failed += 1
+                                    aggregator.page_finished(page_id, completed, failed, error=error,
+                                                             status='FAILED')
+                                    progress_events.publish(task_id, 'page_failed', {
+                                        "page_id": page_id, "stage": "description", "error": error
+                                    })
+                                else:
+                                    described += 1
+                                    aggregator.page_finished(page_id, completed, failed,
+                                                             checkpoint='described_pages',
+                                                             counters={"described": described},
+                                                             description_content=desc_content,
+                                                             status='DESCRIPTION_GENERATED')
+                                    progress_events.publish(task_id, 'description_ready', {
+                                        "page_id": page_id, "description_content": desc_content
+                                    })
+                                    heapq.heappush(image_queue, (page_info[page_id][1], page_id, desc_content))
+                        else:
+                            image_futures.discard(future)
+                            page_id, image_path, error = future.result()
+                            if error:
+                                failed += 1
+                                aggregator.page_finished(page_id, completed, failed, error=error,
+                                                         status='FAILED')
+                                progress_events.publish(task_id, 'page_failed', {
+                                    "page_id": page_id, "stage": "image", "error": error
+                                })
+                            else:
+                                completed += 1
+                                aggregator.page_finished(page_id, completed, failed,
+                                                         generated_image_path=image_path,
+                                                         status='COMPLETED')
+                                progress_events.publish(task_id, 'image_ready', {
+                                    "page_id": page_id,
+                                    "image_url": file_service.get_file_url(
+                                        project_id, 'pages', Path(image_path).name
+                                    )
+                                })
+                        progress_events.publish(task_id, 'progress', {
+                            "total": len(pages), "completed": completed,
+                            "described": described, "failed": failed
+                        })
+                    
+                    if done:
+                        logger.info(f"Deck Progress: {described}/{len(pages)} described, "
+                                    f"{completed}/{len(pages)} images completed")
+                    aggregator.maybe_flush()
+            
+            # Final flush, marks the task as completed in the same transaction
+            aggregator.finish('COMPLETED')
+            logger.info(f"Task {task_id} COMPLETED - {completed} pages generated, {failed} failed")
+            
+            from models import Project
+            project = Project.query.get(project_id)
+            if project and failed == 0:
+                project.status = 'COMPLETED'
                 db.session.commit()
+                logger.info(f"Project {project_id} status updated to COMPLETED")
+            
+            progress_events.publish(task_id, 'task_completed', {
+                "total": len(pages), "completed": completed, "described": described,
+                "failed": failed, "db_commits": aggregator.commits,
+                "hedged": hedge_budget.used if hedge_budget else 0
+            })
+            
+            # Opt-in: pre-generate likely edits of the finished pages on idle quota
+            speculative_variants.schedule_project(project_id, ai_service, file_service,
+                                                  aspect_ratio, resolution, app, owner=owner)
+        
+        except Exception as e:
+            # Mark task as failed, keeping the pages finished so far
+            _fail_batch_task(task_id, aggregator, e)
 
 
 def generate_single_page_image_task(task_id: str, project_id: str, page_id: str, 
@@ -413,6 +1252,7 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             # Update page status
             page.status = 'GENERATING'
             db.session.commit()
+            progress_events.publish(task_id, 'page_started', {"page_id": page_id})
             
             # Get description content
             desc_content = page.get_description_content()
@@ -458,11 +1298,13 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
                 extra_requirements=extra_requirements
             )
             
-            # Generate image
+            # Generate image (interactive: served ahead of bulk deck runs)
             logger.info(f"🎨 Generating image for page {page_id}...")
-            image = ai_service.generate_image(
+            image = job_scheduler.run(
+                ai_service.generate_image,
                 prompt, ref_image_path, aspect_ratio, resolution,
-                additional_ref_images=additional_ref_images if additional_ref_images else None
+                additional_ref_images=additional_ref_images if additional_ref_images else None,
+                owner=get_task_owner(project_id), priority=PRIORITY_INTERACTIVE
             )
             
             if not image:
@@ -470,7 +1312,7 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             
             # Calculate next version number
             from models import PageImageVersion
-            existing_versions = PageImageVersion.query.filter_by(page_id=page_id).all()
+            existing_versions = PageImageVersion.query.filter_by(page_id=page_id, is_speculative=False).all()
             next_version = len(existing_versions) + 1
             
             # Save image with version number
@@ -508,6 +1350,9 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             db.session.commit()
             
             logger.info(f"✅ Task {task_id} COMPLETED - Page {page_id} image generated")
+            image_url = file_service.get_file_url(project_id, 'pages', Path(image_path).name)
+            progress_events.publish(task_id, 'image_ready', {"page_id": page_id, "image_url": image_url})
+            progress_events.publish(task_id, 'task_completed', {"total": 1, "completed": 1, "failed": 0})
         
         except Exception as e:
             import traceback
@@ -527,6 +1372,9 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             if page:
                 page.status = 'FAILED'
                 db.session.commit()
+            
+            progress_events.publish(task_id, 'page_failed', {"page_id": page_id, "stage": "image", "error": str(e)})
+            progress_events.publish(task_id, 'task_failed', {"error": str(e)})
 
 
 def edit_page_image_task(task_id: str, project_id: str, page_id: str,
@@ -564,6 +1412,7 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             # Update page status
             page.status = 'GENERATING'
             db.session.commit()
+            progress_events.publish(task_id, 'page_started', {"page_id": page_id})
             
             # Get current image path
             current_image_path = file_service.get_absolute_path(page.generated_image_path)
@@ -571,19 +1420,21 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             # Edit image
             logger.info(f"🎨 Editing image for page {page_id}...")
             try:
-                image = ai_service.edit_image(
+                # Interactive: served ahead of bulk deck runs
+                image = job_scheduler.run(
+                    ai_service.edit_image,
                     edit_instruction,
                     current_image_path,
                     aspect_ratio,
                     resolution,
                     original_description=original_description,
-                    additional_ref_images=additional_ref_images if additional_ref_images else None
+                    additional_ref_images=additional_ref_images if additional_ref_images else None,
+                    owner=get_task_owner(project_id), priority=PRIORITY_INTERACTIVE
                 )
             finally:
                 # Clean up temp directory if created
                 if temp_dir:
                     import shutil
-                    from pathlib import Path
                     temp_path = Path(temp_dir)
                     if temp_path.exists():
                         shutil.rmtree(temp_dir)
@@ -593,7 +1444,7 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             
             # Calculate next version number
             from models import PageImageVersion
-            existing_versions = PageImageVersion.query.filter_by(page_id=page_id).all()
+            existing_versions = PageImageVersion.query.filter_by(page_id=page_id, is_speculative=False).all()
             next_version = len(existing_versions) + 1
             
             # Save edited image with version number
@@ -631,6 +1482,9 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             db.session.commit()
             
             logger.info(f"✅ Task {task_id} COMPLETED - Page {page_id} image edited")
+            image_url = file_service.get_file_url(project_id, 'pages', Path(image_path).name)
+            progress_events.publish(task_id, 'image_ready', {"page_id": page_id, "image_url": image_url})
+            progress_events.publish(task_id, 'task_completed', {"total": 1, "completed": 1, "failed": 0})
         
         except Exception as e:
             import traceback
@@ -640,7 +1494,6 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             # Clean up temp directory on error
             if temp_dir:
                 import shutil
-                from pathlib import Path
                 temp_path = Path(temp_dir)
                 if temp_path.exists():
                     shutil.rmtree(temp_dir)
@@ -658,6 +1511,9 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             if page:
                 page.status = 'FAILED'
                 db.session.commit()
+            
+            progress_events.publish(task_id, 'page_failed', {"page_id": page_id, "stage": "image", "error": str(e)})
+            progress_events.publish(task_id, 'task_failed', {"error": str(e)})
 
 
 def generate_material_image_task(task_id: str, project_id: str, prompt: str,
@@ -690,12 +1546,14 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
             
             # Generate image (复用核心逻辑)
             logger.info(f"🎨 Generating material image with prompt: {prompt[:100]}...")
-            image = ai_service.generate_image(
+            image = job_scheduler.run(
+                ai_service.generate_image,
                 prompt=prompt,
                 ref_image_path=ref_image_path,
                 aspect_ratio=aspect_ratio,
                 resolution=resolution,
                 additional_ref_images=additional_ref_images or None,
+                owner=get_task_owner(project_id), priority=PRIORITY_INTERACTIVE
             )
             
             if not image:
@@ -734,6 +1592,10 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
             db.session.commit()
             
             logger.info(f"✅ Task {task_id} COMPLETED - Material {material.id} generated")
+            progress_events.publish(task_id, 'task_completed', {
+                "total": 1, "completed": 1, "failed": 0,
+                "material_id": material.id, "image_url": image_url
+            })
         
         except Exception as e:
             import traceback
@@ -747,6 +1609,7 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
                 task.error_message = str(e)
                 task.completed_at = datetime.utcnow()
                 db.session.commit()
+            progress_events.publish(task_id, 'task_failed', {"error": str(e)})
         
         finally:
             # Clean up temp directory
@@ -756,3 +1619,115 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
                 if temp_path.exists():
                     shutil.rmtree(temp_dir, ignore_errors=True)
 
+
+
+def get_export_image_paths(project_id: str, file_service) -> List[str]:
+    """Absolute paths of the project's current slide images, in page order"""
+    pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+    return [
+        file_service.get_absolute_path(page.generated_image_path)
+        for page in pages if page.generated_image_path
+    ]
+
+
+def export_task(task_id: str, project_id: str, export_format: str, file_service,
+                download_name: str = None, app=None):
+    """
+    Background task for exporting a project as PPTX or PDF
+    
+    The artifact is cached under a key of the current slide images (see export_artifacts),
+    so a deck that did not change since its last export is not rebuilt. A changed deck is
+    exported as PPTX by patching the previous PPTX of the project, PDF is written in full.
+    Exports of the project that no longer match the deck are garbage-collected afterwards.
+    
+    Note: app instance MUST be passed from the request context
+    """
+    from services.export_service import ExportService
+    
+    if app is None:
+        raise ValueError("Flask app instance must be provided")
+    
+    with app.app_context():
+        try:
+            task = Task.query.get(task_id)
+            if not task:
+                return
+            
+            task.status = 'PROCESSING'
+            db.session.commit()
+            
+            image_paths = get_export_image_paths(project_id, file_service)
+            if not image_paths:
+                raise ValueError("No generated images found for project")
+            db.session.remove()
+            
+            exports_dir = file_service._get_exports_dir(project_id)
+            manifest = {}
+            
+            def write_pptx(output_path):
+                # Patch the project's last PPTX, only changed / added / removed slides are written
+                base_file, base_manifest = export_artifacts.find_latest_with_manifest(exports_dir, 'pptx')
+                manifest.update(ExportService.update_pptx_from_images(
+                    image_paths, output_path, str(base_file) if base_file else None, base_manifest
+                ))
+            
+            writers = {
+                'pptx': write_pptx,
+                'pdf': lambda output_path: ExportService.create_pdf_from_images(image_paths, output_file=output_path),
+            }
+            key = get_export_key(image_paths, export_format)
+            artifact = export_artifacts.find(exports_dir, key, export_format)
+            cached = artifact is not None
+            if not cached:
+                artifact = export_artifacts.build(exports_dir, key, export_format, writers[export_format])
+                if manifest:
+                    export_artifacts.save_manifest(artifact, manifest)
+                    logger.info(f"PPTX export {artifact.name}: wrote {manifest['patched']} of "
+                                f"{len(manifest['slides'])} slides")
+            
+            # Keep the current artifact of every format, drop exports of older versions of the deck
+            export_artifacts.collect_garbage(exports_dir, keep={
+                get_artifact_name(get_export_key(image_paths, fmt), fmt) for fmt in EXPORT_FORMATS
+            })
+            
+            download_url = get_export_download_url(project_id, artifact.name, download_name)
+            result = {
+                "total": 1,
+                "completed": 1,
+                "failed": 0,
+                "format": export_format,
+                "download_url": download_url,
+                "cached": cached
+            }
+            task = Task.query.get(task_id)
+            task.status = 'COMPLETED'
+            task.completed_at = datetime.utcnow()
+            task.set_progress(result)
+            db.session.commit()
+            
+            logger.info(f"✅ Task {task_id} COMPLETED - {export_format.upper()} export {artifact.name}"
+                        f"{' (cached)' if cached else ''}")
+            progress_events.publish(task_id, 'task_completed', result)
+        
+        except Exception as e:
+            import traceback
+            error_detail = traceback.format_exc()
+            logger.error(f"Task {task_id} FAILED: {error_detail}")
+            db.session.rollback()
+            
+            task = Task.query.get(task_id)
+            if task:
+                task.status = 'FAILED'
+                task.error_message = str(e)
+                task.completed_at = datetime.utcnow()
+                db.session.commit()
+            progress_events.publish(task_id, 'task_failed', {"error": str(e)})
+
+
+def get_export_download_url(project_id: str, artifact_name: str, download_name: str = None) -> str:
+    """Relative URL of an export artifact, saved by the browser as download_name"""
+    from urllib.parse import quote
+    url = f"/files/{project_id}/exports/{artifact_name}"
+    if download_name:
+        url += f"?download={quote(download_name)}"
+    return url
@@ -0,0 +1,260 @@
+"""
+Thumbnails - resized WebP / AVIF variants of uploaded images, cached on disk
+
+Slide grids and project lists only need a few hundred pixels of a 2K page image. A variant is
+made on first request (longest side no larger than the source, widths snapped to a few sizes so
+the number of variants per image stays small) and stored under a key of the source path, mtime,
+size, width, format and quality in {cache_dir}/{key[:2]}/{key}.{ext}. A new image version is a
+new source, so stale variants are never served.
+
+The cache is bounded: when the files written by this process push it past max_bytes, the least
+recently used variants (by mtime, refreshed on hits at most once an hour) are deleted down to
+90% of the budget. Newly generated page images get the common sizes made in the background.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_QUALITY = 80
+DEFAULT_PREGENERATE = ((320, 'webp'), (640, 'webp'))
+
+# Requested widths are rounded up to one of these
+THUMBNAIL_WIDTHS = (160, 320, 640, 960, 1280, 1920)
+
+THUMBNAIL_FORMATS = {'webp': ('WEBP', 'webp'), 'avif': ('AVIF', 'avif'), 'jpeg': ('JPEG', 'jpg')}
+DEFAULT_FORMAT = 'webp'
+
+# Refresh a hit's mtime (its LRU position) at most this often
+TOUCH_INTERVAL_SECONDS = 3600
+
+
+def parse_pregenerate(value: str) -> Tuple[Tuple[int, str], ...]:
+    """"320,640:avif" -> ((320, 'webp'), (640, 'avif'))"""
+    sizes = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        width, _, fmt = item.partition(':')
+        sizes.append((int(width), (fmt or DEFAULT_FORMAT).lower()))
+    return tuple(sizes)
+
+
+class ThumbnailCache:
+    """Disk cache of resized image variants with a byte budget"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 quality: int = DEFAULT_QUALITY, pregenerate: Iterable[Tuple[int, str]] = DEFAULT_PREGENERATE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.pregenerate_sizes = tuple(pregenerate)
+        self.lock = threading.Lock()
+        self.size = None  # bytes on disk, scanned on first write
+        self.executor = None
+        self.stats = {'hits': 0, 'generated': 0, 'pregenerated': 0, 'evicted': 0, 'errors': 0}
+
+    def configure(self, cache_dir: str = None, max_bytes: int = None, quality: int = None,
+                  pregenerate: Iterable[Tuple[int, str]] = None):
+        """Apply app config (called once on startup)"""
+        with self.lock:
+            if cache_dir is not None:
+                self.cache_dir = cache_dir
+                self.size = None
+            if max_bytes is not None and max_bytes > 0:
+                self.max_bytes = max_bytes
+            if quality is not None:
+                self.quality = quality
+            if pregenerate is not None:
+                self.pregenerate_sizes = tuple(pregenerate)
+
+    @staticmethod
+    def get_width(requested: int) -> int:
+        """Smallest cached width that is at least the requested one"""
+        for width in THUMBNAIL_WIDTHS:
+            if width >= requested:
+                return width
+        return THUMBNAIL_WIDTHS[-1]
+
+    @staticmethod
+    def get_format(requested: Optional[str]) -> Optional[str]:
+        """Normalized format name, AVIF falls back to WebP where Pillow can't write it"""
+        fmt = (requested or DEFAULT_FORMAT).lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in THUMBNAIL_FORMATS:
+            return None
+        if fmt == 'avif' and not features.check('avif'):
+            return DEFAULT_FORMAT
+        return fmt
+
+    def _variant_path(self, source: str, stat: os.stat_result, width: int, fmt: str) -> str:
+        key = hashlib.sha1(
+            f"{source}|{stat.st_mtime_ns}|{stat.st_size}|{width}|{fmt}|{self.quality}".encode('utf-8')
+        ).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{THUMBNAIL_FORMATS[fmt][1]}")
+
+    def get(self, source: str, width: int, fmt: str = DEFAULT_FORMAT) -> Optional[str]:
+        """
+        Path of the variant of a source image, made now if it is not cached
+
+        Args:
+            source: Absolute path of the source image
+            width: Requested width in pixels (snapped with get_width)
+            fmt: 'webp', 'avif' or 'jpeg' (see get_format)
+
+        Returns:
+            Path of the variant, None if the source does not exist or can't be decoded
+        """
+        fmt = self.get_format(fmt)
+        if fmt is None or not self.cache_dir:
+            return None
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        path = self._variant_path(source, stat, self.get_width(width), fmt)
+
+        try:
+            mtime = os.stat(path).st_mtime
+            if time.time() - mtime > TOUCH_INTERVAL_SECONDS:
+                os.utime(path)
+            self._count('hits')
+            return path
+        except OSError:
+            pass
+
+        try:
+            with Image.open(source) as img:
+                img.load()
+                return self._write(img, path, self.get_width(width), fmt)
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Could not make thumbnail of {source}: {str(e)}")
+            return None
+
+    def _write(self, img: Image.Image, path: str, width: int, fmt: str) -> str:
+        """Resize one image and store it atomically under path"""
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+        if fmt == 'jpeg' or img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB' if fmt == 'jpeg' or 'A' not in img.getbands() else 'RGBA')
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            img.save(temp_path, format=THUMBNAIL_FORMATS[fmt][0], quality=self.quality)
+            written = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        self._count('generated')
+        self._account(written)
+        return path
+
+    def pregenerate(self, source: str):
+        """Make the common variants of a new image in the background"""
+        if not self.pregenerate_sizes or not self.cache_dir:
+            return
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='thumbnails')
+        self.executor.submit(self._pregenerate, source)
+
+    def _pregenerate(self, source: str):
+        try:
+            stat = os.stat(source)
+            # Largest first, the source is decoded once
+            with Image.open(source) as img:
+                img.load()
+                for width, fmt in sorted(self.pregenerate_sizes, reverse=True):
+                    fmt = self.get_format(fmt)
+                    if fmt is None:
+                        continue
+                    path = self._variant_path(source, stat, self.get_width(width), fmt)
+                    if not os.path.exists(path):
+                        self._write(img, path, self.get_width(width), fmt)
+                        self._count('pregenerated')
+        except FileNotFoundError:
+            # Replaced or deleted before the queue got to it
+            logger.debug(f"Skipped thumbnails of removed image {source}")
+        except Exception as e:
+            self._count('errors')
+            logger.warning(f"Could not pregenerate thumbnails of {source}: {str(e)}")
+
+    def _account(self, written: int):
+        with self.lock:
+            if self.size is None:
+                self.size = self._scan_size()
+            else:
+                self.size += written
+            over_budget = self.size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _scan(self):
+        """(mtime, size, path) of every cached variant"""
+        entries = []
+        try:
+            for directory in os.scandir(self.cache_dir):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            pass
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._scan())
+
+    def evict(self) -> int:
+        """Delete least recently used variants until the cache is under 90% of max_bytes"""
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                continue
+        with self.lock:
+            self.size = total
+        if removed:
+            self._count('evicted', removed)
+            logger.info(f"Evicted {removed} thumbnails, cache now {total} bytes")
+        return removed
+
+    def _count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.stats, size=self.size)
+
+
+# Global instance, configured from app config on startup
+thumbnails = ThumbnailCache()
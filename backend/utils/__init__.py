@@ -8,7 +8,7 @@ from .response import (
     ai_service_error,
     rate_limit_error
 )
-from .validators import validate_project_status, validate_page_status, allowed_file
+from .validators import validate_project_status, validate_page_status, allowed_file, parse_bool
 from .path_utils import convert_mineru_path_to_local, find_mineru_file_with_prefix, find_file_with_prefix
 
 __all__ = [
@@ -22,6 +22,7 @@ __all__ = [
     'validate_project_status',
     'validate_page_status',
     'allowed_file',
+    'parse_bool',
     'convert_mineru_path_to_local',
     'find_mineru_file_with_prefix',
     'find_file_with_prefix'
@@ -0,0 +1,130 @@
+"""
+File serving utilities - conditional responses for uploaded files
+
+Every file is served with a strong ETag made from a hash of its content (cached per path, inode,
+mtime and size, so a file is hashed once per version); a matching If-None-Match is answered
+with 304 without sending the file. Versioned page images ({page_id}_v{n}_{token}.png) and export
+artifacts never change under their name and are cached by browsers as immutable; everything
+else is revalidated on each use.
+
+Behind nginx the bytes need not be sent by Python: with FILE_OFFLOAD_TYPE set, the response
+only carries the headers plus X-Accel-Redirect (path translated with FILE_OFFLOAD_MAPPING,
+"/app/uploads/=/_uploads/") or X-Sendfile, and the proxy sends the file, Range requests
+included. This is server configuration only, never taken from request headers: any client able
+to reach the backend could otherwise ask for empty bodies and learn absolute file paths.
+Without it, Flask streams the file itself with Range support.
+"""
+import hashlib
+import os
+import re
+import threading
+import mimetypes
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, current_app, request, send_file
+from werkzeug.utils import secure_filename
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ETAG_CACHE_SIZE = 4096
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# {page_id}_v{n}_{token}.{ext}: a new image version always gets a new, never reused file name
+# (older {page_id}_v{n}.{ext} names could be written twice by concurrent edits, so they are revalidated)
+VERSIONED_IMAGE_PATTERN = re.compile(r'^[\w-]+_v\d+_[0-9a-f]{12}\.\w+$')
+
+_etags = OrderedDict()  # (path, inode, mtime_ns, size) -> etag
+_etags_lock = threading.Lock()
+
+
+def is_versioned_filename(filename: str) -> bool:
+    return bool(VERSIONED_IMAGE_PATTERN.match(filename))
+
+
+def get_file_etag(path: str, stat: os.stat_result) -> str:
+    """Content hash of a file, computed once per file version"""
+    key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _etags_lock:
+        etag = _etags.get(key)
+        if etag is not None:
+            _etags.move_to_end(key)
+            return etag
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()
+
+    with _etags_lock:
+        _etags[key] = etag
+        while len(_etags) > ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return etag
+
+
+def _get_offload_header(path: str) -> Optional[tuple]:
+    """(header, value) for the front proxy to send the file, None to send it from Python"""
+    sendfile_type = (current_app.config.get('FILE_OFFLOAD_TYPE') or '').lower()
+    if sendfile_type == 'x-sendfile':
+        return 'X-Sendfile', path
+    if sendfile_type == 'x-accel-redirect':
+        # "/app/uploads/=/_uploads/": file system prefix = internal location
+        for mapping in (current_app.config.get('FILE_OFFLOAD_MAPPING') or '').split(','):
+            root, _, location = mapping.strip().partition('=')
+            if root and location and path.startswith(root):
+                return 'X-Accel-Redirect', quote(location + path[len(root):])
+    return None
+
+
+def serve_static_file(directory: str, filename: str, immutable: bool = False,
+                      download_name: Optional[str] = None) -> Optional[Response]:
+    """
+    Response for a file inside directory, None if it does not exist
+
+    Args:
+        directory: Directory the file must be in (filename is resolved safely inside it)
+        filename: Relative file name
+        immutable: The content never changes under this name (long-lived browser cache)
+        download_name: Send as an attachment saved under this name
+    """
+    from werkzeug.security import safe_join
+
+    path = safe_join(os.path.abspath(directory), filename)
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+
+    etag = get_file_etag(path, stat)
+    if download_name is not None:
+        download_name = secure_filename(download_name) or os.path.basename(path)
+
+    offload = _get_offload_header(path)
+    if offload is None:
+        response = send_file(path, etag=etag, conditional=True, last_modified=stat.st_mtime,
+                             as_attachment=download_name is not None, download_name=download_name)
+    else:
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = Response(status=200, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        if download_name is not None:
+            response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+        else:
+            response.headers[offload[0]] = offload[1]
+
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
@@ -1,7 +1,7 @@
 """
 Data validation utilities
 """
-from typing import Set
+from typing import Any, Set
 
 # Project status states
 PROJECT_STATUSES = {
@@ -9,6 +9,7 @@ PROJECT_STATUSES = {
     'OUTLINE_GENERATED', 
     'DESCRIPTIONS_GENERATED', 
     'GENERATING_IMAGES', 
+    'GENERATING_DECK',
     'COMPLETED'
 }
 
@@ -32,7 +33,8 @@ TASK_STATUSES = {
 # Task types
 TASK_TYPES = {
     'GENERATE_DESCRIPTIONS',
-    'GENERATE_IMAGES'
+    'GENERATE_IMAGES',
+    'GENERATE_DECK'
 }
 
 
@@ -56,6 +58,15 @@ def validate_task_type(task_type: str) -> bool:
     return task_type in TASK_TYPES
 
 
+def parse_bool(value: Any, default: bool = False) -> bool:
+    """Boolean request flag: a JSON bool, or "1" / "true" / "yes" (any case) for strings"""
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+
 def allowed_file(filename: str, allowed_extensions: Set[str]) -> bool:
     """Check if file extension is allowed"""
     return '.' in filename and \
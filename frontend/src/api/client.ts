@@ -85,4 +85,12 @@ export const getImageUrl = (path?: string, timestamp?: string | number): string
   return url;
 };
 
+// 缩略图URL：后端按宽度生成并缓存缩放后的 WebP（/files/...?w=320&fmt=webp）
+// 列表和缩略图网格使用，避免加载完整的 2K 图片
+export const getThumbnailUrl = (path: string | undefined, width: number, timestamp?: string | number): string => {
+  const url = getImageUrl(path, timestamp);
+  if (!url || !url.startsWith('/files/')) return url;
+  return `${url}${url.includes('?') ? '&' : '?'}w=${width}&fmt=webp`;
+};
+
 export default apiClient;
@@ -101,10 +101,13 @@ export const updatePagesOrder = async (
 /**
  * 生成大纲
  */
-export const generateOutline = async (projectId: string): Promise<ApiResponse> => {
+export const generateOutline = async (
+  projectId: string,
+  forceRegenerate: boolean = false
+): Promise<ApiResponse> => {
   const response = await apiClient.post<ApiResponse>(
     `/api/projects/${projectId}/generate/outline`,
-    {} // 必须发送空对象，后端使用 request.get_json()
+    { force_regenerate: forceRegenerate } // 重新生成时不使用缓存的结果
   );
   return response.data;
 };
@@ -125,10 +128,13 @@ export const generateFromDescription = async (projectId: string, descriptionText
 /**
  * 批量生成描述
  */
-export const generateDescriptions = async (projectId: string): Promise<ApiResponse> => {
+export const generateDescriptions = async (
+  projectId: string,
+  forceRegenerate: boolean = false
+): Promise<ApiResponse> => {
   const response = await apiClient.post<ApiResponse>(
     `/api/projects/${projectId}/generate/descriptions`,
-    {} // 发送空对象而不是 undefined
+    { force_regenerate: forceRegenerate } // 重新生成时不使用缓存的结果
   );
   return response.data;
 };
@@ -364,16 +370,191 @@ export const getTaskStatus = async (projectId: string, taskId: string): Promise<
   return response.data;
 };
 
+/**
+ * 订阅任务进度事件（Server-Sent Events）
+ * 认证依赖 auth_token cookie；调用方在任务结束后需要 close()
+ */
+export const subscribeTaskEvents = (projectId: string, taskId: string): EventSource => {
+  return new EventSource(`/api/projects/${projectId}/tasks/${taskId}/events`, {
+    withCredentials: true,
+  });
+};
+
+// ===== 流式生成（Server-Sent Events） =====
+
+export interface StreamEvent {
+  event: string;
+  data: any;
+}
+
+/**
+ * 流式请求失败时附带 HTTP 状态码，调用方可据此判断是否回退到普通接口
+ */
+export class StreamRequestError extends Error {
+  status?: number;
+
+  constructor(message: string, status?: number) {
+    super(message);
+    this.name = 'StreamRequestError';
+    this.status = status;
+  }
+}
+
+/**
+ * 后端不支持对应的流式接口（旧版本后端），应回退到普通接口
+ */
+export const isStreamUnsupported = (error: any): boolean =>
+  error instanceof StreamRequestError && (error.status === 404 || error.status === 405);
+
+/**
+ * 发送 POST 请求并逐条读取 SSE 响应（EventSource 只支持 GET，这里用 fetch 读取流）
+ * 每个事件回调 onEvent；返回 completed 事件的数据，收到 error 事件时抛出异常
+ */
+const postEventStream = async (
+  url: string,
+  body: any,
+  onEvent?: (event: StreamEvent) => void
+): Promise<any> => {
+  const headers: Record<string, string> = {
+    'Content-Type': 'application/json',
+    Accept: 'text/event-stream',
+  };
+  const token = typeof window !== 'undefined' ? localStorage.getItem('auth_token') : null;
+  if (token && token !== 'null' && token !== 'undefined' && token.trim() !== '') {
+    headers['Authorization'] = `Bearer ${token}`;
+  }
+
+  const response = await fetch(url, {
+    method: 'POST',
+    headers,
+    body: JSON.stringify(body),
+    credentials: 'include',
+  });
+  if (!response.ok || !response.body) {
+    let message = `请求失败 (${response.status})`;
+    try {
+      const payload = await response.json();
+      message = payload?.error?.message || message;
+    } catch {}
+    throw new StreamRequestError(message, response.status);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let completed: any = undefined;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let separator = buffer.indexOf('\n\n');
+    while (separator !== -1) {
+      const rawEvent = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+      separator = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      const dataLines: string[] = [];
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+          dataLines.push(line.slice(5).trimStart());
+        }
+      }
+      if (dataLines.length === 0) continue;
+
+      const data = JSON.parse(dataLines.join('\n'));
+      if (event === 'error') {
+        throw new StreamRequestError(data?.message || '生成失败');
+      }
+      if (event === 'completed') {
+        completed = data;
+      }
+      onEvent?.({ event, data });
+    }
+  }
+
+  if (completed === undefined) {
+    throw new StreamRequestError('连接中断，生成未完成');
+  }
+  return completed;
+};
+
+/**
+ * 流式生成大纲：page 事件在每页大纲完成时立即到达，completed 事件包含保存后的页面
+ */
+export const generateOutlineStream = async (
+  projectId: string,
+  forceRegenerate: boolean = false,
+  onEvent?: (event: StreamEvent) => void
+): Promise<{ pages: Page[] }> => {
+  return postEventStream(
+    `/api/projects/${projectId}/generate/outline/stream`,
+    { force_regenerate: forceRegenerate },
+    onEvent
+  );
+};
+
+/**
+ * 流式生成单页描述：delta 事件为逐步生成的文本，completed 事件包含保存后的页面
+ */
+export const generatePageDescriptionStream = async (
+  projectId: string,
+  pageId: string,
+  forceRegenerate: boolean = false,
+  onEvent?: (event: StreamEvent) => void
+): Promise<{ page: Page }> => {
+  return postEventStream(
+    `/api/projects/${projectId}/pages/${pageId}/generate/description/stream`,
+    { force_regenerate: forceRegenerate },
+    onEvent
+  );
+};
+
+/**
+ * 流式修改页面描述：description 事件在每页新描述完成时到达（含 page_id）
+ */
+export const refineDescriptionsStream = async (
+  projectId: string,
+  userRequirement: string,
+  previousRequirements?: string[],
+  onEvent?: (event: StreamEvent) => void
+): Promise<{ pages: Page[]; message: string }> => {
+  return postEventStream(
+    `/api/projects/${projectId}/refine/descriptions/stream`,
+    {
+      user_requirement: userRequirement,
+      previous_requirements: previousRequirements || []
+    },
+    onEvent
+  );
+};
+
 // ===== 导出 =====
 
+/**
+ * 导出结果：幻灯片未变化时直接返回已有文件的下载地址，否则返回导出任务ID
+ * （任务完成后 progress.download_url 为下载地址）
+ */
+export interface ExportResponse {
+  download_url?: string;
+  download_url_absolute?: string;
+  cached?: boolean;
+  task_id?: string;
+  status?: string;
+}
+
 /**
  * 导出为PPTX
  */
 export const exportPPTX = async (
   projectId: string
-): Promise<ApiResponse<{ download_url: string; download_url_absolute?: string }>> => {
+): Promise<ApiResponse<ExportResponse>> => {
   const response = await apiClient.get<
-    ApiResponse<{ download_url: string; download_url_absolute?: string }>
+    ApiResponse<ExportResponse>
   >(`/api/projects/${projectId}/export/pptx`);
   return response.data;
 };
@@ -383,9 +564,9 @@ export const exportPPTX = async (
  */
 export const exportPDF = async (
   projectId: string
-): Promise<ApiResponse<{ download_url: string; download_url_absolute?: string }>> => {
+): Promise<ApiResponse<ExportResponse>> => {
   const response = await apiClient.get<
-    ApiResponse<{ download_url: string; download_url_absolute?: string }>
+    ApiResponse<ExportResponse>
   >(`/api/projects/${projectId}/export/pdf`);
   return response.data;
 };
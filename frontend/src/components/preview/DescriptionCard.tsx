@@ -11,6 +11,7 @@ export interface DescriptionCardProps {
   onRegenerate: () => void;
   isGenerating?: boolean;
   isAiRefining?: boolean;
+  streamingText?: string; // 流式生成中已返回的描述文本
 }
 
 export const DescriptionCard: React.FC<DescriptionCardProps> = ({
@@ -20,6 +21,7 @@ export const DescriptionCard: React.FC<DescriptionCardProps> = ({
   onRegenerate,
   isGenerating = false,
   isAiRefining = false,
+  streamingText,
 }) => {
   // 从 description_content 提取文本内容
   const getDescriptionText = (descContent: DescriptionContent | undefined): string => {
@@ -77,7 +79,14 @@ export const DescriptionCard: React.FC<DescriptionCardProps> = ({
 
         {/* 内容 */}
         <div className="p-4 flex-1">
-          {generating ? (
+          {generating && streamingText ? (
+            <div className="text-sm text-gray-700 dark:text-gray-300">
+              <Markdown>{streamingText}</Markdown>
+              <div className="pt-2 text-xs text-gray-500 dark:text-gray-400 animate-pulse">
+                正在生成描述...
+              </div>
+            </div>
+          ) : generating ? (
             <div className="space-y-2">
               <Skeleton className="h-4 w-full" />
               <Skeleton className="h-4 w-full" />
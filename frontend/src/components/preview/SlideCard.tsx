@@ -1,7 +1,7 @@
 import React from 'react';
 import { Edit2, Trash2 } from 'lucide-react';
 import { StatusBadge, Skeleton, useConfirm } from '@/components/shared';
-import { getImageUrl } from '@/api/client';
+import { getThumbnailUrl } from '@/api/client';
 import type { Page } from '@/types';
 
 interface SlideCardProps {
@@ -25,7 +25,7 @@ export const SlideCard: React.FC<SlideCardProps> = ({
 }) => {
   const { confirm, ConfirmDialog } = useConfirm();
   const imageUrl = page.generated_image_path
-    ? getImageUrl(page.generated_image_path, page.updated_at)
+    ? getThumbnailUrl(page.generated_image_path, 640, page.updated_at)
     : '';
   
   const generating = isGenerating || page.status === 'GENERATING';
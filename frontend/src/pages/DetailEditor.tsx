@@ -4,7 +4,7 @@ import { ArrowLeft, ArrowRight, FileText, Sparkles } from 'lucide-react';
 import { Button, Loading, useToast, useConfirm, AiRefineInput } from '@/components/shared';
 import { DescriptionCard } from '@/components/preview/DescriptionCard';
 import { useProjectStore } from '@/store/useProjectStore';
-import { refineDescriptions } from '@/api/endpoints';
+import { refineDescriptions, refineDescriptionsStream, isStreamUnsupported } from '@/api/endpoints';
 
 export const DetailEditor: React.FC = () => {
   const navigate = useNavigate();
@@ -18,6 +18,9 @@ export const DetailEditor: React.FC = () => {
     generateDescriptions,
     generatePageDescription,
     pageDescriptionGeneratingTasks,
+    pageDescriptionStreams,
+    setPageDescriptionStream,
+    clearPageDescriptionStreams,
   } = useProjectStore();
   const { show, ToastContainer } = useToast();
   const { confirm, ConfirmDialog } = useConfirm();
@@ -45,7 +48,7 @@ export const DetailEditor: React.FC = () => {
     );
     
     const executeGenerate = async () => {
-      await generateDescriptions();
+      await generateDescriptions(hasDescriptions);
     };
     
     if (hasDescriptions) {
@@ -100,10 +103,23 @@ export const DetailEditor: React.FC = () => {
     if (!currentProject || !projectId) return;
     
     try {
-      const response = await refineDescriptions(projectId, requirement, previousRequirements);
+      // 流式修改：每页新描述完成时立即显示
+      let message: string | undefined;
+      try {
+        const result = await refineDescriptionsStream(projectId, requirement, previousRequirements, ({ event, data }) => {
+          if (event === 'description' && data.page_id) {
+            setPageDescriptionStream(data.page_id, data.text);
+          }
+        });
+        message = result.message;
+      } catch (error) {
+        if (!isStreamUnsupported(error)) throw error;
+        const response = await refineDescriptions(projectId, requirement, previousRequirements);
+        message = response.data?.message;
+      }
       await syncProject(projectId);
       show({ 
-        message: response.data?.message || '页面描述修改成功', 
+        message: message || '页面描述修改成功', 
         type: 'success' 
       });
     } catch (error: any) {
@@ -113,6 +129,8 @@ export const DetailEditor: React.FC = () => {
         || '修改失败，请稍后重试';
       show({ message: errorMessage, type: 'error' });
       throw error; // 抛出错误让组件知道失败了
+    } finally {
+      clearPageDescriptionStreams();
     }
   };
 
@@ -257,6 +275,7 @@ export const DetailEditor: React.FC = () => {
                     onRegenerate={() => handleRegeneratePage(pageId)}
                     isGenerating={pageId ? !!pageDescriptionGeneratingTasks[pageId] : false}
                     isAiRefining={isAiRefining}
+                    streamingText={pageId ? pageDescriptionStreams[pageId] : undefined}
                   />
                 );
               })}
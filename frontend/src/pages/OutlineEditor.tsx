@@ -65,6 +65,7 @@ export const OutlineEditor: React.FC = () => {
     addNewPage,
     generateOutline,
     isGlobalLoading,
+    isOutlineStreaming,
   } = useProjectStore();
 
   const [selectedPageId, setSelectedPageId] = useState<string | null>(null);
@@ -110,7 +111,7 @@ export const OutlineEditor: React.FC = () => {
         '已有大纲内容，重新生成将覆盖现有内容，确定继续吗？',
         async () => {
           try {
-            await generateOutline();
+            await generateOutline(true);
             // generateOutline 内部已经调用了 syncProject，这里不需要再次调用
           } catch (error) {
             console.error('生成大纲失败:', error);
@@ -281,6 +282,7 @@ export const OutlineEditor: React.FC = () => {
                 <Button
                   variant="secondary"
                   onClick={handleGenerateOutline}
+                  loading={isOutlineStreaming}
                   className="w-full sm:w-auto text-sm md:text-base hover:text-purple-600 hover:bg-purple-50 dark:hover:bg-purple-900/20 dark:hover:text-purple-400"
                 >
                   {currentProject.creation_type === 'outline' ? '解析大纲' : '自动生成大纲'}
@@ -289,6 +291,7 @@ export const OutlineEditor: React.FC = () => {
                 <Button
                   variant="secondary"
                   onClick={handleGenerateOutline}
+                  loading={isOutlineStreaming}
                   className="w-full sm:w-auto text-sm md:text-base hover:text-purple-600 hover:bg-purple-50 dark:hover:bg-purple-900/20 dark:hover:text-purple-400"
                 >
                   {currentProject.creation_type === 'outline' ? '重新解析大纲' : '重新生成大纲'}
@@ -336,7 +339,7 @@ export const OutlineEditor: React.FC = () => {
                         onDelete={() => page.id && deletePageById(page.id)}
                         onClick={() => setSelectedPageId(page.id || null)}
                         isSelected={selectedPageId === page.id}
-                        isAiRefining={isAiRefining}
+                        isAiRefining={isAiRefining || isOutlineStreaming}
                       />
                     ))}
                   </div>
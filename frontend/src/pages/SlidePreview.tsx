@@ -25,7 +25,7 @@ import type { Material } from '@/api/endpoints';
 import { SlideCard } from '@/components/preview/SlideCard';
 import { useProjectStore } from '@/store/useProjectStore';
 import { useAuthStore } from '@/store/useAuthStore';
-import { getImageUrl } from '@/api/client';
+import { getImageUrl, getThumbnailUrl } from '@/api/client';
 import { getPageImageVersions, setCurrentImageVersion, updateProject, uploadTemplate } from '@/api/endpoints';
 import type { ImageVersion, DescriptionContent } from '@/types';
 import { normalizeErrorMessage } from '@/utils';
@@ -855,7 +855,7 @@ export const SlidePreview: React.FC = () => {
                   >
                     {page.generated_image_path ? (
                       <img
-                        src={getImageUrl(page.generated_image_path, page.updated_at)}
+                        src={getThumbnailUrl(page.generated_image_path, 160, page.updated_at)}
                         alt={`Slide ${index + 1}`}
                         className="w-full h-full object-cover rounded"
                       />
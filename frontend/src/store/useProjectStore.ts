@@ -1,9 +1,58 @@
 import { create } from 'zustand';
-import type { Project, Task } from '@/types';
+import type { Page, Project, Task } from '@/types';
 import * as api from '@/api/endpoints';
 import { debounce, normalizeProject, normalizeErrorMessage } from '@/utils';
 import { useAuthStore } from './useAuthStore';
 
+type TaskEventResult = { status: 'COMPLETED' | 'FAILED'; error?: string };
+
+/**
+ * 通过 SSE 监听任务事件，直到任务结束
+ * 返回最终状态；浏览器不支持或连接失败时返回 null，由调用方回退到轮询
+ */
+const watchTaskEvents = (
+  projectId: string,
+  taskId: string,
+  onEvent: (type: string, data: any) => void
+): Promise<TaskEventResult | null> => new Promise((resolve) => {
+  if (typeof EventSource === 'undefined') {
+    resolve(null);
+    return;
+  }
+
+  const source = api.subscribeTaskEvents(projectId, taskId);
+  let received = false;
+  const finish = (result: TaskEventResult | null) => {
+    source.close();
+    resolve(result);
+  };
+
+  const eventTypes = [
+    'snapshot', 'task_started', 'page_started', 'description_ready',
+    'image_ready', 'page_failed', 'progress', 'task_completed', 'task_failed',
+  ];
+  eventTypes.forEach((type) => {
+    source.addEventListener(type, (event) => {
+      received = true;
+      const data = JSON.parse((event as MessageEvent).data || '{}');
+      onEvent(type, data);
+
+      if (type === 'task_completed' || (type === 'snapshot' && data.status === 'COMPLETED')) {
+        finish({ status: 'COMPLETED' });
+      } else if (type === 'task_failed' || (type === 'snapshot' && data.status === 'FAILED')) {
+        finish({ status: 'FAILED', error: data.error || data.error_message });
+      }
+    });
+  });
+
+  // 断线后 EventSource 会带 Last-Event-ID 自动重连；从未连上或被服务端拒绝时回退到轮询
+  source.onerror = () => {
+    if (!received || source.readyState === EventSource.CLOSED) {
+      finish(null);
+    }
+  };
+});
+
 interface ProjectState {
   // 状态
   currentProject: Project | null;
@@ -15,10 +64,16 @@ interface ProjectState {
   pageGeneratingTasks: Record<string, string>;
   // 每个页面的描述生成状态 (pageId -> boolean)
   pageDescriptionGeneratingTasks: Record<string, boolean>;
+  // 流式生成中的描述文本 (pageId -> 已生成的文本)
+  pageDescriptionStreams: Record<string, string>;
+  // 大纲正在流式生成（页面逐个出现，尚未保存）
+  isOutlineStreaming: boolean;
 
   // Actions
   setCurrentProject: (project: Project | null) => void;
   setGlobalLoading: (loading: boolean) => void;
+  setPageDescriptionStream: (pageId: string, text: string | null) => void;
+  clearPageDescriptionStreams: () => void;
   setError: (error: string | null) => void;
   
   // 项目操作
@@ -37,9 +92,9 @@ interface ProjectState {
   pollTask: (taskId: string) => Promise<void>;
   
   // 生成操作
-  generateOutline: () => Promise<void>;
+  generateOutline: (forceRegenerate?: boolean) => Promise<void>;
   generateFromDescription: () => Promise<void>;
-  generateDescriptions: () => Promise<void>;
+  generateDescriptions: (forceRegenerate?: boolean) => Promise<void>;
   generatePageDescription: (pageId: string) => Promise<void>;
   generateImages: (options?: { limit?: number }) => Promise<void>;
   generatePageImage: (pageId: string, forceRegenerate?: boolean) => Promise<void>;
@@ -59,6 +114,45 @@ interface ProjectState {
 }
 
 export const useProjectStore = create<ProjectState>((set, get) => {
+  // 导出：已有相同内容的导出时直接下载，否则等待导出任务完成后下载
+  const runExport = async (
+    projectId: string,
+    apiCall: () => Promise<{ data?: api.ExportResponse }>
+  ) => {
+    set({ isGlobalLoading: true, error: null });
+    try {
+      const response = await apiCall();
+      let downloadUrl =
+        response.data?.download_url_absolute || response.data?.download_url;
+
+      const taskId = response.data?.task_id;
+      if (!downloadUrl && taskId) {
+        const streamed = await watchTaskEvents(projectId, taskId, () => {});
+        let task = (await api.getTaskStatus(projectId, taskId)).data;
+        // SSE 不可用时回退到轮询
+        while (!streamed && task && (task.status === 'PENDING' || task.status === 'PROCESSING')) {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          task = (await api.getTaskStatus(projectId, taskId)).data;
+        }
+        if (task?.status !== 'COMPLETED') {
+          throw new Error(task?.error_message || streamed?.error || '导出失败');
+        }
+        downloadUrl = task.progress?.download_url;
+      }
+
+      if (!downloadUrl) {
+        throw new Error('导出链接获取失败');
+      }
+
+      // 使用浏览器直接下载链接，避免 axios 受带宽和超时影响
+      window.open(downloadUrl, '_blank');
+    } catch (error: any) {
+      set({ error: normalizeErrorMessage(error.message || '导出失败') });
+    } finally {
+      set({ isGlobalLoading: false });
+    }
+  };
+
   const getProjectStorageKey = () => {
     const uid = useAuthStore.getState().currentUser?.user_id;
     return uid ? `currentProjectId:${uid}` : null;
@@ -99,10 +193,22 @@ const debouncedUpdatePage = debounce(
   error: null,
   pageGeneratingTasks: {},
   pageDescriptionGeneratingTasks: {},
+  pageDescriptionStreams: {},
+  isOutlineStreaming: false,
 
   // Setters
   setCurrentProject: (project) => set({ currentProject: project }),
   setGlobalLoading: (loading) => set({ isGlobalLoading: loading }),
+  setPageDescriptionStream: (pageId, text) => {
+    const streams = { ...get().pageDescriptionStreams };
+    if (text === null) {
+      delete streams[pageId];
+    } else {
+      streams[pageId] = text;
+    }
+    set({ pageDescriptionStreams: streams });
+  },
+  clearPageDescriptionStreams: () => set({ pageDescriptionStreams: {} }),
   setError: (error) => set({ error }),
 
   // 初始化项目
@@ -364,6 +470,30 @@ const debouncedUpdatePage = debounce(
       return;
     }
 
+    // 优先通过 SSE 接收进度推送，连接不可用时回退到轮询
+    const streamed = await watchTaskEvents(currentProject.id!, taskId, (type, data) => {
+      if (type === 'progress' || (type === 'snapshot' && data.progress)) {
+        const progress = type === 'progress' ? data : data.progress;
+        set({ taskProgress: { total: progress.total, completed: progress.completed } });
+      }
+    });
+    if (streamed) {
+      if (streamed.status === 'COMPLETED') {
+        console.log(`[SSE] Task ${taskId} 已完成，刷新项目数据`);
+        set({ activeTaskId: null, taskProgress: null, isGlobalLoading: false });
+        await get().syncProject();
+      } else {
+        console.error(`[SSE] Task ${taskId} 失败:`, streamed.error);
+        set({
+          error: normalizeErrorMessage(streamed.error || '任务失败'),
+          activeTaskId: null,
+          taskProgress: null,
+          isGlobalLoading: false
+        });
+      }
+      return;
+    }
+
     const poll = async () => {
       try {
         console.log(`[轮询] 查询任务状态: ${taskId}`);
@@ -428,14 +558,42 @@ const debouncedUpdatePage = debounce(
   },
 
   // 生成大纲（同步操作，不需要轮询）
-  generateOutline: async () => {
+  generateOutline: async (forceRegenerate = false) => {
     const { currentProject } = get();
     if (!currentProject) return;
 
     set({ isGlobalLoading: true, error: null });
     try {
-      const response = await api.generateOutline(currentProject.id!);
-      console.log('[生成大纲] API响应:', response);
+      // 流式生成：每页大纲一完成就显示出来（临时页面没有 id，保存前不可编辑）
+      let streamedPages: Page[] = [];
+      try {
+        const response = await api.generateOutlineStream(currentProject.id!, forceRegenerate, ({ event, data }) => {
+          if (event !== 'page') return;
+          streamedPages = [
+            ...streamedPages,
+            {
+              page_id: '',
+              order_index: data.index,
+              part: data.page.part,
+              outline_content: { title: data.page.title, points: data.page.points || [] },
+              status: 'DRAFT',
+            },
+          ];
+          const { currentProject: project } = get();
+          if (project) {
+            set({
+              currentProject: { ...project, pages: streamedPages },
+              isGlobalLoading: false,
+              isOutlineStreaming: true,
+            });
+          }
+        });
+        console.log('[生成大纲] 流式生成完成:', response.pages.length, '个页面');
+      } catch (error) {
+        if (!api.isStreamUnsupported(error)) throw error;
+        const response = await api.generateOutline(currentProject.id!, forceRegenerate);
+        console.log('[生成大纲] API响应:', response);
+      }
       
       // 刷新项目数据，确保获取最新的大纲页面
       await get().syncProject();
@@ -446,9 +604,13 @@ const debouncedUpdatePage = debounce(
     } catch (error: any) {
       console.error('[生成大纲] 错误:', error);
       set({ error: error.message || '生成大纲失败' });
+      // 丢弃未保存的临时页面
+      if (get().isOutlineStreaming) {
+        await get().syncProject().catch(() => {});
+      }
       throw error;
     } finally {
-      set({ isGlobalLoading: false });
+      set({ isGlobalLoading: false, isOutlineStreaming: false });
     }
   },
 
@@ -478,7 +640,7 @@ const debouncedUpdatePage = debounce(
   },
 
   // 生成描述（使用异步任务，实时显示进度）
-  generateDescriptions: async () => {
+  generateDescriptions: async (forceRegenerate = false) => {
     const { currentProject } = get();
     if (!currentProject || !currentProject.id) return;
 
@@ -503,7 +665,7 @@ const debouncedUpdatePage = debounce(
         throw new Error('项目ID不存在');
       }
       
-      const response = await api.generateDescriptions(projectId);
+      const response = await api.generateDescriptions(projectId, forceRegenerate);
       const taskId = response.data?.task_id;
       
       if (!taskId) {
@@ -614,8 +776,18 @@ const debouncedUpdatePage = debounce(
       // 立即同步一次项目数据，以更新页面状态
       await get().syncProject();
       
-      // 传递 force_regenerate=true 以允许重新生成已有描述
-      await api.generatePageDescription(currentProject.id, pageId, true);
+      // 传递 force_regenerate=true 以允许重新生成已有描述；流式生成时逐步显示文本
+      let streamedText = '';
+      try {
+        await api.generatePageDescriptionStream(currentProject.id, pageId, true, ({ event, data }) => {
+          if (event !== 'delta') return;
+          streamedText += data.text;
+          get().setPageDescriptionStream(pageId, streamedText);
+        });
+      } catch (error) {
+        if (!api.isStreamUnsupported(error)) throw error;
+        await api.generatePageDescription(currentProject.id, pageId, true);
+      }
       
       // 刷新项目数据
       await get().syncProject();
@@ -628,6 +800,7 @@ const debouncedUpdatePage = debounce(
       const newTasks = { ...currentTasks };
       delete newTasks[pageId];
       set({ pageDescriptionGeneratingTasks: newTasks });
+      get().setPageDescriptionStream(pageId, null);
     }
   },
 
@@ -794,47 +967,13 @@ const debouncedUpdatePage = debounce(
   exportPPTX: async () => {
     const { currentProject } = get();
     if (!currentProject) return;
-
-    set({ isGlobalLoading: true, error: null });
-    try {
-      const response = await api.exportPPTX(currentProject.id);
-      const downloadUrl =
-        response.data?.download_url_absolute || response.data?.download_url;
-
-      if (!downloadUrl) {
-        throw new Error('导出链接获取失败');
-      }
-
-      // 使用浏览器直接下载链接，避免 axios 受带宽和超时影响
-      window.open(downloadUrl, '_blank');
-    } catch (error: any) {
-      set({ error: error.message || '导出失败' });
-    } finally {
-      set({ isGlobalLoading: false });
-    }
+    await runExport(currentProject.id!, () => api.exportPPTX(currentProject.id!));
   },
 
   // 导出PDF
   exportPDF: async () => {
     const { currentProject } = get();
     if (!currentProject) return;
-
-    set({ isGlobalLoading: true, error: null });
-    try {
-      const response = await api.exportPDF(currentProject.id);
-      const downloadUrl =
-        response.data?.download_url_absolute || response.data?.download_url;
-
-      if (!downloadUrl) {
-        throw new Error('导出链接获取失败');
-      }
-
-      // 使用浏览器直接下载链接，避免 axios 受带宽和超时影响
-      window.open(downloadUrl, '_blank');
-    } catch (error: any) {
-      set({ error: error.message || '导出失败' });
-    } finally {
-      set({ isGlobalLoading: false });
-    }
+    await runExport(currentProject.id!, () => api.exportPDF(currentProject.id!));
   },
 };});
@@ -42,6 +42,7 @@ export interface Page {
   part?: string; // 章节名
   outline_content: OutlineContent;
   description_content?: DescriptionContent;
+  has_description?: boolean; // 项目列表只返回页面摘要，用它代替 description_content
   generated_image_url?: string; // 后端返回 generated_image_url
   generated_image_path?: string; // 前端使用的别名
   status: PageStatus;
@@ -70,6 +71,21 @@ export interface Project {
 // 任务状态
 export type TaskStatus = 'PENDING' | 'RUNNING' | 'COMPLETED' | 'FAILED';
 
+// 模型调用统计
+export interface TaskMetricTotals {
+  calls: number;
+  errors: number;
+  retries: number;
+  duration_seconds: number;
+  prompt_tokens: number;
+  response_tokens: number;
+  request_bytes: number;
+}
+
+export interface TaskMetrics extends TaskMetricTotals {
+  by_model: Record<string, TaskMetricTotals>;
+}
+
 // 任务信息
 export interface Task {
   task_id: string;
@@ -85,6 +101,7 @@ export interface Task {
   error_message?: string;
   result?: any;
   error?: string; // 别名
+  metrics?: TaskMetrics | null; // 该任务所有模型调用的汇总
   created_at?: string;
   completed_at?: string;
 }
@@ -1,4 +1,4 @@
-import { getImageUrl } from '@/api/client';
+import { getThumbnailUrl } from '@/api/client';
 import type { Project } from '@/types';
 
 /**
@@ -29,7 +29,7 @@ export const getProjectTitle = (project: Project): string => {
 };
 
 /**
- * 获取第一页图片URL
+ * 获取第一页图片URL（缩略图）
  */
 export const getFirstPageImage = (project: Project): string | null => {
   if (!project.pages || project.pages.length === 0) {
@@ -39,7 +39,7 @@ export const getFirstPageImage = (project: Project): string | null => {
   // 找到第一页有图片的页面
   const firstPageWithImage = project.pages.find(p => p.generated_image_path);
   if (firstPageWithImage?.generated_image_path) {
-    return getImageUrl(firstPageWithImage.generated_image_path, firstPageWithImage.updated_at);
+    return getThumbnailUrl(firstPageWithImage.generated_image_path, 640, firstPageWithImage.updated_at);
   }
   
   return null;
@@ -70,7 +70,7 @@ export const getStatusText = (project: Project): string => {
   if (hasImages) {
     return '已完成';
   }
-  const hasDescriptions = project.pages.some(p => p.description_content);
+  const hasDescriptions = project.pages.some(p => p.description_content || p.has_description);
   if (hasDescriptions) {
     return '待生成图片';
   }
@@ -100,7 +100,7 @@ export const getProjectRoute = (project: Project): string => {
     if (hasImages) {
       return `/project/${projectId}/preview`;
     }
-    const hasDescriptions = project.pages.some(p => p.description_content);
+    const hasDescriptions = project.pages.some(p => p.description_content || p.has_description);
     if (hasDescriptions) {
       return `/project/${projectId}/detail`;
     }
@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+"""
+离线压测 - 用假的 Gemini 后端跑完整的 PPT 生成流程
+
+启动 tests/fake_gemini.py（子进程）和 create_app()（临时数据库和上传目录，本进程内的
+多线程 WSGI 服务），N 个并发用户各自走一遍 想法 → 大纲 → 描述 → 图片 → 编辑一页 → 导出，
+最后输出每一步的 p50/p95/p99 延迟、吞吐、数据库提交次数、峰值 RSS 和线程数。
+不需要 API Key，也不会访问外网。
+
+    python tests/benchmark_flow.py --users 10 --outline-pages 8 --image-latency lognormal:6,0.6
+    python tests/benchmark_flow.py --users 20 --error-rate 0.05 --pipeline deck --json report.json
+
+延迟分布写法见 tests/fake_gemini.py。后端的其它配置（如 AI_ASYNC_ENABLED、
+GLOBAL_AI_CONCURRENCY、AI_RATE_LIMITS）照常从环境变量读取。结束后限流器仍有占用的并发槽
+（例如被取消的对冲请求没有归还）时视为失败，可以这样检查对冲：
+
+    IMAGE_HEDGING_ENABLED=true IMAGE_HEDGE_MIN_SAMPLES=3 IMAGE_HEDGE_MIN_DELAY=0 \
+        python tests/benchmark_flow.py --users 4 --image-latency lognormal:0.5,0.8
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import requests
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_gemini import add_arguments
+
+STEPS = ['register', 'create_project', 'outline', 'template', 'descriptions', 'images', 'deck',
+         'edit_image', 'export_pptx', 'export_pdf', 'flow']
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def read_proc_status():
+    """(RSS bytes, OS thread count) of this process, from /proc where available"""
+    rss, threads = None, None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+    except OSError:
+        pass
+    if rss is None:
+        # ru_maxrss: KB on Linux, bytes on macOS (peak instead of current, better than nothing)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = maxrss if sys.platform == 'darwin' else maxrss * 1024
+    return rss, threads
+
+
+class ResourceSampler:
+    """Samples RSS and thread counts in the background and keeps the peaks"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_os_threads = 0
+        self.peak_python_threads = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='bench-sampler', daemon=True)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.sample()
+            self.stop_event.wait(self.interval)
+
+    def sample(self):
+        rss, os_threads = read_proc_status()
+        self.peak_rss = max(self.peak_rss, rss or 0)
+        self.peak_os_threads = max(self.peak_os_threads, os_threads or 0)
+        self.peak_python_threads = max(self.peak_python_threads, threading.active_count())
+
+    def start(self):
+        self.sample()
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+
+
+class FlowResult:
+    def __init__(self, user: int):
+        self.user = user
+        self.durations = {}  # step -> seconds
+        self.requests = 0
+        self.pages = 0
+        self.model_calls = 0
+        self.model_retries = 0
+        self.error = None
+
+
+class BenchmarkUser:
+    """One user walking through the whole flow against the served app"""
+
+    def __init__(self, index: int, base_url: str, args, template_png: bytes, run_id: str):
+        self.index = index
+        self.base_url = base_url
+        self.args = args
+        self.template_png = template_png
+        self.run_id = run_id
+        self.session = requests.Session()
+        self.result = FlowResult(index)
+
+    def request(self, method: str, path: str, **kwargs):
+        self.result.requests += 1
+        response = self.session.request(method, self.base_url + path, timeout=self.args.timeout, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} -> {response.status_code}: {response.text[:200]}")
+        return response
+
+    def timed(self, step: str, fn):
+        started = time.perf_counter()
+        value = fn()
+        self.result.durations[step] = time.perf_counter() - started
+        return value
+
+    def wait_task(self, project_id: str, task_id: str):
+        """Poll a background task until it finishes, return its final state"""
+        deadline = time.monotonic() + self.args.timeout
+        while time.monotonic() < deadline:
+            task = self.request('GET', f'/api/projects/{project_id}/tasks/{task_id}').json()['data']
+            if task['status'] in ('COMPLETED', 'FAILED'):
+                metrics = task.get('metrics') or {}
+                self.result.model_calls += metrics.get('calls', 0)
+                self.result.model_retries += metrics.get('retries', 0)
+                if task['status'] == 'FAILED':
+                    raise RuntimeError(f"Task {task_id} failed: {task.get('error_message')}")
+                progress = task.get('progress') or {}
+                if progress.get('failed'):
+                    raise RuntimeError(f"Task {task_id} finished with {progress['failed']} failed pages")
+                return task
+            time.sleep(self.args.poll_interval)
+        raise TimeoutError(f"Task {task_id} did not finish within {self.args.timeout}s")
+
+    def run_task(self, project_id: str, path: str, body: dict):
+        task_id = self.request('POST', f'/api/projects/{project_id}{path}', json=body).json()['data']['task_id']
+        return self.wait_task(project_id, task_id)
+
+    def export(self, project_id: str, kind: str):
+        data = self.request('GET', f'/api/projects/{project_id}/export/{kind}').json()['data']
+        download_url = data.get('download_url')
+        if not download_url:
+            # 幻灯片变化后导出在后台任务中生成
+            download_url = self.wait_task(project_id, data['task_id'])['progress']['download_url']
+        # 把文件也下载下来，和真实用户一样
+        self.request('GET', download_url)
+
+    def run(self) -> FlowResult:
+        started = time.perf_counter()
+        try:
+            email = f'bench-{self.run_id}-{self.index}@example.com'
+
+            def register():
+                token = self.request('POST', '/api/auth/register',
+                                     json={'email': email, 'password': 'benchmark'}).json()['data']['token']
+                self.session.headers['Authorization'] = f'Bearer {token}'
+                # 导出仅对 Pro 用户开放
+                self.request('POST', '/api/auth/upgrade', json={'plan': 'monthly'})
+            self.timed('register', register)
+
+            project_id = self.timed('create_project', lambda: self.request('POST', '/api/projects', json={
+                'creation_type': 'idea',
+                'idea_prompt': f'生成一份关于压测第{self.index}号用户的PPT',
+            }).json()['data']['project_id'])
+
+            pages = self.timed('outline', lambda: self.request(
+                'POST', f'/api/projects/{project_id}/generate/outline', json={}
+            ).json()['data']['pages'])
+            self.result.pages = len(pages)
+
+            self.timed('template', lambda: self.request(
+                'POST', f'/api/projects/{project_id}/template',
+                files={'template_image': ('template.png', self.template_png, 'image/png')}
+            ))
+
+            if self.args.pipeline == 'deck':
+                self.timed('deck', lambda: self.run_task(project_id, '/generate/deck', {}))
+            else:
+                self.timed('descriptions', lambda: self.run_task(project_id, '/generate/descriptions', {}))
+                self.timed('images', lambda: self.run_task(project_id, '/generate/images', {}))
+
+            if not self.args.skip_edit:
+                # 单页编辑（不带额外参考图），任务失败时 wait_task 会抛出异常
+                self.timed('edit_image', lambda: self.run_task(
+                    project_id, f"/pages/{pages[0]['page_id']}/edit/image",
+                    {'edit_instruction': '把标题改成蓝色'}
+                ))
+
+            if not self.args.skip_export:
+                self.timed('export_pptx', lambda: self.export(project_id, 'pptx'))
+                self.timed('export_pdf', lambda: self.export(project_id, 'pdf'))
+
+            self.result.durations['flow'] = time.perf_counter() - started
+        except Exception as e:
+            self.result.error = f"{type(e).__name__}: {e}"
+        return self.result
+
+
+def start_fake_gemini(args):
+    """Run tests/fake_gemini.py in a child process (its threads and memory stay out of the numbers)"""
+    command = [
+        sys.executable, str(Path(__file__).parent / 'fake_gemini.py'), '--port', '0',
+        '--text-latency', args.text_latency, '--image-latency', args.image_latency,
+        '--error-rate', str(args.error_rate), '--error-codes', args.error_codes,
+        '--image-size', args.image_size, '--outline-pages', str(args.outline_pages),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    url = process.stdout.readline().strip()
+    if not url.startswith('http'):
+        process.kill()
+        raise RuntimeError("Fake Gemini server did not start")
+    return process, url
+
+
+def build_app(fake_url: str, workdir: str):
+    """create_app() on a temporary database and upload folder, pointed at the fake backend"""
+    os.environ['GOOGLE_API_KEY'] = 'fake-key'
+    os.environ['GOOGLE_API_BASE'] = fake_url
+    os.environ['FLASK_ENV'] = 'production'
+    # 模块级的 app 也会初始化，避免它去恢复真实数据库里的任务
+    os.environ['TASK_RECOVERY_ENABLED'] = 'false'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from app import create_app
+
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'database.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'GOOGLE_API_KEY': 'fake-key',
+        'GOOGLE_API_BASE': fake_url,
+        'TASK_RECOVERY_ENABLED': False,
+        # 每个用户的 prompt 都不同，但缓存仍会让重复运行失真；假后端也不支持上传和上下文缓存
+        'RESPONSE_CACHE_ENABLED': False,
+        'CONTEXT_CACHE_ENABLED': False,
+        'FILE_UPLOAD_ENABLED': False,
+    })
+
+
+def count_commits(app):
+    """Count DB transaction commits of the app's engine"""
+    from sqlalchemy import event
+    from models import db
+
+    counter = {'commits': 0}
+    lock = threading.Lock()
+
+    def on_commit(conn):
+        with lock:
+            counter['commits'] += 1
+
+    with app.app_context():
+        event.listen(db.engine, 'commit', on_commit)
+    return counter
+
+
+def make_template_png(size=(1376, 768)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (250, 204, 21)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def get_limiter_state():
+    """Rate limiter slots still held after the run (hedge losers included) and hedging stats"""
+    from services.rate_limiter import rate_limiters
+    from services.hedging import image_hedging
+
+    in_flight = {model: state['in_flight'] for model, state in rate_limiters.snapshot().items()}
+    return {'in_flight': in_flight, 'hedging': image_hedging.snapshot()}
+
+
+def summarize(results, wall_seconds, commits, sampler, fake_stats, limiter_state, args):
+    ok = [r for r in results if r.error is None]
+    steps = {}
+    for step in STEPS:
+        samples = [r.durations[step] for r in ok if step in r.durations]
+        if samples:
+            steps[step] = {
+                'count': len(samples),
+                'mean': sum(samples) / len(samples),
+                'p50': percentile(samples, 0.5),
+                'p95': percentile(samples, 0.95),
+                'p99': percentile(samples, 0.99),
+                'max': max(samples),
+            }
+    pages = sum(r.pages for r in ok)
+    requests_total = sum(r.requests for r in results)
+    return {
+        'config': {
+            'users': args.users, 'pipeline': args.pipeline, 'outline_pages': args.outline_pages,
+            'text_latency': args.text_latency, 'image_latency': args.image_latency,
+            'error_rate': args.error_rate, 'image_size': args.image_size,
+            'async': os.getenv('AI_ASYNC_ENABLED', 'true'),
+        },
+        'flows': {'completed': len(ok), 'failed': len(results) - len(ok),
+                  'errors': [f"user {r.user}: {r.error}" for r in results if r.error]},
+        'wall_seconds': wall_seconds,
+        'throughput': {
+            'decks_per_minute': len(ok) / wall_seconds * 60 if wall_seconds else 0,
+            'pages_per_second': pages / wall_seconds if wall_seconds else 0,
+            'api_requests_per_second': requests_total / wall_seconds if wall_seconds else 0,
+        },
+        'steps': steps,
+        'db_commits': {'total': commits['commits'],
+                       'per_deck': commits['commits'] / len(ok) if ok else None,
+                       'per_page': commits['commits'] / pages if pages else None},
+        'resources': {'peak_rss_mb': sampler.peak_rss / 1024 / 1024,
+                      'peak_os_threads': sampler.peak_os_threads,
+                      'peak_python_threads': sampler.peak_python_threads,
+                      'final_python_threads': threading.active_count()},
+        'model': {'calls_reported_by_tasks': sum(r.model_calls for r in ok),
+                  'retries_reported_by_tasks': sum(r.model_retries for r in ok),
+                  'fake_backend': fake_stats,
+                  'in_flight_after': limiter_state['in_flight'],
+                  'hedging': limiter_state['hedging']},
+    }
+
+
+def print_report(report):
+    config = report['config']
+    print()
+    print("=" * 78)
+    print(f"🍌 压测结果: {config['users']} 个用户, 每份 {config['outline_pages']} 页, "
+          f"pipeline={config['pipeline']}, async={config['async']}")
+    print(f"   文本延迟 {config['text_latency']}, 图片延迟 {config['image_latency']}, "
+          f"错误率 {config['error_rate']}, 图片 {config['image_size']}")
+    print("=" * 78)
+    print(f"{'step':<16}{'n':>5}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for step, s in report['steps'].items():
+        print(f"{step:<16}{s['count']:>5}{s['mean']:>10.3f}{s['p50']:>10.3f}"
+              f"{s['p95']:>10.3f}{s['p99']:>10.3f}{s['max']:>10.3f}")
+    print("-" * 78)
+    flows, throughput = report['flows'], report['throughput']
+    print(f"完成 {flows['completed']} / 失败 {flows['failed']}, 总耗时 {report['wall_seconds']:.2f}s")
+    print(f"吞吐: {throughput['decks_per_minute']:.2f} 份/分钟, {throughput['pages_per_second']:.2f} 页/秒, "
+          f"{throughput['api_requests_per_second']:.1f} 请求/秒")
+    commits = report['db_commits']
+    per_deck = f"{commits['per_deck']:.1f}" if commits['per_deck'] is not None else '-'
+    per_page = f"{commits['per_page']:.1f}" if commits['per_page'] is not None else '-'
+    print(f"数据库提交: {commits['total']} 次 (每份 {per_deck}, 每页 {per_page})")
+    res = report['resources']
+    print(f"峰值 RSS: {res['peak_rss_mb']:.1f} MB, 峰值线程: {res['peak_os_threads']} (OS) / "
+          f"{res['peak_python_threads']} (Python), 结束时 Python 线程: {res['final_python_threads']}")
+    model = report['model']
+    fake = model['fake_backend'] or {}
+    print(f"模型调用: 任务统计 {model['calls_reported_by_tasks']} 次 (重试 {model['retries_reported_by_tasks']}), "
+          f"假后端收到 {sum((fake.get('requests') or {}).values())} 次, 注入错误 {fake.get('errors', 0)} 次")
+    hedging = model['hedging']
+    if hedging['enabled']:
+        print(f"对冲: {hedging['hedged']} 次, 对冲请求胜出 {hedging['hedge_wins']} 次, "
+              f"预算用尽 {hedging['budget_exhausted']} 次")
+    leaked = {m: n for m, n in model['in_flight_after'].items() if n}
+    if leaked:
+        print(f"  ❌ 结束后限流器仍占用并发槽: {leaked}")
+    for error in flows['errors'][:10]:
+        print(f"  ❌ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the full generation flow')
+    parser.add_argument('--users', type=int, default=5, help='并发用户数')
+    parser.add_argument('--pipeline', choices=['steps', 'deck'], default='steps',
+                        help='steps: 描述和图片分两个任务; deck: /generate/deck 流水线')
+    parser.add_argument('--skip-edit', action='store_true', help='不测单页编辑')
+    parser.add_argument('--skip-export', action='store_true', help='不测导出')
+    parser.add_argument('--poll-interval', type=float, default=0.2, help='任务轮询间隔（秒）')
+    parser.add_argument('--timeout', type=float, default=600, help='单个请求/任务的超时（秒）')
+    parser.add_argument('--json', help='把结果写入 JSON 文件')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留临时数据库和上传目录')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from werkzeug.serving import make_server
+
+    workdir = tempfile.mkdtemp(prefix='banana-bench-')
+    fake_process, fake_url = start_fake_gemini(args)
+    server = None
+    try:
+        app = build_app(fake_url, workdir)
+        commits = count_commits(app)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        print(f"App: {base_url}, fake Gemini: {fake_url}, workdir: {workdir}")
+
+        template_png = make_template_png()
+        run_id = uuid.uuid4().hex[:8]
+        users = [BenchmarkUser(i, base_url, args, template_png, run_id) for i in range(args.users)]
+        results = [None] * len(users)
+
+        def run_user(i):
+            results[i] = users[i].run()
+
+        threads = [threading.Thread(target=run_user, args=(i,), name=f'bench-user-{i}')
+                   for i in range(len(users))]
+        sampler = ResourceSampler()
+        commits['commits'] = 0
+        sampler.start()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - started
+        sampler.stop()
+
+        try:
+            fake_stats = requests.get(f"{fake_url}/stats", timeout=5).json()
+        except requests.RequestException:
+            fake_stats = None
+
+        report = summarize(results, wall_seconds, commits, sampler, fake_stats, get_limiter_state(), args)
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        leaked = any(report['model']['in_flight_after'].values())
+        return 0 if report['flows']['failed'] == 0 and not leaked else 1
+    finally:
+        if server is not None:
+            server.shutdown()
+        fake_process.terminate()
+        fake_process.wait()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
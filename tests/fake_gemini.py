@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+"""
+假的 Gemini 服务 - 离线压测用的本地模型后端
+
+实现 generateContent / streamGenerateContent 两个 REST 接口，按请求内容返回
+大纲、批量/单页描述和图片，延迟、错误率和图片尺寸都可配置。
+把后端的 GOOGLE_API_BASE 指向它即可在不消耗配额的情况下跑完整流程：
+
+    python tests/fake_gemini.py --port 8090 --image-latency lognormal:8,0.5
+    GOOGLE_API_BASE=http://127.0.0.1:8090 GOOGLE_API_KEY=fake python backend/app.py
+
+延迟分布写法：fixed:<秒>、uniform:<最小>,<最大>、lognormal:<中位数>,<sigma>
+GET /stats 返回按模型统计的请求数和注入的错误数。
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from PIL import Image
+
+_MODEL_PATH = re.compile(r'/models/([^/:]+):(generateContent|streamGenerateContent)$')
+_BATCH_PAGE = re.compile(r'^- page (\d+)', re.MULTILINE)
+_SINGLE_PAGE = re.compile(r'generate the description for page (\d+)')
+
+_ERROR_STATUS = {429: 'RESOURCE_EXHAUSTED', 500: 'INTERNAL', 503: 'UNAVAILABLE'}
+
+
+class LatencyDistribution:
+    """Seconds to wait before answering, parsed from 'fixed:0.5', 'uniform:1,3' or 'lognormal:8,0.5'"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, args = spec.partition(':')
+        values = [float(v) for v in args.split(',') if v.strip()] if args else []
+        if kind == 'fixed' and len(values) == 1:
+            self.sample = lambda: values[0]
+        elif kind == 'uniform' and len(values) == 2:
+            self.sample = lambda: random.uniform(values[0], values[1])
+        elif kind == 'lognormal' and len(values) == 2:
+            # 以中位数和 sigma 描述，长尾更接近真实的图片生成延迟
+            self.sample = lambda: random.lognormvariate(math.log(values[0]), values[1])
+        else:
+            raise ValueError(f"Invalid latency distribution: {spec}")
+
+    def __repr__(self):
+        return self.spec
+
+
+class FakeGemini:
+    """Answers and fault injection shared by all request handlers"""
+
+    def __init__(self, text_latency: str = 'lognormal:0.8,0.4', image_latency: str = 'lognormal:4,0.5',
+                 error_rate: float = 0.0, error_codes=(429, 503), image_size=(1376, 768),
+                 outline_pages: int = 6, stream_chunks: int = 8):
+        self.text_latency = LatencyDistribution(text_latency)
+        self.image_latency = LatencyDistribution(image_latency)
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.outline_pages = outline_pages
+        self.stream_chunks = max(1, stream_chunks)
+        self.images = self._make_images(image_size)
+        self.lock = threading.Lock()
+        self.stats = {'requests': {}, 'errors': 0, 'image_bytes': 0}
+
+    @staticmethod
+    def _make_images(size, count: int = 4):
+        """Noisy PNGs, so their size is close to real slides instead of compressing to nothing"""
+        images = []
+        for i in range(count):
+            image = Image.effect_noise(size, 40 + 10 * i).convert('RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, format='PNG')
+            images.append(base64.b64encode(buffer.getvalue()).decode('ascii'))
+        return images
+
+    def count(self, model: str, error: bool = False, image_bytes: int = 0):
+        with self.lock:
+            self.stats['requests'][model] = self.stats['requests'].get(model, 0) + 1
+            self.stats['errors'] += 1 if error else 0
+            self.stats['image_bytes'] += image_bytes
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.stats))
+
+    def pick_error(self):
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice(self.error_codes)
+        return None
+
+    def answer_text(self, prompt: str) -> str:
+        """Plausible answer for the prompts the backend sends"""
+        if 'generates an outline for a ppt' in prompt or 'structured format' in prompt:
+            return json.dumps([
+                {'title': f'第{i}页', 'points': [f'要点{i}.1', f'要点{i}.2']}
+                for i in range(1, self.outline_pages + 1)
+            ], ensure_ascii=False)
+        if 'Return a JSON array with exactly one object per requested page' in prompt:
+            return json.dumps([
+                {'page_index': int(index), 'description': self._description(int(index))}
+                for index in _BATCH_PAGE.findall(prompt)
+            ], ensure_ascii=False)
+        match = _SINGLE_PAGE.search(prompt)
+        if match:
+            return self._description(int(match.group(1)))
+        if 'Return a JSON array' in prompt:
+            return json.dumps([self._description(i) for i in range(1, self.outline_pages + 1)],
+                              ensure_ascii=False)
+        return '好的。'
+
+    @staticmethod
+    def _description(index: int) -> str:
+        return f"页面标题：第{index}页\n\n页面文字：\n- 第{index}页的第一个要点\n- 第{index}页的第二个要点"
+
+
+def _prompt_text(body: dict) -> str:
+    texts = []
+    for content in body.get('contents') or []:
+        for part in content.get('parts') or []:
+            if isinstance(part.get('text'), str):
+                texts.append(part['text'])
+    return '\n'.join(texts)
+
+
+def _usage(prompt: str, answer: str) -> dict:
+    prompt_tokens = max(1, len(prompt) // 4)
+    response_tokens = max(1, len(answer) // 4)
+    return {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': response_tokens,
+            'totalTokenCount': prompt_tokens + response_tokens}
+
+
+def _candidate(parts: list) -> dict:
+    return {'content': {'role': 'model', 'parts': parts}, 'finishReason': 'STOP', 'index': 0}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake: FakeGemini = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/stats':
+            self._send_json(200, self.fake.snapshot())
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': 'Not found', 'status': 'NOT_FOUND'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        match = _MODEL_PATH.search(urlparse(self.path).path)
+        if not match:
+            self._send_json(404, {'error': {'code': 404, 'message': f'Unsupported: {self.path}',
+                                            'status': 'NOT_FOUND'}})
+            return
+
+        model, method = match.groups()
+        body = json.loads(raw or b'{}')
+        is_image = 'image' in model
+        time.sleep(max(0.0, (self.fake.image_latency if is_image else self.fake.text_latency).sample()))
+
+        code = self.fake.pick_error()
+        if code:
+            self.fake.count(model, error=True)
+            self._send_json(code, {'error': {'code': code, 'message': 'Injected fake error',
+                                             'status': _ERROR_STATUS.get(code, 'UNKNOWN')}})
+            return
+
+        prompt = _prompt_text(body)
+        if is_image:
+            data = random.choice(self.fake.images)
+            self.fake.count(model, image_bytes=len(data) * 3 // 4)
+            self._send_json(200, {
+                'candidates': [_candidate([{'inlineData': {'mimeType': 'image/png', 'data': data}}])],
+                'usageMetadata': _usage(prompt, ''),
+            })
+            return
+
+        answer = self.fake.answer_text(prompt)
+        self.fake.count(model)
+        if method == 'generateContent':
+            self._send_json(200, {'candidates': [_candidate([{'text': answer}])],
+                                  'usageMetadata': _usage(prompt, answer)})
+        else:
+            self._send_stream(answer, _usage(prompt, answer))
+
+    def _send_json(self, code: int, payload: dict):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, answer: str, usage: dict):
+        """Server-sent events, the answer split into a few chunks written over ~one text latency"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        size = max(1, math.ceil(len(answer) / self.fake.stream_chunks))
+        chunks = [answer[i:i + size] for i in range(0, len(answer), size)] or ['']
+        delay = self.fake.text_latency.sample() / len(chunks)
+        for i, chunk in enumerate(chunks):
+            event = {'candidates': [_candidate([{'text': chunk}])]}
+            if i == len(chunks) - 1:
+                event['usageMetadata'] = usage
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(delay)
+
+
+def start_server(fake: FakeGemini, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Serve a FakeGemini in a background thread (port 0 picks a free port)"""
+    handler = type('Handler', (FakeGeminiHandler,), {'fake': fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='fake-gemini', daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--text-latency', default='lognormal:0.8,0.4', help='文本模型延迟分布')
+    parser.add_argument('--image-latency', default='lognormal:4,0.5', help='图片模型延迟分布')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入错误的概率（0-1）')
+    parser.add_argument('--error-codes', default='429,503', help='注入的 HTTP 错误码，逗号分隔')
+    parser.add_argument('--image-size', default='1376x768', help='返回图片的尺寸，如 1376x768')
+    parser.add_argument('--outline-pages', type=int, default=6, help='生成大纲的页数')
+
+
+def fake_from_args(args) -> FakeGemini:
+    width, height = (int(v) for v in args.image_size.lower().split('x'))
+    return FakeGemini(
+        text_latency=args.text_latency,
+        image_latency=args.image_latency,
+        error_rate=args.error_rate,
+        error_codes=[int(c) for c in args.error_codes.split(',') if c.strip()],
+        image_size=(width, height),
+        outline_pages=args.outline_pages,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Gemini backend for offline benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_server(fake_from_args(args), args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"http://{host}:{port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()